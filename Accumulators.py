@@ -0,0 +1,302 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+
+import EventLog
+
+"""
+Running per-cell totals of an ecosystem run, so heatmaps of where animals
+spend their time and where predation, grazing, births and regrowth happen
+are available at any point without storing frames. Memory does not grow
+with the length of the run.
+
+Cells are only touched when something changes there: an event adds to its
+cell, and the time a species spends in a cell is integrated lazily from the
+tick the count last changed. Mushrooms do not move, so their counts follow
+the spawn, introduction, grazing and cull events and cost nothing when
+nothing happens. Animals move every step and are counted again after it,
+O(A log A) for A animals. With a half-life, every total also has an
+exponentially decayed twin that forgets old ticks, a moving window.
+"""
+
+SPECIES = ['Fox', 'Rabbit', 'Mushroom']
+MUSHROOM = SPECIES.index('Mushroom')
+MUSHROOM_CODE = 1 # species code of Mushroom, see Food
+
+# events that add or remove a mushroom
+GROWTH = [EventLog.SPAWN, EventLog.INTRODUCTION]
+LOSSES = [EventLog.GRAZING, EventLog.CULL]
+
+class SpatialAccumulators:
+    """
+    A class used to accumulate occupancy time and events per grid cell
+
+    Attributes
+    ----------
+    rows : int
+        the dimension of the grid
+    decay : float
+        factor per time step of the decayed totals, None when not kept
+    tick : int
+        last time step observed
+    counts : array(int)
+        3 x rows x rows agents of each species in every cell
+    lastChange : array(int)
+        3 x rows x rows time step the count of a cell last changed
+    occupied : array(float)
+        3 x rows x rows agent time steps up to lastChange
+    occupiedDecayed : array(float)
+        decayed agent time steps up to lastChange, None without a half-life
+    eventCounts : array(float)
+        kinds x rows x rows events of every kind in EventLog
+    eventDecayed : array(float)
+        decayed events up to lastEvent, None without a half-life
+    lastEvent : array(int)
+        kinds x rows x rows time step of the last event, None without a half-life
+    mushrooms : int
+        number of mushrooms in counts, to check the events kept up with the ecosystem
+
+    Methods
+    -------
+    event(tick, kind, x, y, code=None)
+        Adds an event to its cell
+    observe(ecosystem)
+        Updates the species counts after a time step
+    integrate(s, tick, cells, values)
+        Sets the counts of cells, integrating the time held by the old ones
+    occupancy(species, decayed=False)
+        Returns the agent time steps spent in every cell
+    events(kind, decayed=False)
+        Returns the events of a kind in every cell
+    """
+
+    def __init__(self, rows, halfLife=None):
+        """
+        Parameters
+        ----------
+        rows : int
+            the dimension of the grid
+        halfLife : float, optional
+            time steps for the decayed totals to halve, (Default None, not kept)
+        """
+
+        kinds = max(EventLog.EVENT_NAMES) + 1
+        self.rows = rows
+        self.decay = None if halfLife is None else 0.5**(1/halfLife)
+        self.tick = 0
+        self.counts = np.zeros((len(SPECIES), rows, rows), dtype=np.int32)
+        self.lastChange = np.zeros((len(SPECIES), rows, rows), dtype=np.int64)
+        self.occupied = np.zeros((len(SPECIES), rows, rows))
+        self.eventCounts = np.zeros((kinds, rows, rows))
+        self.cells = [np.zeros(0, dtype=np.int64) for species in SPECIES]
+        self.mushrooms = 0
+        if self.decay is None:
+            self.occupiedDecayed = None
+            self.eventDecayed = None
+            self.lastEvent = None
+        else:
+            self.occupiedDecayed = np.zeros((len(SPECIES), rows, rows))
+            self.eventDecayed = np.zeros((kinds, rows, rows))
+            self.lastEvent = np.zeros((kinds, rows, rows), dtype=np.int64)
+
+    def event(self, tick, kind, x, y, code=None):
+        """
+        Adds an event to its cell
+
+        Events of mushrooms also change the mushroom count of the cell.
+
+        Parameters
+        ----------
+        tick : int
+            time step of the event
+        kind : int
+            type of event, see EventLog
+        x : int
+            x location
+        y : int
+            y location
+        code : int, optional
+            species code of the agent, (Default None)
+        """
+
+        self.eventCounts[kind, x, y] += 1
+        if self.decay is not None:
+            age = tick - self.lastEvent[kind, x, y]
+            self.eventDecayed[kind, x, y] = self.eventDecayed[kind, x, y]*self.decay**age + 1
+            self.lastEvent[kind, x, y] = tick
+        if code == MUSHROOM_CODE and (kind in GROWTH or kind in LOSSES):
+            change = 1 if kind in GROWTH else -1
+            cell = np.array([x*self.rows + y])
+            self.integrate(MUSHROOM, tick, cell, self.counts[MUSHROOM].ravel()[cell] + change)
+            self.mushrooms = self.mushrooms + change
+
+    def held(self, count, span):
+        """
+        Decayed agent time steps of a count held for a number of time steps
+        """
+
+        return count*(1 - self.decay**span)/(1 - self.decay)
+
+    def observe(self, ecosystem):
+        """
+        Updates the species counts after a time step
+
+        Only the cells whose count changed are integrated. The animals are
+        counted again, the mushroom counts are already up to date from the
+        events unless the number of mushrooms disagrees, e.g. after the start,
+        a bulk spawn or on cell counts, then they are counted again too.
+
+        Parameters
+        ----------
+        ecosystem : Ecosystem
+            the ecosystem after its time step
+        """
+
+        tick = ecosystem.ticks
+        self.tick = tick
+        arrays = ecosystem.speciesArrays()
+        for s, name in enumerate(SPECIES):
+            if ecosystem.cellLattice is not None:
+                # counts per cell already, see Lattice
+                grid = ecosystem.cellLattice.cellCounts(name).ravel()
+                cells = np.flatnonzero(grid)
+                counts = grid[cells]
+            elif s == MUSHROOM and self.mushrooms == len(arrays[name]):
+                continue # the events kept the mushroom counts up to date
+            else:
+                locations = ecosystem.locationArray(arrays[name])
+                cells, counts = np.unique(locations[:, 0]*self.rows + locations[:, 1],
+                                          return_counts=True)
+            # cells holding agents before or now are the only ones that can change
+            before = np.flatnonzero(self.counts[s]) if s == MUSHROOM else self.cells[s]
+            candidates = np.union1d(before, cells)
+            values = np.zeros(len(candidates), dtype=np.int32)
+            values[np.searchsorted(candidates, cells)] = counts
+            changed = self.counts[s].ravel()[candidates] != values
+            self.integrate(s, tick, candidates[changed], values[changed])
+            if s == MUSHROOM:
+                self.mushrooms = int(counts.sum())
+            else:
+                self.cells[s] = cells
+
+    def integrate(self, s, tick, cells, values):
+        """
+        Sets the counts of cells, integrating the time held by the old ones
+
+        Parameters
+        ----------
+        s : int
+            index of the species in SPECIES
+        tick : int
+            time step the new counts start at
+        cells : array(int)
+            flat indices x*rows + y of distinct cells
+        values : array(int)
+            new count of every cell
+        """
+
+        flatCounts = self.counts[s].ravel()
+        last = self.lastChange[s].ravel()
+        held = flatCounts[cells]
+        span = tick - last[cells]
+        self.occupied[s].ravel()[cells] += held*span
+        if self.decay is not None:
+            decayed = self.occupiedDecayed[s].ravel()
+            decayed[cells] = decayed[cells]*self.decay**span + self.held(held, span)
+        last[cells] = tick
+        flatCounts[cells] = values
+
+    def occupancy(self, species, decayed=False):
+        """
+        Returns the agent time steps spent in every cell
+
+        Parameters
+        ----------
+        species : str
+            'Fox', 'Rabbit' or 'Mushroom'
+        decayed : boolean, optional
+            weigh older time steps down by the half-life, (Default False)
+
+        Returns
+        -------
+        array(float)
+            rows x rows agent time steps up to and including the last observed one
+        """
+
+        s = SPECIES.index(species)
+        span = self.tick + 1 - self.lastChange[s]
+        if not decayed:
+            return self.occupied[s] + self.counts[s]*span
+        return self.occupiedDecayed[s]*self.decay**span + self.held(self.counts[s], span)
+
+    def events(self, kind, decayed=False):
+        """
+        Returns the events of a kind in every cell
+
+        Parameters
+        ----------
+        kind : int
+            type of event, see EventLog
+        decayed : boolean, optional
+            weigh older events down by the half-life, (Default False)
+
+        Returns
+        -------
+        array(float)
+            rows x rows number of events
+        """
+
+        if not decayed:
+            return self.eventCounts[kind].copy()
+        return self.eventDecayed[kind]*self.decay**(self.tick - self.lastEvent[kind])
+
+def hotspots(grid, count=10):
+    """
+    Cells with the highest totals
+
+    Parameters
+    ----------
+    grid : array(float)
+        rows x rows totals, e.g. from occupancy or events
+    count : int, optional
+        number of cells, (Default 10)
+
+    Returns
+    -------
+    array(int)
+        count x 2 x,y locations, highest first
+    array(float)
+        the totals of those cells
+    """
+
+    flat = grid.ravel()
+    count = min(count, flat.size)
+    top = np.argpartition(flat, flat.size - count)[flat.size - count:]
+    top = top[np.argsort(flat[top])[::-1]]
+    return np.stack(np.unravel_index(top, grid.shape), axis=1), flat[top]
+
+def concentration(grid, share=0.1):
+    """
+    Part of the total held by the busiest cells
+
+    Parameters
+    ----------
+    grid : array(float)
+        rows x rows totals
+    share : float, optional
+        share of the cells counted, (Default 0.1)
+
+    Returns
+    -------
+    float
+        part of the total in the top share of cells, share when spread evenly
+        and 1 when everything happens in them
+    """
+
+    total = grid.sum()
+    if total == 0:
+        return 0.0
+    count = max(int(round(share*grid.size)), 1)
+    return float(hotspots(grid, count)[1].sum()/total)
@@ -4,6 +4,10 @@ import sys
 
 import numpy as np
 import random
+import itertools
+
+import Streams
+import Timers
 
 class Animal:
     """
@@ -29,8 +33,37 @@ class Animal:
         has the animal mated recently
     matedLast : int
         the last timestamp the animal mated
+    matingCooldown : int
+        steps that need to occur before the animal can mate again
+    minAge : int
+        age the animal needs to be over to reproduce
     species : str
         type of animal
+    code : int
+        species code used on the grid and in the event log
+    agentId : int
+        id of the animal, unique within its species
+    parentId : int
+        id of the parent the animal was born to, -1 if created at the start
+    partnerId : int
+        id of the other parent, -1 if created at the start
+    lifeId : int
+        row of the animal in the ecosystem's LifecycleTable, -1 when not kept
+    owner : Ecosystem
+        ecosystem the animal belongs to, None when created on its own
+    rng : CounterRNG
+        counter-based random streams of the owner, None uses numpy
+    timers : TimerWheel
+        timer wheel of the owner scheduling the end of mating cooldowns, None checks
+        them every step
+    habitat : Habitat
+        habitat of the owner weighing the directions of random moves, None moves uniformly
+    removed : boolean
+        has the dead animal been removed from the ecosystem
+    allocations : int
+        number of animals of the species created by spawn
+    reuses : int
+        number of animals of the species recycled by spawn
     maxHunger : int
         maximum hunger before death
     hunger : float
@@ -48,12 +81,20 @@ class Animal:
         Check if animal is within vicinity of specified animal
     interactOwnSpecies(partner, animalArray, probLitter=False)
         Animal tries to interact with another of its own species
+    canReproduce(partner, ofAge)
+        Checks if the animal and its partner are able to reproduce
     reproduce(animalArray, partner, ofAge, baby)
         Animal tries to reproduce with another of its species
     reproduced(partner)
         Increases hunger level of animals who reproduced
     hunt(foodArray)
         Looks for animals within sensing vicinity and picks the direction
+    resetIds()
+        Starts the ids of animals without an owner again from 0
+    spawn(mapSize, location=None, maxHunger=10, hunger=0, age=0, owner=None)
+        Creates an animal, reusing a dead one from the owner's pool if possible
+    release(animals, owner)
+        Returns dead animals to the owner's pool
     """
 
     # requried variables: needed for subclasses
@@ -64,9 +105,20 @@ class Animal:
     ateFood = False
     mated = False
     matedLast = 0
+    matingCooldown = 0
+    minAge = 0
     species = ""
-
-    def __init__(self, mapSize, location=None, maxHunger=10, hunger=0, age=0):
+    code = 0
+    parentId = -1
+    partnerId = -1
+    lifeId = -1
+    idCounter = itertools.count()
+    owner = None
+    removed = False
+    allocations = 0
+    reuses = 0
+
+    def __init__(self, mapSize, location=None, maxHunger=10, hunger=0, age=0, owner=None):
         """
         Parameters
         ----------
@@ -80,10 +132,19 @@ class Animal:
             start hunger level of animal, (Default 0)
         age : int, optional
             start age of animal, (Default 0)
+        owner : Ecosystem, optional
+            ecosystem the animal belongs to, its ids and random streams are used, (Default None)
         """
 
-        if location == None:
-            location = [np.random.randint(0, mapSize), np.random.randint(0, mapSize)]
+        if owner is None:
+            self.agentId = next(self.idCounter)
+        else:
+            # ids count per ecosystem so they match across runs
+            self.owner = owner
+            self.agentId = next(owner.idCounters[self.code])
+        if location is None:
+            location = [Streams.randint(self, Streams.LOCATION, 0, mapSize, 0),
+                        Streams.randint(self, Streams.LOCATION, 0, mapSize, 1)]
         self.location = location
 
         self.steps = age
@@ -105,8 +166,14 @@ class Animal:
         self.steps = self.steps + 1
 
         # check if direction already determined
-        if(direct == None):
-            direct = np.random.randint(0,8)
+        if(direct is None):
+            if self.habitat is not None:
+                uniform = Streams.uniform(self, Streams.MOVE)
+                direct = int(self.habitat.sampleMoves([self.location], [uniform])[0])
+            else:
+                direct = Streams.randint(self, Streams.MOVE, 0, 8)
+        elif self.habitat is not None and not self.habitat.allows(self.location, direct):
+            direct = 8 # a hunter does not follow prey onto cells it cannot enter
 
         # if the direction is 1,0,7 move x by +1
         if ((direct==0) or (direct==1) or (direct==7)):
@@ -192,7 +259,7 @@ class Animal:
             if self.mated == False and partner.mated == False:
                 if not probLitter:
                     # check if successful in mating
-                    if np.random.rand() < self.probRepro:
+                    if Streams.uniform(self, Streams.MATE, partner.agentId*32) < self.probRepro:
                         # reproduce the average litter size
                         for i in range(0, self.avgLitter):
                             # have the baby
@@ -207,7 +274,7 @@ class Animal:
                     for i in range(0, self.maxLitter):
                         baby = False
                         # check if successful in mating
-                        if np.random.rand() < reproOdds:
+                        if Streams.uniform(self, Streams.MATE, partner.agentId*32 + i) < reproOdds:
                             # have the baby
                             baby = self.reproduce(animalArray, partner)
                             if baby == False:
@@ -216,6 +283,30 @@ class Animal:
                             reproOdds = reproOdds - 0.05
                             self.reproduced(partner)
 
+    def canReproduce(self, partner, ofAge):
+        """
+        Checks if the animal and its partner are able to reproduce
+
+        Parameters
+        ----------
+        partner : Animal
+            animal trying to mate with
+        ofAge : int
+            how old animal needs to be to reproduce
+
+        Returns
+        -------
+        boolean
+            are both of age and have enough energy
+        """
+
+        # need to be of age to reproduce
+        if self.steps > ofAge and partner.steps > ofAge:
+            # check if they have enough energy to reproduce
+            if self.hunger < self.maxHunger/2 and partner.hunger < partner.maxHunger/2:
+                return True
+        return False
+
     def reproduce(self, animalArray, partner, ofAge, baby):
         """
         Animal tries to reproduce with another of its species
@@ -237,18 +328,22 @@ class Animal:
             did the animal reproduce
         """
 
-        # need to be of age to reproduce
-        if self.steps > ofAge and partner.steps > ofAge:
-            # check if they have enough energy to reproduce
-            if self.hunger < self.maxHunger/2 and partner.hunger < partner.maxHunger/2:
-                animalArray.append(baby)
-                animalArray[-1].step() # baby moves a step away from parent
-                # set that they mated and when
-                self.mated = True
-                self.matedLast = self.steps
-                partner.mated = True
-                partner.matedLast = partner.steps
-                return True
+        if self.canReproduce(partner, ofAge):
+            baby.partnerId = partner.agentId
+            animalArray.append(baby)
+            animalArray[-1].step() # baby moves a step away from parent
+            if self.timers is not None:
+                # the first baby of a litter starts the cooldowns
+                for animal in (self, partner):
+                    if not animal.mated:
+                        deadline = self.timers.tick + animal.matingCooldown + 1
+                        self.timers.schedule(deadline, Timers.COOLDOWN, animal)
+            # set that they mated and when
+            self.mated = True
+            self.matedLast = self.steps
+            partner.mated = True
+            partner.matedLast = partner.steps
+            return True
         return False
 
     def reproduced(self, partner):
@@ -264,6 +359,81 @@ class Animal:
         self.hunger = self.hunger + 0.5
         partner.hunger = partner.hunger + 0.5
 
+    @property
+    def rng(self):
+        return None if self.owner is None else self.owner.rng
+
+    @property
+    def timers(self):
+        return None if self.owner is None else self.owner.timers
+
+    @property
+    def habitat(self):
+        return None if self.owner is None else self.owner.habitat
+
+    @classmethod
+    def resetIds(cls):
+        """
+        Starts the ids of animals without an owner again from 0
+        """
+
+        cls.idCounter = itertools.count()
+
+    @classmethod
+    def spawn(cls, mapSize, location=None, maxHunger=10, hunger=0, age=0, owner=None):
+        """
+        Creates an animal, reusing a dead one from the owner's pool if possible
+
+        Parameters
+        ----------
+        mapSize : int
+            the dimension of the grid it inhabits
+        location : tuple(int), optional
+            x,y location of the animal, (Default None)
+        maxHunger : int, optional
+            maximum hunger before death, (Default 10)
+        hunger : float, optional
+            start hunger level of animal, (Default 0)
+        age : int, optional
+            start age of animal, (Default 0)
+        owner : Ecosystem, optional
+            ecosystem the animal belongs to, its pool is used, (Default None, no pool)
+
+        Returns
+        -------
+        Animal
+            the new animal
+        """
+
+        pool = None if owner is None else owner.pools[cls.species]
+        if pool:
+            animal = pool.pop()
+            # forget the previous life, class defaults apply again
+            animal.__dict__.clear()
+            animal.__init__(mapSize, location=location, maxHunger=maxHunger,
+                            hunger=hunger, age=age, owner=owner)
+            cls.reuses = cls.reuses + 1
+        else:
+            animal = cls(mapSize, location=location, maxHunger=maxHunger,
+                         hunger=hunger, age=age, owner=owner)
+            cls.allocations = cls.allocations + 1
+        return animal
+
+    @classmethod
+    def release(cls, animals, owner):
+        """
+        Returns dead animals to the owner's pool
+
+        Parameters
+        ----------
+        animals : array(Animal)
+            dead animals no longer referenced by the ecosystem
+        owner : Ecosystem
+            ecosystem the animals belonged to
+        """
+
+        owner.pools[cls.species].extend(animals)
+
     def hunt(self, foodArray):
         """
         Looks for animals within sensing vicinity and picks the direction
@@ -358,7 +528,7 @@ class Rabbit(Animal):
 
     Methods
     -------
-    step(foodArray=None)
+    step(foodArray=None, direct=None)
         Move the rabbit one time step
     interactMushroom(mushroom)
         Rabbit attempts to eat mushroom
@@ -370,9 +540,13 @@ class Rabbit(Animal):
     probRepro = 0.5
     avgLitter = 5
     maxLitter = 14
+    matingCooldown = 2
+    minAge = 7 # need to be 8 months to reproduce
     species = 'Rabbit'
+    code = 2
+    idCounter = itertools.count()
 
-    def step(self, foodArray = None):
+    def step(self, foodArray = None, direct = None):
         """
         Move the rabbit one time step
 
@@ -380,16 +554,20 @@ class Rabbit(Animal):
         ----------
         foodArray : array(Animal) or array(Food), optional
             prey to hunt, (Default None)
+        direct : int, optional
+            direction to move when no prey is sensed, acceptable range 0-8, (Default None)
         """
 
-        if self.mated == True:
+        if self.mated == True and self.timers is None:
             # 2 steps need to have occurred before mating again
-            if self.steps - self.matedLast == 2:
+            if self.steps - self.matedLast >= self.matingCooldown:
                 self.mated = False
-        if(foodArray != None):
-            super().step(self.hunt(foodArray))
-        else:
-            super().step()
+        if(foodArray is not None):
+            # prey in sensing range overrides the given direction
+            hunted = self.hunt(foodArray)
+            if hunted is not None:
+                direct = hunted
+        super().step(direct)
 
     def interactMushroom(self, mushroom):
         """
@@ -399,6 +577,11 @@ class Rabbit(Animal):
         ---------
         mushroom : Mushroom
             mushroom trying to eat
+
+        Returns
+        -------
+        boolean
+            did the animal eat the mushroom
         """
 
         together = False
@@ -416,6 +599,7 @@ class Rabbit(Animal):
                 self.hunger = self.hunger - 3
             else:
                 self.hunger = self.hunger - 1 # unknown size value = to size 1
+        return together
 
     def reproduce(self, animalArray, rabbit):
         """
@@ -434,12 +618,16 @@ class Rabbit(Animal):
             baby rabbit
         """
 
+        # only create the baby if the parents are able to have it
+        if not self.canReproduce(rabbit, self.minAge):
+            return False
         # spawn baby in same spot as parent
         x = self.location[0]
         y = self.location[1]
-        baby = Rabbit(self.mapSize, location=[x,y], maxHunger=self.maxHunger)
-        minAge = 7 # need to be 8 months to reproduce
-        return super().reproduce(animalArray, rabbit, minAge, baby)
+        baby = Rabbit.spawn(self.mapSize, location=[x,y], maxHunger=self.maxHunger,
+                            owner=self.owner)
+        baby.parentId = self.agentId
+        return super().reproduce(animalArray, rabbit, self.minAge, baby)
 
 ###############################################################################
 # Fox class used in ecosystem ------------------------------------------------#
@@ -457,7 +645,7 @@ class Fox(Animal):
 
     Methods
     -------
-    step(foodArray=None)
+    step(foodArray=None, direct=None)
         Move the fox one time step
     interactRabbit(rabbit)
         Fox attempts to eat rabbit
@@ -471,9 +659,13 @@ class Fox(Animal):
     probRepro = 0.3
     avgLitter = 4
     maxLitter = 11
+    matingCooldown = 12
+    minAge = 9 # need to be 10 months to reproduce
     species = 'Fox'
+    code = 3
+    idCounter = itertools.count()
 
-    def step(self, foodArray = None):
+    def step(self, foodArray = None, direct = None):
         """
         Move the fox one time step
 
@@ -481,16 +673,20 @@ class Fox(Animal):
         ----------
         foodArray : array(Animal) or array(Food), optional
             prey to hunt, (Default None)
+        direct : int, optional
+            direction to move when no prey is sensed, acceptable range 0-8, (Default None)
         """
 
-        if self.mated == True:
+        if self.mated == True and self.timers is None:
             # 12 steps need to have occurred before mating again
-            if self.steps - self.matedLast == 12:
+            if self.steps - self.matedLast >= self.matingCooldown:
                 self.mated = False
-        if(foodArray != None):
-            super().step(self.hunt(foodArray))
-        else:
-            super().step()
+        if(foodArray is not None):
+            # prey in sensing range overrides the given direction
+            hunted = self.hunt(foodArray)
+            if hunted is not None:
+                direct = hunted
+        super().step(direct)
 
     def interactRabbit(self, rabbit):
         """
@@ -500,6 +696,11 @@ class Fox(Animal):
         ---------
         rabbit : Rabbit
             rabbit trying to eat
+
+        Returns
+        -------
+        boolean
+            did the fox eat the rabbit
         """
 
         together = False
@@ -509,6 +710,7 @@ class Fox(Animal):
             rabbit.beStill = True
             self.ateFood = True
             self.hunger = self.hunger - 1
+        return together
 
     def interactMushroom(self, mushroom):
         """
@@ -518,6 +720,11 @@ class Fox(Animal):
         ---------
         mushroom : Mushroom
             mushroom trying to eat
+
+        Returns
+        -------
+        boolean
+            did the animal eat the mushroom
         """
 
         together = False
@@ -535,6 +742,7 @@ class Fox(Animal):
                 self.hunger = self.hunger - 1
             else:
                 self.hunger = self.hunger - 0.5 # unknown size value = to size 1
+        return together
 
     def reproduce(self, animalArray, fox):
         """
@@ -553,9 +761,13 @@ class Fox(Animal):
             baby fox
         """
 
+        # only create the baby if the parents are able to have it
+        if not self.canReproduce(fox, self.minAge):
+            return False
         # spawn baby in same spot as parent
         x = self.location[0]
         y = self.location[1]
-        baby = Fox(self.mapSize, location=[x,y], maxHunger=self.maxHunger)
-        minAge = 9 # need to be 10 months to reproduce
-        return super().reproduce(animalArray, fox, minAge, baby)
+        baby = Fox.spawn(self.mapSize, location=[x,y], maxHunger=self.maxHunger,
+                         owner=self.owner)
+        baby.parentId = self.agentId
+        return super().reproduce(animalArray, fox, self.minAge, baby)
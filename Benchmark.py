@@ -0,0 +1,149 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+import gc, time
+
+from Animal import Fox, Rabbit
+import Sweep
+
+"""
+Benchmark of headless ecosystem runs. Reports the time per step, the
+animal allocations and reuses, and the garbage collections and the time
+spent in them, so engine options can be compared on the same seed.
+
+    python Benchmark.py
+"""
+
+class GCTimer:
+    """
+    A class used to time garbage collection pauses
+
+    Attributes
+    ----------
+    collections : array(int)
+        number of collections of each generation
+    pause : float
+        total time spent collecting in seconds
+    longest : float
+        longest single collection in seconds
+
+    Methods
+    -------
+    start()
+        Starts listening to the garbage collector
+    stop()
+        Stops listening to the garbage collector
+    """
+
+    def __init__(self):
+        self.collections = [0, 0, 0]
+        self.pause = 0.0
+        self.longest = 0.0
+        self.started = None
+
+    def callback(self, phase, info):
+        if phase == 'start':
+            self.started = time.perf_counter()
+        elif self.started is not None:
+            duration = time.perf_counter() - self.started
+            self.collections[info['generation']] += 1
+            self.pause = self.pause + duration
+            self.longest = max(self.longest, duration)
+            self.started = None
+
+    def start(self):
+        """
+        Starts listening to the garbage collector
+        """
+
+        gc.callbacks.append(self.callback)
+
+    def stop(self):
+        """
+        Stops listening to the garbage collector
+        """
+
+        gc.callbacks.remove(self.callback)
+
+def benchmark(exp='H', seed=0, rows=50, numFoxes=20, numRabbits=100, numMushrooms=300,
+              maxFrames=200, **kwargs):
+    """
+    Times one headless run of a configuration
+
+    Parameters
+    ----------
+    exp : str, optional
+        configuration name, see Sweep, (Default 'H')
+    seed : int, optional
+        random seed of the run, (Default 0)
+    rows : int, optional
+        the dimension of the ecosystem grid, (Default 50)
+    numFoxes : int, optional
+        number of foxes to start with, (Default 20)
+    numRabbits : int, optional
+        number of rabbits to start with, (Default 100)
+    numMushrooms : int, optional
+        number of mushrooms to start with, (Default 300)
+    maxFrames : int, optional
+        maximum number of time steps, (Default 200)
+    **kwargs
+        passed on to Ecosystem
+
+    Returns
+    -------
+    dictionary
+        run time, steps, allocations, reuses and garbage collection statistics
+    """
+
+    for species in [Fox, Rabbit]:
+        species.allocations = 0
+        species.reuses = 0
+    timer = GCTimer()
+    timer.start()
+    started = time.perf_counter()
+    try:
+        populations = Sweep.runExperiment(exp, seed, rows=rows, numFoxes=numFoxes,
+                                          numRabbits=numRabbits, numMushrooms=numMushrooms,
+                                          maxFrames=maxFrames, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - started
+        timer.stop()
+
+    steps = len(populations['numFoxes']) - 1
+    return {"exp": exp, "seconds": elapsed, "steps": steps,
+            "msPerStep": 1000*elapsed/max(steps, 1),
+            "allocations": Fox.allocations + Rabbit.allocations,
+            "reuses": Fox.reuses + Rabbit.reuses,
+            "gcCollections": list(timer.collections),
+            "gcPause": timer.pause, "gcLongestPause": timer.longest}
+
+def printResult(name, result):
+    """
+    Prints one benchmark result
+
+    Parameters
+    ----------
+    name : str
+        label of the run
+    result : dictionary
+        output of benchmark
+    """
+
+    print("%-12s %4d steps %8.2f ms/step  allocs %7d  reuses %7d  gc %s  pause %.3fs (max %.1fms)"
+          % (name, result["steps"], result["msPerStep"], result["allocations"],
+             result["reuses"], result["gcCollections"], result["gcPause"],
+             1000*result["gcLongestPause"]))
+
+if __name__ == '__main__':
+    # common random numbers keep both runs on the same trajectory
+    for exp in ['none', 'H', 'HODP']:
+        printResult(exp, benchmark(exp, maxFrames=100, crnSeed=0))
+        printResult(exp + " pooled", benchmark(exp, maxFrames=100, crnSeed=0, pooling=True))
+        printResult(exp + " timers", benchmark(exp, maxFrames=100, crnSeed=0, timers=True))
+    # dense runs on counts per cell, the agents would take minutes per step
+    for exp in ['none', 'P']:
+        printResult(exp + " dense lattice", benchmark(exp, rows=200, numFoxes=400,
+                                                      numRabbits=40000, numMushrooms=20000,
+                                                      maxFrames=100, lattice=0.05))
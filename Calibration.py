@@ -0,0 +1,469 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+import contextlib
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from Animal import Fox, Rabbit
+from Food import Mushroom
+
+"""
+Likelihood-free calibration of species parameters to observed population
+counts with approximate Bayesian computation by sequential Monte Carlo
+(ABC-SMC). Parameters are named 'Species.attribute', e.g. 'Rabbit.probRepro'
+or 'Fox.sense', and have a uniform prior between bounds:
+
+    bounds = {'Rabbit.probRepro': (0.1, 0.9), 'Fox.avgLitter': (1, 8, 'int'),
+              'Fox.maxHunger': (4, 20, 'int')}
+    abc = ABCSMC(observed, bounds, rows=50)
+    abc.run(generations=5)
+
+The distance between a run and the observations is the root mean squared
+log error over every species and time step. Since it only grows as the run
+goes on, a particle is stopped as soon as the part of the run it has done
+is already further away than the tolerance, so most rejected particles only
+cost a few steps.
+"""
+
+SPECIES = {'Fox': Fox, 'Rabbit': Rabbit, 'Mushroom': Mushroom}
+
+KEYS = ['numFoxes', 'numRabbits', 'numMushrooms']
+
+@contextlib.contextmanager
+def speciesParameters(values):
+    """
+    Sets species class attributes for the duration of a with block
+
+    Parameters
+    ----------
+    values : dictionary
+        value per 'Species.attribute' name
+    """
+
+    saved = []
+    try:
+        for name, value in values.items():
+            species, attribute = name.split('.')
+            cls = SPECIES[species]
+            # only restore attributes the class defines itself
+            saved.append((cls, attribute, cls.__dict__.get(attribute, None),
+                          attribute in cls.__dict__))
+            setattr(cls, attribute, value)
+        yield
+    finally:
+        for cls, attribute, value, own in reversed(saved):
+            if own:
+                setattr(cls, attribute, value)
+            else:
+                delattr(cls, attribute)
+
+def squaredLogError(observed, populations, start, stop):
+    """
+    Summed squared log error of a stretch of time steps
+
+    Parameters
+    ----------
+    observed : dictionary
+        observed counts keyed numFoxes, numRabbits and numMushrooms
+    populations : dictionary
+        simulated population series, shorter series are padded with their
+        last value
+    start : int
+        first time step
+    stop : int
+        one after the last time step
+
+    Returns
+    -------
+    float
+        the summed squared error over the species and time steps
+    """
+
+    total = 0.0
+    for key in KEYS:
+        series = np.asarray(populations[key], dtype=float)
+        simulated = series[start:stop]
+        if len(simulated) < stop - start:
+            # the run ended with an extinction, nothing changes after it
+            simulated = np.concatenate([simulated, np.full(stop - start - len(simulated), series[-1])])
+        total = total + ((np.log1p(simulated) - np.log1p(observed[key][start:stop]))**2).sum()
+    return total
+
+def simulateParticle(theta, observed, rows, seed, bound=np.inf, checkEvery=10, options=None):
+    """
+    Runs the ecosystem with a parameter set and measures the error
+
+    Parameters
+    ----------
+    theta : dictionary
+        value per 'Species.attribute' name, maxHunger is passed to the
+        create functions, everything else set on the class
+    observed : dictionary
+        observed counts keyed numFoxes, numRabbits and numMushrooms, the run
+        starts from the first counts
+    rows : int
+        the dimension of the ecosystem grid
+    seed : int
+        random seed of the run
+    bound : float, optional
+        summed squared error at which the run is stopped, (Default no bound)
+    checkEvery : int, optional
+        number of time steps between checks against the bound, (Default 10)
+    options : dictionary, optional
+        passed on to Ecosystem, (Default None)
+
+    Returns
+    -------
+    float
+        summed squared error, a lower bound when the run was stopped
+    boolean
+        did the run finish
+    """
+
+    from Ecosystem import Ecosystem
+
+    maxHunger = {name: value for name, value in theta.items() if name.endswith('.maxHunger')}
+    classValues = {name: value for name, value in theta.items() if name not in maxHunger}
+    ticks = len(observed['numFoxes']) - 1
+    np.random.seed(seed)
+    with speciesParameters(classValues):
+        eco = Ecosystem(rows, **(options or {}))
+        eco.createFoxes(int(observed['numFoxes'][0]),
+                        maxHunger=maxHunger.get('Fox.maxHunger', 10))
+        eco.createRabbits(int(observed['numRabbits'][0]),
+                          maxHunger=maxHunger.get('Rabbit.maxHunger', 10))
+        eco.createMushrooms(int(observed['numMushrooms'][0]))
+        total = squaredLogError(observed, eco.populations(), 0, 1)
+        done = 0
+        while done < ticks:
+            stop = min(done + checkEvery, ticks)
+            while eco.ticks < stop and not eco.foxesDead and not eco.rabbitsDead:
+                eco.step()
+            total = total + squaredLogError(observed, eco.populations(), done + 1, stop + 1)
+            done = stop
+            if total > bound:
+                return total, False
+    return total, True
+
+def _evaluate(args):
+    """
+    Runs every replicate of a particle on a worker process
+    """
+
+    theta, observed, rows, seeds, bound, checkEvery, options = args
+    total = 0.0
+    for seed in seeds:
+        error, finished = simulateParticle(theta, observed, rows, seed, bound - total,
+                                           checkEvery, options)
+        total = total + error
+        if not finished:
+            return total, False
+    return total, True
+
+class ABCSMC:
+    """
+    A class used to calibrate species parameters with ABC-SMC
+
+    Attributes
+    ----------
+    observed : dictionary
+        observed counts keyed numFoxes, numRabbits and numMushrooms
+    names : array(str)
+        parameter names
+    low : array(float)
+        lower prior bounds
+    high : array(float)
+        upper prior bounds
+    integer : array(bool)
+        which parameters only take whole values
+    rows : int
+        the dimension of the ecosystem grid
+    seeds : array(int)
+        random seeds of the replicate runs of every particle
+    particles : int
+        number of accepted particles per generation
+    decimals : int
+        real parameters are rounded to this many decimals so repeated
+        particles are found in the cache
+    cache : dictionary
+        (summed squared error, finished) per evaluated particle
+    generations : array(dictionary)
+        particles, weights, distances and tolerance of every generation,
+        with the evaluations, pruned runs and cache hits it took
+    workers : int
+        number of processes
+
+    Methods
+    -------
+    quantize(thetas)
+        Rounds proposals to the values that are evaluated
+    theta(values)
+        Parameter dictionary of one particle
+    propose(count)
+        Draws particles from the prior or by perturbing the last generation
+    evaluate(thetas, epsilon, pool, stats)
+        Distances of many particles, from the cache or from runs on the pool
+    weights(particles)
+        Importance weights of accepted particles of a new generation
+    run(generations=5, quantile=0.5, minEpsilon=0.0)
+        Runs generations of the sequential sampler
+    posterior()
+        Returns the particles and weights of the last generation
+    posteriorMean()
+        Returns the weighted mean of every parameter
+    saveCache(fileName)
+        Stores the evaluated particles
+    loadCache(fileName)
+        Adds evaluated particles from a file
+    """
+
+    def __init__(self, observed, bounds, rows=50, seeds=(0, 1, 2), particles=100, batch=None,
+                 checkEvery=10, decimals=3, workers=None, seed=None, maxEvaluations=100000,
+                 **options):
+        """
+        Parameters
+        ----------
+        observed : dictionary
+            observed counts keyed numFoxes, numRabbits and numMushrooms
+        bounds : dictionary
+            (low, high) or (low, high, 'int') prior bounds per parameter name
+        rows : int, optional
+            the dimension of the ecosystem grid, (Default 50)
+        seeds : array(int), optional
+            random seeds of the replicate runs of every particle, (Default (0, 1, 2))
+        particles : int, optional
+            number of accepted particles per generation, (Default 100)
+        batch : int, optional
+            number of particles proposed at once, (Default 2*particles)
+        checkEvery : int, optional
+            number of time steps between early stopping checks, (Default 10)
+        decimals : int, optional
+            real parameters are rounded to this many decimals, (Default 3)
+        workers : int, optional
+            number of processes, (Default number of cores)
+        seed : int, optional
+            random seed of the sampler, (Default None)
+        maxEvaluations : int, optional
+            proposals per generation before giving up, (Default 100000)
+        **options
+            passed on to Ecosystem, e.g. hunting=True
+        """
+
+        self.observed = {key: np.asarray(observed[key], dtype=float) for key in KEYS}
+        self.names = sorted(bounds)
+        self.low = np.array([bounds[name][0] for name in self.names], dtype=float)
+        self.high = np.array([bounds[name][1] for name in self.names], dtype=float)
+        self.integer = np.array([len(bounds[name]) > 2 and bounds[name][2] == 'int'
+                                 for name in self.names])
+        self.rows = rows
+        self.seeds = list(seeds)
+        self.particles = particles
+        self.batch = batch if batch is not None else 2*particles
+        self.checkEvery = checkEvery
+        self.decimals = decimals
+        self.workers = workers
+        self.maxEvaluations = maxEvaluations
+        self.options = options
+        self.rng = np.random.RandomState(seed)
+        self.cache = {}
+        self.generations = []
+        # number of terms summed in the error of one particle
+        self.terms = 3*len(self.observed['numFoxes'])*len(self.seeds)
+
+    def quantize(self, thetas):
+        """
+        Rounds proposals to the values that are evaluated
+        """
+
+        thetas = np.round(thetas, self.decimals)
+        thetas[:, self.integer] = np.round(thetas[:, self.integer])
+        return thetas
+
+    def theta(self, values):
+        """
+        Parameter dictionary of one particle
+        """
+
+        return {name: (int(value) if isInt else float(value))
+                for name, value, isInt in zip(self.names, values, self.integer)}
+
+    def propose(self, count):
+        """
+        Draws particles from the prior or by perturbing the last generation
+        """
+
+        if not self.generations:
+            thetas = self.rng.uniform(self.low, self.high, (count, len(self.names)))
+            return self.quantize(thetas)
+        last = self.generations[-1]
+        picks = self.rng.choice(len(last['particles']), count, p=last['weights'])
+        thetas = last['particles'][picks] + self.rng.normal(0, 1, (count, len(self.names)))*last['scale']
+        thetas = self.quantize(thetas)
+        # keep proposals inside the prior
+        inside = ((thetas >= self.low) & (thetas <= self.high)).all(axis=1)
+        return thetas[inside]
+
+    def evaluate(self, thetas, epsilon, pool, stats):
+        """
+        Distances of many particles, from the cache or from runs on the pool
+        """
+
+        bound = epsilon**2*self.terms
+        errors = np.empty(len(thetas))
+        jobs, slots = [], []
+        for i, values in enumerate(thetas):
+            key = tuple(values.tolist())
+            cached = self.cache.get(key)
+            # a stopped run is only known to be over the bound it was stopped at
+            if cached is not None and (cached[1] or cached[0] > bound):
+                errors[i] = cached[0]
+                stats['cacheHits'] = stats['cacheHits'] + 1
+            else:
+                jobs.append((self.theta(values), self.observed, self.rows, self.seeds, bound,
+                             self.checkEvery, self.options))
+                slots.append(i)
+        for i, (error, finished) in zip(slots, pool.map(_evaluate, jobs)):
+            self.cache[tuple(thetas[i].tolist())] = (error, finished)
+            errors[i] = error
+            stats['evaluations'] = stats['evaluations'] + 1
+            if not finished:
+                stats['pruned'] = stats['pruned'] + 1
+        return np.sqrt(errors/self.terms)
+
+    def weights(self, particles):
+        """
+        Importance weights of accepted particles of a new generation
+        """
+
+        if not self.generations:
+            return np.full(len(particles), 1/len(particles))
+        last = self.generations[-1]
+        scale = np.maximum(last['scale'], 1e-12)
+        diff = (particles[:, None, :] - last['particles'][None, :, :])/scale
+        kernel = np.exp(-0.5*(diff**2).sum(axis=2))
+        # uniform prior, so the weight is one over the proposal density
+        weights = 1/np.maximum(kernel.dot(last['weights']), 1e-300)
+        return weights/weights.sum()
+
+    def run(self, generations=5, quantile=0.5, minEpsilon=0.0):
+        """
+        Runs generations of the sequential sampler
+
+        The tolerance of every generation is the given quantile of the
+        distances accepted in the one before, the first accepts the best
+        particles of a batch from the prior.
+
+        Parameters
+        ----------
+        generations : int, optional
+            number of generations to add, (Default 5)
+        quantile : float, optional
+            quantile of the last distances used as the next tolerance, (Default 0.5)
+        minEpsilon : float, optional
+            stop once the tolerance is this small, (Default 0.0)
+
+        Returns
+        -------
+        array(dictionary)
+            every generation so far
+        """
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for g in range(generations):
+                if self.generations:
+                    epsilon = float(np.quantile(self.generations[-1]['distances'], quantile))
+                else:
+                    epsilon = np.inf
+                if epsilon <= minEpsilon:
+                    break
+                stats = {'evaluations': 0, 'pruned': 0, 'cacheHits': 0}
+                accepted, distances, proposed = [], [], 0
+                while len(accepted) < self.particles and proposed < self.maxEvaluations:
+                    thetas = self.propose(self.batch)
+                    proposed = proposed + self.batch
+                    if len(thetas) == 0:
+                        continue
+                    found = self.evaluate(thetas, epsilon, pool, stats)
+                    keep = found <= epsilon
+                    accepted.extend(thetas[keep])
+                    distances.extend(found[keep])
+                    if np.isinf(epsilon):
+                        break
+                if len(accepted) == 0:
+                    break
+                if np.isinf(epsilon):
+                    # first generation, the best of the prior batch
+                    order = np.argsort(distances)[:self.particles]
+                else:
+                    order = np.arange(min(len(accepted), self.particles))
+                accepted = np.array(accepted)[order]
+                distances = np.array(distances)[order]
+                if np.isinf(epsilon):
+                    epsilon = float(distances.max())
+                weights = self.weights(accepted)
+                mean = weights.dot(accepted)
+                variance = weights.dot((accepted - mean)**2)
+                self.generations.append({"particles": accepted, "weights": weights,
+                                         "distances": distances, "epsilon": epsilon,
+                                         "scale": np.sqrt(2*variance), **stats})
+        return self.generations
+
+    def posterior(self):
+        """
+        Returns the particles and weights of the last generation
+
+        Returns
+        -------
+        array(float)
+            particles, one column per name in names
+        array(float)
+            weights summing to 1
+        """
+
+        last = self.generations[-1]
+        return last['particles'], last['weights']
+
+    def posteriorMean(self):
+        """
+        Returns the weighted mean of every parameter
+
+        Returns
+        -------
+        dictionary
+            mean value per parameter name
+        """
+
+        particles, weights = self.posterior()
+        return {name: float(value) for name, value in zip(self.names, weights.dot(particles))}
+
+    def saveCache(self, fileName):
+        """
+        Stores the evaluated particles
+
+        Parameters
+        ----------
+        fileName : str
+            pickle file, only valid for the same observations, seeds and options
+        """
+
+        with open(fileName, 'wb') as f:
+            pickle.dump({"names": self.names, "seeds": self.seeds, "cache": self.cache}, f)
+
+    def loadCache(self, fileName):
+        """
+        Adds evaluated particles from a file
+
+        Parameters
+        ----------
+        fileName : str
+            pickle file written by saveCache
+        """
+
+        with open(fileName, 'rb') as f:
+            data = pickle.load(f)
+        if data["names"] != self.names or data["seeds"] != self.seeds:
+            raise ValueError("cache was made for other parameters or seeds")
+        self.cache.update(data["cache"])
@@ -7,6 +7,7 @@ import random
 import os, shutil
 import datetime, time, fnmatch
 import math
+import itertools
 
 import matplotlib.pyplot as plt
 from matplotlib import colors
@@ -20,11 +21,16 @@ from Animal import Fox
 from Animal import Rabbit
 from Food import Food
 from Food import Mushroom
-
-cmap = colors.ListedColormap(['White','Blue','Green','Red'])
-
-# normalizes colour range values
-n = colors.Normalize(vmin=0,vmax=3)
+import Streams
+import Timers
+import Occupancy
+import Lattice
+import Hunting
+import EventLog
+import Render
+from Render import cmap, n
+import Pipeline
+import Report
 
 """
 For animation to work in the notebook, you might have to install
@@ -47,10 +53,10 @@ class Ecosystem:
         the dimension of the ecosystem grid
     maxShrooms : int
         the maximum number of mushrooms that can exist in the ecosystem
-    grid : array(int)
-        the grid where species are mapped
-    occupiedMush : array(int)
-        contains which spots in the grid contain a mushroom
+    grid : array(uint8)
+        the grid where species are mapped, allocated by the first mapToGrid
+    occupiedMush : DenseOccupancy, BitOccupancy, SparseOccupancy or AdaptiveOccupancy
+        contains which spots in the grid contain a mushroom, indexed [x, y]
     foxes_array : array(Fox)
         foxes in the ecosystem
     rabbits_array : array(Rabbit)
@@ -77,6 +83,50 @@ class Ecosystem:
         are animals able to hunt
     probLitter : boolean
         do animals have probability litter sizes
+    senseField : boolean
+        do hunters look up the direction to the closest prey in a per step field
+    sense : int
+        sensing radius used with senseField, None uses each species' sense
+    foodWeb : FoodWeb
+        resolves interactions from declared relations, None uses checkInteractions
+    rng : CounterRNG
+        counter-based random streams for common random numbers, None uses numpy
+    idCounters : dictionary
+        next agent id of every species code, handed out to the agents it creates
+    pooling : boolean
+        are dead animals recycled into newborns
+    pools : dictionary
+        dead animals of every species waiting to be reused for newborns
+    timers : TimerWheel
+        schedules mating cooldowns and old age deaths, None checks every animal each step
+    memoryProbe : MemoryProbe
+        samples the memory use every few time steps, None when disabled
+    renderFrames : array(array(AxesImage))
+        frames drawn by animate
+    interventions : array(Intervention)
+        scheduled culls and introductions
+    accumulators : SpatialAccumulators
+        running per-cell occupancy time and event totals, None when disabled
+    lattice : float
+        animals per cell at which the agents are replaced by cell counts, None never
+    cellLattice : CellLattice
+        counts per cell the ecosystem runs on, None while running on agents
+    latticeSwitches : array(tuple(int))
+        (tick, 1 to cell counts or 0 back to agents) of every switch
+    lifecycle : LifecycleTable
+        birth, death, parents, litters and food eaten of every agent, None when
+        not kept
+    habitat : Habitat
+        habitat classes weighing moves and mushroom growth, None for a uniform grid
+    interventionHistory : array(tuple(int))
+        (tick, intervention index, species code, change in population) of every
+        intervention applied
+    eventLog : EventLog
+        records births, predation, grazing, deaths and spawns, None when disabled
+    ticks : int
+        number of time steps taken
+    history : array(array(int))
+        grid recorded after every time step, None when not recording
 
     Methods
     -------
@@ -88,14 +138,58 @@ class Ecosystem:
         Creates the initial rabbits for the ecosystem
     createMushrooms(numMushrooms, locations=None)
         Creates the initial mushrooms for the ecosystem
+    spawn(species, count=None, locations=None, distribution=None, randomState=None, **attributes)
+        Adds many agents of a species at once, at the start or during a run
+    sampleCells(count, distribution=None, unique=False, randomState=None)
+        Draws cells for new agents
     step()
         Moves the ecosystem forward one time step
+    stepAgents()
+        Moves the agents forward one time step
+    randomState(purpose, key=0, code=0)
+        Random state for draws made for the whole ecosystem at this time step
+    applyInterventions()
+        Applies the interventions due at the current time step
+    habitatMoves(animalArray)
+        Draws the direction of the next move of every animal from the habitat
+    regrowMushrooms(currMush)
+        Mushrooms reproduce asexually, weighted by the habitat
+    switchMode()
+        Switches between agents and cell counts on the population density
+    toLattice()
+        Replaces the agents by cell counts
+    toAgents()
+        Replaces the cell counts by agents
+    headCounts()
+        Returns the number of foxes, rabbits and mushrooms
+    huntingField(preyArray, sense)
+        Computes the direction to the closest prey from every cell
+    recordEvent(kind, agent, other=None)
+        Records an event in the event log and the accumulators
+    recordNewAgents(animalArray, start, kind)
+        Records the agents added to an array after the given index
+    scheduleLifespans(animalArray, start=0)
+        Schedules the old age deaths of the animals after the given index
+    simulate(maxFrames=200)
+        Runs the ecosystem without rendering
     mapToGrid()
         Maps each species to the grid
+    locationArray(agentArray)
+        Returns the locations of the living agents as an array
+    densityGrids(factor=1)
+        Counts the members of each species in every cell or block of cells
     plotGrid(grid)
         Plots the grid
+    plotDensity(maxPixels=1000)
+        Plots the species densities at screen resolution
     animation(maxFrames=200)
         Animates the ecosystem over time
+    record(fileName, maxFrames=200, slots=8, policy='block', interval=200, dpi=100)
+        Runs the ecosystem while a separate process renders it to a video
+    replay(history, start=0, stop=None)
+        Animates recorded grid history
+    speciesArrays()
+        Returns the agents of every species by name
     checkInteractions()
         Checks all species interactiions
     removeTheDead()
@@ -108,11 +202,19 @@ class Ecosystem:
         Removes animal if it has died of old age
     decomposeTheDead()
         Mushrooms decompose animals that have died of natural causes
+    populations()
+        Returns the population history of the three species
+    savePopulations(exp, dirName)
+        Stores the population history for the report stage
     plotPopulationHist(exp, dirName)
         Plots the population history of the three species
     """
 
-    def __init__(self, rows, omni=False, decomp=False, hunting=False, probLitter=False):
+    def __init__(self, rows, omni=False, decomp=False, hunting=False, probLitter=False,
+                 eventLog=None, history=None, senseField=False, sense=None, foodWeb=None,
+                 crnSeed=None, pooling=False, timers=False,
+                 memoryProbe=None, occupancy='auto', interventions=None, accumulators=None,
+                 lattice=None, lifecycle=None, habitat=None):
         """
         Parameters
         ----------
@@ -126,11 +228,59 @@ class Ecosystem:
             are animals able to hunt, (default False)
         probLitter : boolean, optional
             do animals have probability litter sizes, (default False)
+        eventLog : EventLog, optional
+            event recorder for births, predation, grazing, deaths and spawns, (default None)
+        history : array, optional
+            container the grid is appended to after every time step, e.g. a list,
+            FrameHistory or MemmapHistory, (default None)
+        senseField : boolean, optional
+            when hunting, compute a wrap-aware direction field to the closest prey once
+            per step instead of searching from every hunter, (default False)
+        sense : int, optional
+            sensing radius used with senseField, (default each species' sense)
+        foodWeb : FoodWeb, optional
+            food web engine resolving all interactions in one neighbourhood pass,
+            e.g. FoodWeb.default(omni), (default None)
+        crnSeed : int, optional
+            draw movement, reproduction and spawning from counter-based streams keyed
+            by agent id and time step, so runs with the same seed but different
+            features stay correlated, (default None)
+        pooling : boolean, optional
+            recycle dead animals into newborns instead of allocating, (default False)
+        timers : boolean, optional
+            schedule the end of mating cooldowns and old age deaths in a timer wheel
+            so only the animals whose deadline is due are touched, (default False)
+        memoryProbe : MemoryProbe, optional
+            samples the memory held by agents, grids, history and animation frames
+            every few time steps, (default None)
+        occupancy : str, optional
+            storage of the mushroom occupancy, 'dense' (a byte per cell), 'bits' (a bit
+            per cell), 'sparse' (a set of cells) or 'auto' (sparse until the set would
+            outgrow a raster), (default 'auto')
+        interventions : array(Intervention), optional
+            culls and introductions applied on schedule after the dead are removed,
+            see Interventions, (default None)
+        accumulators : SpatialAccumulators, optional
+            per-cell totals of occupancy time and events kept up to date every time
+            step for heatmaps, (default None)
+        lattice : float, optional
+            animals per cell at which the run switches to counts per cell, see Lattice,
+            and back to agents below half of it, not with hunting or a food web,
+            the counts draw from the crnSeed streams too, (default None)
+        lifecycle : LifecycleTable, optional
+            gives every agent a lifeId and keeps a row with its birth, death, parents,
+            litters and food eaten, (default None)
+        habitat : Habitat, optional
+            habitat raster the random moves, mushroom regrowth and placement of new
+            agents are weighted by, see Habitat, (default None)
         """
+
+        if lattice is not None and (hunting or foodWeb is not None):
+            raise ValueError("lattice mode supports neither hunting nor a food web")
         self.mapSize = rows
         self.maxShrooms = rows*rows
-        self.grid = np.zeros((rows, rows), dtype=int)
-        self.occupiedMush = np.zeros((rows, rows), dtype=int)
+        self.grid = None
+        self.occupiedMush = Occupancy.create(rows, occupancy)
         self.foxes_array = []
         self.rabbits_array = []
         self.mush_array = []
@@ -145,6 +295,29 @@ class Ecosystem:
         self.decomp = decomp
         self.hunting = hunting
         self.probLitter = probLitter
+        self.eventLog = eventLog
+        self.history = history
+        self.senseField = senseField
+        self.sense = sense
+        self.foodWeb = foodWeb
+
+        # agent ids start from 0 in every ecosystem so they match across runs
+        self.idCounters = {species.code: itertools.count() for species in [Fox, Rabbit, Mushroom]}
+        self.rng = None if crnSeed is None else Streams.CounterRNG(crnSeed)
+        self.pooling = pooling
+        self.pools = {Fox.species: [], Rabbit.species: []}
+        self.timers = Timers.TimerWheel() if timers else None
+        self.memoryProbe = memoryProbe
+        self.renderFrames = []
+        self.interventions = list(interventions) if interventions is not None else []
+        self.interventionHistory = []
+        self.accumulators = accumulators
+        self.lattice = lattice
+        self.cellLattice = None
+        self.latticeSwitches = []
+        self.lifecycle = lifecycle
+        self.habitat = habitat
+        self.ticks = 0
 
     def saveInitState(self):
         """
@@ -187,14 +360,11 @@ class Ecosystem:
             maximum hunger before fox dies, (deafult 10)
         age : int, optional
             the starting age of the animal, (default 10)
-        locations : array(tuple), optional
-            defined locations where the animal should be spawned, (default None)
+        locations : array(int), optional
+            N x 2 locations where the animal should be spawned, (default None)
         """
-        self.numFoxes.append(numFoxes)
-        for i in range(numFoxes):
-            loc = locations[i] if locations != None else None
-            fox = Fox(mapSize=self.mapSize, location=loc, maxHunger=maxHunger, age=age)
-            self.foxes_array.append(fox)
+        foxes = self.spawn(Fox, numFoxes, locations=locations, maxHunger=maxHunger, age=age)
+        self.numFoxes.append(len(foxes))
 
     def createRabbits(self, numRabbits, maxHunger=10, age=8, locations=None):
         """
@@ -208,15 +378,13 @@ class Ecosystem:
             maximum hunger before rabbit dies, (deafult 10)
         age : int, optional
             the starting age of the animal, (default 10)
-        locations : array(tuple), optional
-            defined locations where the animal should be spawned, (default None)
+        locations : array(int), optional
+            N x 2 locations where the animal should be spawned, (default None)
         """
 
-        self.numRabbits.append(numRabbits)
-        for i in range(numRabbits):
-            loc = locations[i] if locations != None else None
-            rabbit = Rabbit(mapSize=self.mapSize, location=loc, maxHunger=maxHunger, age=age)
-            self.rabbits_array.append(rabbit)
+        rabbits = self.spawn(Rabbit, numRabbits, locations=locations, maxHunger=maxHunger,
+                             age=age)
+        self.numRabbits.append(len(rabbits))
 
     def createMushrooms(self, numMushrooms, locations=None):
         """
@@ -226,8 +394,8 @@ class Ecosystem:
         ----------
         numMushrooms : int
             number of mushrooms to create
-        locations : array(tuple), optional
-            defined locations where the animal should be spawned, (default None)
+        locations : array(int), optional
+            N x 2 locations where the animal should be spawned, (default None)
         """
 
         while numMushrooms > self.maxShrooms:
@@ -239,30 +407,225 @@ class Ecosystem:
             except ValueError:
                 print("Too Many Mushshrooms for that grid, lower amount and Try again...")
 
-        self.numMushrooms.append(numMushrooms)
-        for i in range(numMushrooms):
-            loc = locations[i] if locations != None else None
-            mush = Mushroom(mapSize=self.mapSize, location=loc)
+        # mushrooms are placed on distinct free cells
+        mushrooms = self.spawn(Mushroom, numMushrooms, locations=locations)
+        self.numMushrooms.append(len(mushrooms))
 
-            #check if space is already filled by mush, if yes find a free space
-            while self.occupiedMush[mush.location[0]][mush.location[1]] == 1:
-                mush = Mushroom(mapSize=self.mapSize, location=None)
-            self.occupiedMush[mush.location[0]][mush.location[1]] = 1
-            self.mush_array.append(mush)
+    def spawn(self, species, count=None, locations=None, distribution=None, randomState=None,
+              **attributes):
+        """
+        Adds many agents of a species at once, at the start or during a run
+
+        Locations that are not given are drawn from randomState. Mushrooms are only
+        placed on free cells, duplicate and occupied cells are dropped. With common
+        random numbers and no randomState, cells and sizes come from the LOCATION and
+        SIZE streams of the species, so runs with the same seed start alike.
+
+        Parameters
+        ----------
+        species : str or class
+            'Fox', 'Rabbit', 'Mushroom' or the class itself
+        count : int, optional
+            number of agents, (Default the number of locations)
+        locations : array(int), optional
+            N x 2 x,y locations, (Default drawn from distribution)
+        distribution : array(float), optional
+            rows x rows weights of the cells the locations are drawn from, (Default uniform,
+            or where the habitat lets animals move and mushrooms grow)
+        randomState : RandomState, optional
+            draws the locations and mushroom sizes, (Default the streams, or numpy's
+            global state without them)
+        **attributes
+            scalars or arrays of N values passed on to each agent, e.g. age, hunger
+            and maxHunger for animals or size for mushrooms
+
+        Returns
+        -------
+        array(Animal) or array(Food)
+            the agents added
+        """
+
+        if count is None and locations is None:
+            raise ValueError("give the count or the locations of the agents to spawn")
+        if isinstance(species, str):
+            species = {Fox.species: Fox, Rabbit.species: Rabbit, Mushroom.species: Mushroom}[species]
+        unique = species is Mushroom
+        agentArray = self.speciesArrays()[species.species]
+        if locations is None and distribution is None and self.habitat is not None:
+            # animals where they can move, mushrooms where they grow
+            distribution = self.habitat.growthRaster() if unique else self.habitat.placement()
+        if randomState is not None:
+            random, sizes = randomState, randomState
+        else:
+            # keyed by the agents already there, so every call draws anew
+            random = self.randomState(Streams.LOCATION, len(agentArray), species.code)
+            sizes = self.randomState(Streams.SIZE, len(agentArray), species.code)
+        if locations is None:
+            flat = self.sampleCells(count, distribution, unique, random)
+        else:
+            locations = np.asarray(locations, dtype=np.int64).reshape(-1, 2)
+            if count is not None:
+                locations = locations[:count]
+            flat = locations[:, 0]*self.mapSize + locations[:, 1]
+            if unique:
+                # first of any duplicate, on cells without a mushroom
+                flat = flat[np.sort(np.unique(flat, return_index=True)[1])]
+                flat = flat[self.occupiedMush.take(flat) == 0]
+        number = len(flat)
+        locations = np.stack([flat // self.mapSize, flat % self.mapSize], axis=1).tolist()
+        columns = {key: np.broadcast_to(value, (number,)).tolist()
+                   for key, value in attributes.items()}
+
+        if unique:
+            self.occupiedMush.put(flat)
+            if 'size' not in columns:
+                # bundle sizes of Mushroom, drawn at once
+                columns['size'] = sizes.randint(1, 3, number).tolist()
+            create = species
+        else:
+            create = species.spawn
+        keys = list(columns.keys())
+        agents = [create(self.mapSize, location, owner=self, **dict(zip(keys, values)))
+                  for location, values in zip(locations, zip(*[columns[key] for key in keys])
+                                              if keys else [()]*number)]
+
+        start = len(agentArray)
+        agentArray.extend(agents)
+        if self.timers is not None and not unique:
+            self.scheduleLifespans(agentArray, start)
+        if self.lifecycle is not None:
+            self.lifecycle.born(agents, self.ticks)
+        return agents
+
+    def sampleCells(self, count, distribution=None, unique=False, randomState=None):
+        """
+        Draws cells for new agents
+
+        Parameters
+        ----------
+        count : int
+            number of cells
+        distribution : array(float), optional
+            rows x rows weights of the cells, (Default uniform)
+        unique : boolean, optional
+            draw distinct cells without a mushroom, fewer are returned when not
+            enough cells are free, (Default False)
+        randomState : RandomState, optional
+            draws the cells, (Default numpy's global state)
+
+        Returns
+        -------
+        array(int)
+            flat cell indices x*rows + y
+        """
+
+        area = self.mapSize*self.mapSize
+        random = np.random if randomState is None else randomState
+        if count == 0:
+            return np.zeros(0, dtype=np.int64)
+        if distribution is not None:
+            weights = np.asarray(distribution, dtype=float).ravel().copy()
+            if unique:
+                weights[self.occupiedMush.occupied()] = 0
+                count = min(count, np.count_nonzero(weights))
+                if count == 0:
+                    return np.zeros(0, dtype=np.int64)
+            return random.choice(area, count, replace=not unique, p=weights/weights.sum())
+        if not unique:
+            return random.randint(0, area, count)
+
+        free = area - self.occupiedMush.count()
+        count = min(count, free)
+        if free < 2*count:
+            # most free cells are needed, pick from all of them
+            cells = np.setdiff1d(np.arange(area), self.occupiedMush.occupied())
+            return random.permutation(cells)[:count]
+        # rejection sampling keeps large sparse grids cheap
+        chosen = np.zeros(0, dtype=np.int64)
+        while len(chosen) < count:
+            draw = random.randint(0, area, 2*(count - len(chosen)) + 16)
+            draw = draw[self.occupiedMush.take(draw) == 0]
+            chosen = np.concatenate([chosen, draw])
+            chosen = chosen[np.sort(np.unique(chosen, return_index=True)[1])]
+        return chosen[:count]
 
     def step(self):
         """
         Moves the ecosystem forward one time step
         """
 
+        self.ticks = self.ticks + 1
+        if self.rng is not None:
+            self.rng.tick = self.ticks
+        if self.timers is not None:
+            self.timers.tick = self.ticks
+            # animals whose mating cooldown is over can mate again
+            for animal in self.timers.expire(self.ticks, Timers.COOLDOWN):
+                animal.mated = False
+        if self.lattice is not None:
+            self.switchMode()
+
+        if self.cellLattice is not None:
+            self.cellLattice.step()
+            foxes, rabbits, mushrooms = self.cellLattice.population()
+            self.foxesDead = foxes == 0
+            self.rabbitsDead = rabbits == 0
+            if any(intervention.due(self.ticks) for intervention in self.interventions):
+                # interventions act on agents
+                self.toAgents()
+        else:
+            self.stepAgents()
+        if self.interventions and self.cellLattice is None:
+            self.applyInterventions()
+
+        # check population sizes
+        foxes, rabbits, mushrooms = self.headCounts()
+        self.numFoxes.append(foxes)
+        self.numRabbits.append(rabbits)
+        self.numMushrooms.append(mushrooms)
+
+        # record the grid for offline rendering
+        if self.history is not None:
+            self.history.append(np.array(self.mapToGrid(), dtype=np.uint8))
+
+        if self.accumulators is not None:
+            self.accumulators.observe(self)
+        if self.memoryProbe is not None and self.ticks % self.memoryProbe.every == 0:
+            self.memoryProbe.sample(self)
+
+    def stepAgents(self):
+        """
+        Moves the agents forward one time step
+        """
+
         # move every animal one step
-        if self.hunting:
+        if self.hunting and self.senseField:
+            # one direction field per prey species, every hunter does a lookup
+            foxField = self.huntingField(self.rabbits_array, Fox.sense)
+            rabbitField = self.huntingField(self.mush_array, Rabbit.sense)
+            for i in range(max(len(self.foxes_array), len(self.rabbits_array))):
+                if i < len(self.foxes_array):
+                    fox = self.foxes_array[i]
+                    fox.step(direct=Hunting.directionAt(foxField, fox.location))
+                if i < len(self.rabbits_array):
+                    rabbit = self.rabbits_array[i]
+                    rabbit.step(direct=Hunting.directionAt(rabbitField, rabbit.location))
+        elif self.hunting:
             # allow animals to sense and hunt prey
             for i in range(max(len(self.foxes_array), len(self.rabbits_array))):
                 if i < len(self.foxes_array):
                     self.foxes_array[i].step(self.rabbits_array)
                 if i < len(self.rabbits_array):
                     self.rabbits_array[i].step(self.mush_array)
+        elif self.habitat is not None:
+            # directions of every animal at once from the habitat's alias tables
+            foxMoves = self.habitatMoves(self.foxes_array)
+            rabbitMoves = self.habitatMoves(self.rabbits_array)
+            for i in range(max(len(self.foxes_array), len(self.rabbits_array))):
+                if i < len(self.foxes_array):
+                    self.foxes_array[i].step(direct=foxMoves[i])
+                if i < len(self.rabbits_array):
+                    self.rabbits_array[i].step(direct=rabbitMoves[i])
         else:
             for i in range(max(len(self.foxes_array), len(self.rabbits_array))):
                 if i < len(self.foxes_array):
@@ -271,18 +634,295 @@ class Ecosystem:
                     self.rabbits_array[i].step()
 
         # check interactions
+        currFoxes = len(self.foxes_array)
+        currRabbits = len(self.rabbits_array)
+        currMush = len(self.mush_array)
         self.checkInteractions()
+        if self.eventLog is not None or self.accumulators is not None or self.lifecycle is not None:
+            # babies and new mushrooms are appended to the end of the arrays
+            self.recordNewAgents(self.foxes_array, currFoxes, EventLog.BIRTH)
+            self.recordNewAgents(self.rabbits_array, currRabbits, EventLog.BIRTH)
+            self.recordNewAgents(self.mush_array, currMush, EventLog.SPAWN)
+        if self.timers is not None:
+            self.scheduleLifespans(self.foxes_array, currFoxes)
+            self.scheduleLifespans(self.rabbits_array, currRabbits)
         self.removeTheDead()
 
-        # check population sizes
-        self.numFoxes.append(len(self.foxes_array))
-        self.numRabbits.append(len(self.rabbits_array))
-        self.numMushrooms.append(len(self.mush_array))
+    def randomState(self, purpose, key=0, code=0):
+        """
+        Random state for draws made for the whole ecosystem at this time step
+
+        Parameters
+        ----------
+        purpose : int
+            what the draws are used for, see Streams
+        key : int, optional
+            tells apart several users with the same purpose, (Default 0)
+        code : int, optional
+            species code the draws are for, (Default 0)
+
+        Returns
+        -------
+        RandomState
+            seeded from the counter-based streams, numpy's global state without them
+        """
+
+        if self.rng is None:
+            return np.random
+        return self.rng.state(purpose, code, key)
+
+    def applyInterventions(self):
+        """
+        Applies the interventions due at the current time step
+        """
+
+        for index, intervention in enumerate(self.interventions):
+            if intervention.due(self.ticks):
+                change = intervention.apply(self)
+                code = {Fox.species: Fox.code, Rabbit.species: Rabbit.code,
+                        Mushroom.species: Mushroom.code}[intervention.species]
+                self.interventionHistory.append((self.ticks, index, code, change))
+        # an intervention can wipe out a species
+        self.foxesDead = len(self.foxes_array) == 0
+        self.rabbitsDead = len(self.rabbits_array) == 0
+
+    def habitatMoves(self, animalArray):
+        """
+        Draws the direction of the next move of every animal from the habitat
+
+        Parameters
+        ----------
+        animalArray : array(Animal)
+            animals about to move
+
+        Returns
+        -------
+        array(int)
+            direction of every animal, see Animal.step
+        """
+
+        locations = [animal.location for animal in animalArray]
+        if self.rng is None:
+            uniforms = np.random.random(len(animalArray))
+        else:
+            uniforms = [Streams.uniform(animal, Streams.MOVE) for animal in animalArray]
+        return self.habitat.sampleMoves(locations, uniforms).tolist()
+
+    def regrowMushrooms(self, currMush):
+        """
+        Mushrooms reproduce asexually, weighted by the habitat
+
+        The chance of every mushroom is scaled by the growth factor of its cell
+        and the new ones grow on free cells drawn by growth factor.
+
+        Parameters
+        ----------
+        currMush : int
+            number of mushrooms that reproduce, the first ones in the array
+        """
+
+        mushrooms = self.mush_array[:currMush]
+        if not mushrooms:
+            return
+        chance = np.array([mushroom.probRepro for mushroom in mushrooms])
+        chance = chance*self.habitat.growthAt([mushroom.location for mushroom in mushrooms])
+        if self.rng is None:
+            uniforms = np.random.random(len(mushrooms))
+        else:
+            uniforms = np.array([Streams.uniform(mushroom, Streams.SPAWN) for mushroom in mushrooms])
+        parents = [mushroom for mushroom, grows in zip(mushrooms, uniforms < chance) if grows]
+        flat = self.sampleCells(len(parents), self.habitat.growthRaster(), unique=True,
+                                randomState=self.randomState(Streams.SPAWN, code=Mushroom.code))
+        self.occupiedMush.put(flat)
+        for parent, cell in zip(parents, flat.tolist()):
+            mush = Mushroom(self.mapSize, location=[cell // self.mapSize, cell % self.mapSize],
+                            owner=self)
+            mush.parentId = parent.agentId
+            self.mush_array.append(mush)
+
+    def switchMode(self):
+        """
+        Switches between agents and cell counts on the population density
+
+        Switching back happens below half of the threshold, so a density close
+        to it does not switch every step.
+        """
+
+        area = self.mapSize*self.mapSize
+        if self.cellLattice is None:
+            if len(self.foxes_array) + len(self.rabbits_array) >= self.lattice*area:
+                self.toLattice()
+        elif self.cellLattice.animals() < self.lattice*area/2:
+            self.toAgents()
+
+    def toLattice(self):
+        """
+        Replaces the agents by cell counts
+
+        Events are not recorded while the ecosystem runs on cell counts, the
+        agents end in the lifecycle table as MERGED and new ones start when
+        switching back.
+        """
+
+        self.cellLattice = Lattice.CellLattice.fromAgents(self)
+        if self.lifecycle is not None:
+            self.lifecycle.ended(self.foxes_array + self.rabbits_array + self.mush_array,
+                                 self.ticks)
+        for animal in self.foxes_array + self.rabbits_array:
+            # pending timers of the dropped animals must not fire
+            animal.removed = True
+        self.foxes_array = []
+        self.rabbits_array = []
+        self.mush_array = []
+        self.occupiedMush.clear()
+        self.latticeSwitches.append((self.ticks, 1))
+
+    def toAgents(self):
+        """
+        Replaces the cell counts by agents
+        """
+
+        cellLattice = self.cellLattice
+        self.cellLattice = None
+        cellLattice.toAgents(self)
+        self.latticeSwitches.append((self.ticks, 0))
+
+    def headCounts(self):
+        """
+        Returns the number of foxes, rabbits and mushrooms
+
+        Returns
+        -------
+        tuple(int)
+            foxes, rabbits and mushrooms
+        """
+
+        if self.cellLattice is not None:
+            return self.cellLattice.population()
+        return len(self.foxes_array), len(self.rabbits_array), len(self.mush_array)
+
+    def huntingField(self, preyArray, sense):
+        """
+        Computes the direction to the closest prey from every cell
+
+        Parameters
+        ----------
+        preyArray : array(Animal) or array(Food)
+            prey being hunted
+        sense : int
+            sensing radius of the hunters, overridden by the ecosystem's sense
+
+        Returns
+        -------
+        array(int8)
+            direction field, see Hunting.directionField
+        """
+
+        if self.sense is not None:
+            sense = self.sense
+        prey = Hunting.occupancyGrid(self.locationArray(preyArray), self.mapSize)
+        return Hunting.directionField(prey, sense)[0]
+
+    def simulate(self, maxFrames=200):
+        """
+        Runs the ecosystem without rendering
+
+        Parameters
+        ----------
+        maxFrames : int, optional
+            maximum number of time steps to run (Default 200)
+
+        Returns
+        -------
+        int
+            number of time steps run
+        """
+
+        frames = 0
+        # loop until a species is extinct
+        while self.foxesDead == False and self.rabbitsDead == False:
+            self.step()
+            frames = frames + 1
+            if frames == maxFrames:
+                break
+        return frames
+
+    def recordEvent(self, kind, agent, other=None):
+        """
+        Records an event in the event log and the accumulators
+
+        Parameters
+        ----------
+        kind : int
+            type of event, see EventLog
+        agent : Animal or Food
+            agent the event happened to
+        other : Animal or Food, optional
+            other agent involved in the event, (default None)
+        """
+
+        if self.accumulators is not None:
+            self.accumulators.event(self.ticks, kind, agent.location[0], agent.location[1],
+                                        agent.code)
+        if self.lifecycle is not None:
+            self.lifecycle.event(self.ticks, kind, agent, other)
+        if self.eventLog is None:
+            return
+        if other is None:
+            otherSpecies, otherId = 0, -1
+        else:
+            otherSpecies, otherId = other.code, other.agentId
+        self.eventLog.record(self.ticks, kind, agent.code, agent.agentId,
+                             agent.location[0], agent.location[1], otherSpecies, otherId)
+
+    def recordNewAgents(self, animalArray, start, kind):
+        """
+        Records the agents added to an array after the given index
+
+        Parameters
+        ----------
+        animalArray : array(Animal) or array(Food)
+            array the agents were added to
+        start : int
+            length of the array before the agents were added
+        kind : int
+            type of event, see EventLog
+        """
+
+        if self.lifecycle is not None:
+            self.lifecycle.born(animalArray[start:], self.ticks)
+        for agent in animalArray[start:]:
+            if self.accumulators is not None:
+                self.accumulators.event(self.ticks, kind, agent.location[0], agent.location[1],
+                                        agent.code)
+            if self.eventLog is not None:
+                self.eventLog.record(self.ticks, kind, agent.code, agent.agentId,
+                                     agent.location[0], agent.location[1],
+                                     agent.code if agent.parentId >= 0 else 0, agent.parentId)
+
+    def scheduleLifespans(self, animalArray, start=0):
+        """
+        Schedules the old age deaths of the animals after the given index
+
+        Parameters
+        ----------
+        animalArray : array(Animal)
+            array the animals were added to
+        start : int, optional
+            index of the first new animal, (Default 0)
+        """
+
+        for animal in animalArray[start:]:
+            # the animal dies in the first step its age is over its life span
+            deadline = self.ticks + animal.lifeSpan - animal.steps + 1
+            self.timers.schedule(max(deadline, self.ticks + 1), Timers.LIFESPAN, animal)
 
     def mapToGrid(self):
         """
         Maps each species to the grid
 
+        The same array is reused every call, copy it to keep a frame.
+
         Returns
         -------
         array
@@ -290,7 +930,12 @@ class Ecosystem:
         """
 
         # reset the grid
-        self.grid = np.zeros((self.mapSize, self.mapSize), dtype=int)
+        if self.grid is None:
+            self.grid = np.zeros((self.mapSize, self.mapSize), dtype=np.uint8)
+        else:
+            self.grid.fill(0)
+        if self.cellLattice is not None:
+            return self.cellLattice.toGrid(self.grid)
         currRabbits = len(self.rabbits_array)
         currFoxes = len(self.foxes_array)
         currMush = len(self.mush_array)
@@ -320,6 +965,57 @@ class Ecosystem:
 
         return self.grid
 
+    def locationArray(self, agentArray):
+        """
+        Returns the locations of the living agents as an array
+
+        Parameters
+        ----------
+        agentArray : array(Animal) or array(Food)
+            agents to locate
+
+        Returns
+        -------
+        array(int)
+            N x 2 array of x,y locations
+        """
+
+        locs = [agent.location for agent in agentArray
+                if not getattr(agent, 'beStill', False) and not getattr(agent, 'eaten', False)]
+        return np.array(locs, dtype=np.int64).reshape(-1, 2)
+
+    def densityGrids(self, factor=1):
+        """
+        Counts the members of each species in every cell or block of cells
+
+        Unlike mapToGrid nothing is overwritten, co-located animals all count.
+
+        Parameters
+        ----------
+        factor : int, optional
+            side of the square block of cells counted together, (default 1)
+
+        Returns
+        -------
+        array(int)
+            3 x blocks x blocks counts of mushrooms, rabbits and foxes
+        """
+
+        blocks = -(-self.mapSize//factor)
+        densities = np.zeros((3, blocks, blocks), dtype=np.int64)
+        if self.cellLattice is not None:
+            x, y = np.divmod(np.arange(self.mapSize*self.mapSize), self.mapSize)
+            for i, species in enumerate([Mushroom.species, Rabbit.species, Fox.species]):
+                counts = self.cellLattice.cellCounts(species).ravel()
+                np.add.at(densities[i], (x//factor, y//factor), counts)
+            return densities
+        for i, agentArray in enumerate([self.mush_array, self.rabbits_array, self.foxes_array]):
+            locs = self.locationArray(agentArray)//factor
+            # one bincount over the flattened block coordinates
+            densities[i] = np.bincount(locs[:, 0]*blocks + locs[:, 1],
+                                       minlength=blocks*blocks).reshape(blocks, blocks)
+        return densities
+
     def plotGrid(self, grid):
         """
         Plots the grid
@@ -332,6 +1028,19 @@ class Ecosystem:
 
         plt.imshow(grid[::-1],cmap=cmap, norm=n)
 
+    def plotDensity(self, maxPixels=1000):
+        """
+        Plots the species densities at screen resolution
+
+        Parameters
+        ----------
+        maxPixels : int, optional
+            maximum number of pixels along each side of the image, (default 1000)
+        """
+
+        factor = Render.levelOfDetail(self.mapSize, maxPixels)
+        plt.imshow(Render.densityImage(self.densityGrids(factor)))
+
     def animate(self, maxFrames=200):
         """
         Animates the ecosystem over time
@@ -350,8 +1059,10 @@ class Ecosystem:
         fig = plt.figure()
 
         grid = self.mapToGrid()
-        img = plt.imshow(grid[::-1],cmap=cmap,norm=n,animated=True)
+        img = plt.imshow(grid[::-1].copy(),cmap=cmap,norm=n,animated=True)
         ims = []
+        # kept on the ecosystem so the memory probe can see them
+        self.renderFrames = ims
         frames = 0
 
         pp = ProgressPlot(plot_names=["Population Growth"],
@@ -368,7 +1079,7 @@ class Ecosystem:
 
             # plot ecosystem
             grid = self.mapToGrid()
-            img = plt.imshow(grid[::-1],cmap=cmap,norm=n, animated=True)
+            img = plt.imshow(grid[::-1].copy(),cmap=cmap,norm=n, animated=True)
             ims.append([img])
             frames = frames + 1
             if frames == maxFrames:
@@ -378,11 +1089,107 @@ class Ecosystem:
         return animation.ArtistAnimation(fig, ims, interval=200, blit=True,
                                         repeat_delay=1000)
 
+    def record(self, fileName, maxFrames=200, slots=8, policy='block', interval=200, dpi=100):
+        """
+        Runs the ecosystem while a separate process renders it to a video
+
+        The frames and population counts go through shared memory to the
+        render process, see Pipeline, so stepping only waits for drawing and
+        encoding when every slot is filled, or never with the 'drop' policy.
+
+        Parameters
+        ----------
+        fileName : str
+            video file to write
+        maxFrames : int, optional
+            maximum number of time steps to run (Default 200)
+        slots : int, optional
+            number of frames that can wait for the renderer, (Default 8)
+        policy : str, optional
+            'block' waits while the renderer is behind, 'drop' skips frames, (Default 'block')
+        interval : int, optional
+            delay between frames in milliseconds, (Default 200)
+        dpi : int, optional
+            resolution of the video, (Default 100)
+
+        Returns
+        -------
+        RenderPipeline
+            the closed pipeline, with the frames sent, dropped and encoded
+        """
+
+        pipeline = Pipeline.RenderPipeline(self.mapSize, fileName, slots, policy, interval, dpi)
+        pipeline.start()
+        try:
+            foxes, rabbits, mushrooms = self.headCounts()
+            pipeline.put(self.ticks, self.mapToGrid(), (mushrooms, foxes, rabbits))
+            frames = 0
+            # loop until a species is extinct
+            while self.foxesDead == False and self.rabbitsDead == False:
+                self.step()
+                pipeline.put(self.ticks, self.mapToGrid(),
+                             (self.numMushrooms[-1], self.numFoxes[-1], self.numRabbits[-1]))
+                frames = frames + 1
+                if frames == maxFrames:
+                    break
+        finally:
+            pipeline.close()
+        return pipeline
+
+    def replay(self, history, start=0, stop=None):
+        """
+        Animates recorded grid history
+
+        Parameters
+        ----------
+        history : array(array(int))
+            recorded grids, e.g. a list, FrameHistory or MemmapHistory
+        start : int, optional
+            first time step to show (Default 0)
+        stop : int, optional
+            time step to stop at (Default end of the history)
+
+        Returns
+        -------
+        ArtistAnimation
+            animation of the recorded time steps
+        """
+
+        if stop is None:
+            stop = len(history)
+
+        fig = plt.figure()
+        ims = []
+        for t in range(start, stop):
+            # frames of a MemmapHistory are views of the file, nothing is loaded up front
+            img = plt.imshow(history[t][::-1],cmap=cmap,norm=n, animated=True)
+            ims.append([img])
+
+        return animation.ArtistAnimation(fig, ims, interval=200, blit=True,
+                                        repeat_delay=1000)
+
+    def speciesArrays(self):
+        """
+        Returns the agents of every species by name
+
+        Returns
+        -------
+        dictionary
+            array of agents keyed by species name
+        """
+
+        return {Fox.species: self.foxes_array, Rabbit.species: self.rabbits_array,
+                Mushroom.species: self.mush_array}
+
     def checkInteractions(self):
         """
         Checks all species interactiions
         """
 
+        if self.foodWeb is not None:
+            self.foodWeb.resolve(self)
+            return
+
         # only want to loop through existing animals / mushrooms
         currRabbits = len(self.rabbits_array)
         currFoxes = len(self.foxes_array)
@@ -400,13 +1207,15 @@ class Ecosystem:
                         fox.interactOwnSpecies(self.foxes_array[j], self.foxes_array, self.probLitter)
                     if j < currRabbits:
                         # does the fox eat a rabbit
-                        fox.interactRabbit(self.rabbits_array[j])
+                        if fox.interactRabbit(self.rabbits_array[j]):
+                            self.recordEvent(EventLog.PREDATION, self.rabbits_array[j], fox)
                     if j < currMush:
                         # does the fox eat a mushroom, if have not already eaten a rabbit
                         if self.omni == True:
                             if not fox.ateFood:
-                                fox.interactMushroom(self.mush_array[j])
-                                self.occupiedMush[self.mush_array[j].location[0]][self.mush_array[j].location[1]] = 0
+                                if fox.interactMushroom(self.mush_array[j]):
+                                    self.recordEvent(EventLog.GRAZING, self.mush_array[j], fox)
+                                self.occupiedMush[self.mush_array[j].location[0], self.mush_array[j].location[1]] = 0
                 # fox has interacted with everything, check if they ate food
                 if not fox.ateFood:
                     fox.hunger = fox.hunger + 1
@@ -421,17 +1230,20 @@ class Ecosystem:
                         rabbit.interactOwnSpecies(self.rabbits_array[j], self.rabbits_array, self.probLitter)
                     if j < currMush:
                         # does the rabbit eat a mushroom
-                        rabbit.interactMushroom(self.mush_array[j])
-                        self.occupiedMush[self.mush_array[j].location[0]][self.mush_array[j].location[1]] = 0
+                        if rabbit.interactMushroom(self.mush_array[j]):
+                            self.recordEvent(EventLog.GRAZING, self.mush_array[j], rabbit)
+                        self.occupiedMush[self.mush_array[j].location[0], self.mush_array[j].location[1]] = 0
                 # rabbit has interacted with everything, check if they ate food
                 if not rabbit.ateFood:
                     rabbit.hunger = rabbit.hunger + 1
 
-            # there are still mushrooms
-            if i < currMush:
+            # there are still mushrooms, the habitat grows them all at once below
+            if i < currMush and self.habitat is None:
                 mushroom = self.mush_array[i]
                 # mushrooms perform asexual reproduction
                 mushroom.asexualReproduction(self.mush_array,self.occupiedMush)
+        if self.habitat is not None:
+            self.regrowMushrooms(currMush)
 
     def removeTheDead(self):
         """
@@ -442,12 +1254,26 @@ class Ecosystem:
         # check if animals have died of natural causes
         self.checkNaturalDeath(self.foxes_array)
         self.checkNaturalDeath(self.rabbits_array)
+        if self.timers is not None:
+            for animal in self.timers.expire(self.ticks, Timers.LIFESPAN):
+                # skip animals removed in an earlier step
+                if not animal.removed:
+                    self.ageCheck(animal)
 
         if self.decomp:
             # mushrooms decompose dead animals that die from natural causes
             self.decomposeTheDead()
 
         # remove dead animals
+        if self.pooling:
+            # dead animals are kept for the next births
+            Fox.release([ fox for fox in self.foxes_array if fox.beStill], self)
+            Rabbit.release([ rabbit for rabbit in self.rabbits_array if rabbit.beStill], self)
+        if self.timers is not None:
+            # pending timers of removed animals must not fire
+            for animal in self.foxes_array + self.rabbits_array:
+                if animal.beStill:
+                    animal.removed = True
         self.foxes_array = [ fox for fox in self.foxes_array if not fox.beStill]
         self.rabbits_array = [ rabbit for rabbit in self.rabbits_array if not rabbit.beStill]
 
@@ -472,8 +1298,9 @@ class Ecosystem:
         for animal in animalArray:
             # died from starvation
             self.hungerCheck(animal)
-            # died from old age
-            self.ageCheck(animal)
+            # died from old age, scheduled by the timer wheel instead when set
+            if self.timers is None:
+                self.ageCheck(animal)
 
     def hungerCheck(self, animal):
         """
@@ -487,6 +1314,8 @@ class Ecosystem:
 
         # check if animal dies from starvation
         if animal.hunger > animal.maxHunger:
+            if not animal.beStill:
+                self.recordEvent(EventLog.STARVATION, animal)
             animal.beStill = True
             self.naturalDeaths.append(animal)
 
@@ -502,6 +1331,8 @@ class Ecosystem:
 
         # check if animal dies of old age
         if animal.steps > animal.lifeSpan:
+            if not animal.beStill:
+                self.recordEvent(EventLog.OLD_AGE, animal)
             animal.beStill = True
             self.naturalDeaths.append(animal)
 
@@ -514,10 +1345,52 @@ class Ecosystem:
         for deadAnimal in self.naturalDeaths:
             x = deadAnimal.location[0]
             y = deadAnimal.location[1]
-            if self.occupiedMush[x][y] == 0:
-                decompMush = Mushroom(mapSize=self.mapSize, location=[x,y])
+            if self.occupiedMush[x, y] == 0:
+                decompMush = Mushroom(mapSize=self.mapSize, location=[x,y], owner=self)
                 # probability check for decomposer to spawn
+                currMush = len(self.mush_array)
                 decompMush.decomposerSpawn(self.mush_array)
+                if self.eventLog is not None or self.accumulators is not None \
+                        or self.lifecycle is not None:
+                    self.recordNewAgents(self.mush_array, currMush, EventLog.SPAWN)
+
+    def populations(self):
+        """
+        Returns the population history of the three species
+
+        Returns
+        -------
+        dictionary
+            population series keyed numFoxes, numRabbits and numMushrooms, and the
+            interventionHistory keyed interventions
+        """
+
+        return {"numFoxes": self.numFoxes, "numRabbits": self.numRabbits,
+                "numMushrooms": self.numMushrooms,
+                "interventions": np.array(self.interventionHistory, dtype=np.int64).reshape(-1, 4)}
+
+    def savePopulations(self, exp, dirName):
+        """
+        Stores the population history for the report stage
+
+        Parameters
+        ----------
+        exp : str
+            Name of the experiment
+        dirName : str
+            Directory to save the file in
+
+        Returns
+        -------
+        str
+            the population file
+        """
+
+        if self.memoryProbe is not None:
+            self.memoryProbe.save(exp, dirName)
+        if self.lifecycle is not None:
+            self.lifecycle.save(exp, dirName)
+        return Report.savePopulations(self.populations(), exp, dirName)
 
     def plotPopulationHist(self, exp, dirName):
         """
@@ -529,19 +1402,12 @@ class Ecosystem:
             Name of the experiment
         dirName : str
             Directory to save the file in
+
+        Returns
+        -------
+        str
+            the figure file written
         """
 
-        x = range(len(self.numFoxes))
-
-        plt.plot(x, self.numFoxes, label='Foxes', color='r')
-        plt.plot(x, self.numRabbits, label='Rabbits', color='g')
-        plt.plot(x, self.numMushrooms, label='Mushrooms', color='b')
-        xl = plt.xlabel("Sample frames")
-        yl = plt.ylabel("Population")
-        t = plt.title("Population Growth - " + exp)
-        legend = plt.legend()
-        plt.grid(b=True, which='major', color='#ececec', linestyle='-')
-        # save the plot
-        fileName = (exp + "-histogram.png")
-        plt.savefig(fileName)
-        shutil.move(fileName,dirName)
+        # own figure written straight into the experiment directory
+        return Report.renderReport(exp, dirName, self.populations())
@@ -0,0 +1,254 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+import time
+from concurrent.futures import ProcessPoolExecutor
+from scipy import stats
+
+import Sweep
+
+"""
+Statistical equivalence of stepping engines. A faster engine draws its
+random numbers in another order, so single trajectories cannot be compared.
+Instead both engines are run for many seeds per configuration and the
+distributions of run summaries (populations at checkpoints, mean
+populations, extinction times and cycle periods) are compared with
+two-sample Kolmogorov-Smirnov tests.
+
+    python Equivalence.py foodWeb
+"""
+
+# Ecosystem options of the engines to compare, the food web is built per configuration
+ENGINES = {'reference': {}, 'foodWeb': {'foodWeb': 'default'},
+           'senseField': {'senseField': True}, 'timers': {'timers': True},
+           'pooling': {'pooling': True}}
+
+NAMES = ['Foxes', 'Rabbits', 'Mushrooms']
+
+def engineOptions(engine, exp):
+    """
+    Ecosystem options of an engine for a configuration
+
+    Parameters
+    ----------
+    engine : str or dictionary
+        name in ENGINES or Ecosystem options
+    exp : str
+        configuration name, see Sweep
+
+    Returns
+    -------
+    dictionary
+        keyword arguments for Ecosystem
+    """
+
+    options = dict(ENGINES[engine] if isinstance(engine, str) else engine)
+    if options.get('foodWeb') == 'default':
+        from FoodWeb import FoodWeb
+        options['foodWeb'] = FoodWeb.default('O' in exp and exp != 'none')
+    return options
+
+def _timedRun(args):
+    """
+    Runs one experiment on a worker process and times it
+    """
+
+    exp, seed, engine, kwargs = args
+    options = dict(kwargs)
+    options.update(engineOptions(engine, exp))
+    started = time.perf_counter()
+    populations = Sweep.runExperiment(exp, seed, **options)
+    return populations, time.perf_counter() - started
+
+def cyclePeriod(series):
+    """
+    Dominant cycle period of a population series
+
+    The period is the lag of the highest autocorrelation peak after the
+    autocorrelation first drops below zero.
+
+    Parameters
+    ----------
+    series : array(int)
+        population at every time step
+
+    Returns
+    -------
+    float
+        period in time steps, nan when the series shows no cycle
+    """
+
+    x = np.asarray(series, dtype=float)
+    x = x - x.mean()
+    if len(x) < 4 or not x.any():
+        return np.nan
+    acf = np.correlate(x, x, mode='full')[len(x) - 1:]
+    acf = acf/acf[0]
+    negative = np.nonzero(acf < 0)[0]
+    if len(negative) == 0:
+        return np.nan
+    start = negative[0]
+    # local maxima after the first zero crossing
+    peaks = np.nonzero((acf[start+1:-1] > acf[start:-2]) & (acf[start+1:-1] >= acf[start+2:]))[0]
+    peaks = peaks + start + 1
+    peaks = peaks[acf[peaks] > 0]
+    if len(peaks) == 0:
+        return np.nan
+    return float(peaks[np.argmax(acf[peaks])])
+
+def summarize(populations, maxFrames, checkpoints=4):
+    """
+    Summary statistics of one run
+
+    Parameters
+    ----------
+    populations : dictionary
+        population series keyed numFoxes, numRabbits and numMushrooms
+    maxFrames : int
+        maximum number of time steps of the run
+    checkpoints : int, optional
+        number of evenly spaced time steps the populations are taken at, (Default 4)
+
+    Returns
+    -------
+    dictionary
+        one value per statistic, extinction times are maxFrames when the
+        species survived and cycle periods nan when there is no cycle
+    """
+
+    summary = {}
+    ticks = np.linspace(0, maxFrames, checkpoints + 1)[1:].astype(int)
+    for key, name in zip(Sweep.SPECIES_KEYS, NAMES):
+        series = np.asarray(populations[key])
+        # the run stops at the first extinction, nothing changes after it
+        padded = np.concatenate([series, np.full(maxFrames + 1 - len(series), series[-1])])
+        for tick in ticks:
+            summary[name + '@' + str(tick)] = padded[tick]
+        summary['mean' + name] = padded.mean()
+        zeros = np.nonzero(series == 0)[0]
+        summary['extinct' + name] = zeros[0] if len(zeros) else maxFrames
+        summary['period' + name] = cyclePeriod(series)
+    return summary
+
+def compareSamples(reference, other, alpha=0.05):
+    """
+    Two-sample tests of every summary statistic
+
+    Parameters
+    ----------
+    reference : array(dictionary)
+        summaries of the reference runs
+    other : array(dictionary)
+        summaries of the alternative runs
+    alpha : float, optional
+        family-wise significance level, Bonferroni corrected over the
+        statistics, (Default 0.05)
+
+    Returns
+    -------
+    array(dictionary)
+        per statistic: means, standardized difference, test statistic,
+        p-value and whether the difference is significant
+    """
+
+    keys = list(reference[0].keys())
+    threshold = alpha/len(keys)
+    rows = []
+    for key in keys:
+        a = np.array([run[key] for run in reference], dtype=float)
+        b = np.array([run[key] for run in other], dtype=float)
+        a, b = a[~np.isnan(a)], b[~np.isnan(b)]
+        row = {"statistic": key, "refMean": np.nan, "otherMean": np.nan,
+               "effect": np.nan, "ks": np.nan, "p": np.nan, "rejected": False}
+        if len(a) >= 3 and len(b) >= 3:
+            pooled = np.sqrt((a.var(ddof=1) + b.var(ddof=1))/2)
+            row["refMean"], row["otherMean"] = a.mean(), b.mean()
+            row["effect"] = (b.mean() - a.mean())/pooled if pooled > 0 else 0.0
+            if pooled > 0 or a.mean() != b.mean():
+                row["ks"], row["p"] = stats.ks_2samp(a, b)
+            else:
+                # both samples hold one and the same value
+                row["ks"], row["p"] = 0.0, 1.0
+            row["rejected"] = bool(row["p"] < threshold)
+        rows.append(row)
+    return rows
+
+def equivalence(exps, seeds, engine, reference='reference', workers=None, alpha=0.05,
+                maxFrames=200, **kwargs):
+    """
+    Compares an engine with the reference engine over many seeds
+
+    Both engines run every configuration with the same seeds. Equivalence
+    means no summary statistic differs at the Bonferroni corrected level,
+    which only has power against differences the number of seeds can show,
+    so the standardized differences are reported as well.
+
+    Parameters
+    ----------
+    exps : array(str)
+        configuration names, see Sweep
+    seeds : array(int)
+        random seeds, shared by both engines
+    engine : str or dictionary
+        engine to test, a name in ENGINES or Ecosystem options
+    reference : str or dictionary, optional
+        engine to test against, (Default 'reference')
+    workers : int, optional
+        number of processes, (Default number of cores)
+    alpha : float, optional
+        family-wise significance level per configuration, (Default 0.05)
+    maxFrames : int, optional
+        maximum number of time steps, (Default 200)
+    **kwargs
+        passed on to runExperiment
+
+    Returns
+    -------
+    array(dictionary)
+        per configuration: run times, speedup, statistic tests and verdict
+    """
+
+    kwargs['maxFrames'] = maxFrames
+    jobs = [(exp, seed, eng, kwargs) for exp in exps for eng in (reference, engine)
+            for seed in seeds]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_timedRun, jobs))
+
+    report = []
+    count = len(seeds)
+    for e, exp in enumerate(exps):
+        refRuns = results[2*e*count:(2*e + 1)*count]
+        otherRuns = results[(2*e + 1)*count:(2*e + 2)*count]
+        refTime = sum(seconds for _, seconds in refRuns)
+        otherTime = sum(seconds for _, seconds in otherRuns)
+        tests = compareSamples([summarize(p, maxFrames) for p, _ in refRuns],
+                               [summarize(p, maxFrames) for p, _ in otherRuns], alpha)
+        report.append({"exp": exp, "refSeconds": refTime, "otherSeconds": otherTime,
+                       "speedup": refTime/otherTime if otherTime > 0 else np.inf,
+                       "tests": tests,
+                       "equivalent": not any(row["rejected"] for row in tests)})
+    return report
+
+def printReport(report):
+    """
+    Prints the result of an equivalence run
+
+    Parameters
+    ----------
+    report : array(dictionary)
+        output of equivalence
+    """
+
+    for row in report:
+        print("%-5s speedup %5.2fx  %s" % (row["exp"], row["speedup"],
+              "equivalent" if row["equivalent"] else "DIFFERENT"))
+        for test in row["tests"]:
+            print("  %-16s %9.2f %9.2f  d=%6.2f  p=%.4f%s"
+                  % (test["statistic"], test["refMean"], test["otherMean"], test["effect"],
+                     test["p"], "  *" if test["rejected"] else ""))
+
+if __name__ == '__main__':
+    engine = sys.argv[1] if len(sys.argv) > 1 else 'foodWeb'
+    printReport(equivalence(Sweep.allConfigurations(), range(30), engine))
@@ -0,0 +1,245 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+
+# event kinds
+BIRTH = 0
+PREDATION = 1
+GRAZING = 2
+STARVATION = 3
+OLD_AGE = 4
+SPAWN = 5
+CULL = 6
+INTRODUCTION = 7
+
+EVENT_NAMES = {BIRTH: 'birth', PREDATION: 'predation', GRAZING: 'grazing',
+               STARVATION: 'starvation', OLD_AGE: 'old age', SPAWN: 'spawn',
+               CULL: 'cull', INTRODUCTION: 'introduction'}
+
+# fixed width record for a single event (19 bytes, no padding)
+EVENT_DTYPE = np.dtype([('tick', '<u4'),
+                        ('kind', 'u1'),
+                        ('species', 'u1'),
+                        ('agentId', '<u4'),
+                        ('x', '<u2'),
+                        ('y', '<u2'),
+                        ('otherSpecies', 'u1'),
+                        ('otherId', '<i4')])
+
+class EventLog:
+    """
+    A class used to record ecosystem events as compact binary records
+
+    Events are written into a preallocated record array and flushed in chunks,
+    either to a binary file or to an in-memory list of chunks.
+
+    Attributes
+    ----------
+    fileName : str
+        binary file the chunks are appended to, None keeps them in memory
+    chunkSize : int
+        number of events buffered before a flush
+    buffer : array(EVENT_DTYPE)
+        the current chunk of events
+    count : int
+        number of events in the current chunk
+    chunks : array(array(EVENT_DTYPE))
+        flushed chunks when no file is used
+    total : int
+        total number of events recorded
+
+    Methods
+    -------
+    record(tick, kind, species, agentId, x, y, otherSpecies=0, otherId=-1)
+        Adds an event to the log
+    flush()
+        Writes the buffered events out
+    events()
+        Returns every recorded event
+    close()
+        Flushes the remaining events
+    load(fileName)
+        Reads the events from a binary log file
+    """
+
+    def __init__(self, fileName=None, chunkSize=65536):
+        """
+        Parameters
+        ----------
+        fileName : str, optional
+            binary file to write the events to, (Default None)
+        chunkSize : int, optional
+            number of events buffered before a flush, (Default 65536)
+        """
+
+        self.fileName = fileName
+        self.chunkSize = chunkSize
+        self.buffer = np.zeros(chunkSize, dtype=EVENT_DTYPE)
+        self.count = 0
+        self.chunks = []
+        self.total = 0
+
+        # start with an empty file
+        if fileName is not None:
+            open(fileName, 'wb').close()
+
+    def record(self, tick, kind, species, agentId, x, y, otherSpecies=0, otherId=-1):
+        """
+        Adds an event to the log
+
+        Parameters
+        ----------
+        tick : int
+            time step the event happened
+        kind : int
+            type of event (BIRTH, PREDATION, GRAZING, STARVATION, OLD_AGE, SPAWN)
+        species : int
+            species code of the agent
+        agentId : int
+            id of the agent
+        x : int
+            x location of the agent
+        y : int
+            y location of the agent
+        otherSpecies : int, optional
+            species code of the other agent involved, (Default 0)
+        otherId : int, optional
+            id of the other agent involved (parent, predator, grazer), (Default -1)
+        """
+
+        self.buffer[self.count] = (tick, kind, species, agentId, x, y, otherSpecies, otherId)
+        self.count = self.count + 1
+        self.total = self.total + 1
+        if self.count == self.chunkSize:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered events out
+        """
+
+        if self.count == 0:
+            return
+        if self.fileName is not None:
+            with open(self.fileName, 'ab') as f:
+                f.write(self.buffer[:self.count].tobytes())
+        else:
+            self.chunks.append(self.buffer[:self.count].copy())
+        self.count = 0
+
+    def events(self):
+        """
+        Returns every recorded event
+
+        Returns
+        -------
+        array(EVENT_DTYPE)
+            the recorded events in order
+        """
+
+        if self.fileName is not None:
+            stored = [EventLog.load(self.fileName)]
+        else:
+            stored = list(self.chunks)
+        stored.append(self.buffer[:self.count])
+        return np.concatenate(stored)
+
+    def close(self):
+        """
+        Flushes the remaining events
+        """
+
+        self.flush()
+
+    @staticmethod
+    def load(fileName):
+        """
+        Reads the events from a binary log file
+
+        Parameters
+        ----------
+        fileName : str
+            binary file written by an EventLog
+
+        Returns
+        -------
+        array(EVENT_DTYPE)
+            the recorded events in order
+        """
+
+        return np.fromfile(fileName, dtype=EVENT_DTYPE)
+
+def eventsPerCell(events, kind, mapSize, species=None):
+    """
+    Counts the events of one kind in every cell of the grid
+
+    Parameters
+    ----------
+    events : array(EVENT_DTYPE)
+        recorded events
+    kind : int
+        type of event to count
+    mapSize : int
+        the dimension of the ecosystem grid
+    species : int, optional
+        only count events of this species code, (Default None)
+
+    Returns
+    -------
+    array(int)
+        mapSize x mapSize grid of event counts
+    """
+
+    mask = events['kind'] == kind
+    if species is not None:
+        mask &= events['species'] == species
+    selected = events[mask]
+    cells = selected['x'].astype(np.int64)*mapSize + selected['y']
+    return np.bincount(cells, minlength=mapSize*mapSize).reshape(mapSize, mapSize)
+
+def predationRate(events, mapSize):
+    """
+    Predation events per cell per time step
+
+    Parameters
+    ----------
+    events : array(EVENT_DTYPE)
+        recorded events
+    mapSize : int
+        the dimension of the ecosystem grid
+
+    Returns
+    -------
+    array(float)
+        mapSize x mapSize grid of predation rates
+    """
+
+    ticks = max(int(events['tick'].max()) if len(events) > 0 else 0, 1)
+    return eventsPerCell(events, PREDATION, mapSize)/ticks
+
+def litterSizes(events, species):
+    """
+    Distribution of litter sizes, a litter being the births from one parent in one step
+
+    Parameters
+    ----------
+    events : array(EVENT_DTYPE)
+        recorded events
+    species : int
+        species code of the animal
+
+    Returns
+    -------
+    array(int)
+        number of litters of each size, indexed by litter size
+    """
+
+    births = events[(events['kind'] == BIRTH) & (events['species'] == species)]
+    if len(births) == 0:
+        return np.zeros(1, dtype=int)
+    # one key per (step, parent) pair
+    keys = births['tick'].astype(np.int64)*(2**32) + births['otherId'].astype(np.int64)
+    _, sizes = np.unique(keys, return_counts=True)
+    return np.bincount(sizes)
@@ -4,6 +4,9 @@ import sys
 
 import numpy as np
 import random
+import itertools
+
+import Streams
 
 class Food:
     """
@@ -19,12 +22,34 @@ class Food:
         the dimension of the grid it inhabits
     species : str
         type of food
+    code : int
+        species code used on the grid and in the event log
+    agentId : int
+        id of the food, unique within its species
+    parentId : int
+        id of the food it grew from, -1 if unknown
+    lifeId : int
+        row of the food in the ecosystem's LifecycleTable, -1 when not kept
+    owner : Ecosystem
+        ecosystem the food belongs to, None when created on its own
+    rng : CounterRNG
+        counter-based random streams of the owner, None uses numpy
+
+    Methods
+    -------
+    resetIds()
+        Starts the ids of food without an owner again from 0
     """
 
     eaten = False
     species = ""
+    code = 0
+    parentId = -1
+    lifeId = -1
+    idCounter = itertools.count()
+    owner = None
 
-    def __init__(self, mapSize, location = None):
+    def __init__(self, mapSize, location = None, owner=None):
         """
         Parameters
         ----------
@@ -32,14 +57,35 @@ class Food:
             the dimension of the grid it inhabits
         location : tuple(int), optional
             x,y location of the food, (Default None)
+        owner : Ecosystem, optional
+            ecosystem the food belongs to, its ids and random streams are used, (Default None)
         """
 
-        if location == None:
-            location = [np.random.randint(0, mapSize), np.random.randint(0, mapSize)]
+        if owner is None:
+            self.agentId = next(self.idCounter)
+        else:
+            # ids count per ecosystem so they match across runs
+            self.owner = owner
+            self.agentId = next(owner.idCounters[self.code])
+        if location is None:
+            location = [Streams.randint(self, Streams.LOCATION, 0, mapSize, 0),
+                        Streams.randint(self, Streams.LOCATION, 0, mapSize, 1)]
         self.location = location
 
         self.mapSize = mapSize
 
+    @property
+    def rng(self):
+        return None if self.owner is None else self.owner.rng
+
+    @classmethod
+    def resetIds(cls):
+        """
+        Starts the ids of food without an owner again from 0
+        """
+
+        cls.idCounter = itertools.count()
+
 #########################################################################################################
 # Mushroom class used in ecosystem ---------------------------------------------------------------------#
 #########################################################################################################
@@ -68,8 +114,11 @@ class Mushroom(Food):
 
     litter = 1
     species = 'Mushroom'
+    code = 1
+    idCounter = itertools.count()
 
-    def __init__(self, mapSize, location=None, probRepro=0.1, probDecomp=0.1):
+    def __init__(self, mapSize, location=None, probRepro=0.1, probDecomp=0.1, size=None,
+                 owner=None):
         """
         Parameters
         ----------
@@ -81,16 +130,23 @@ class Mushroom(Food):
             the probability of asexual reproduction (Default 0.1)
         probDecomp: : boolean, optional
             the probability of decomposing a dead animal (Default 0.1)
+        size : int, optional
+            number of mushrooms in the bundle, (Default random)
+        owner : Ecosystem, optional
+            ecosystem the mushroom belongs to, (Default None)
         """
-        super().__init__(mapSize, location)
+        super().__init__(mapSize, location, owner)
         self.probRepro = probRepro
         self.probDecomp = probDecomp
 
+        if size is not None:
+            self.size = size
+            return
         # determine size of the mushroom bundle
-        self.size = np.random.randint(1, 3)
+        self.size = Streams.randint(self, Streams.SIZE, 1, 3, 0)
         #roll again if max size to make max size less likely
         if self.size == 3:
-            self.size = np.random.randint(1, 3)
+            self.size = Streams.randint(self, Streams.SIZE, 1, 3, 1)
 
     def asexualReproduction(self, foodArray, occupiedSpaces):
         """
@@ -100,21 +156,26 @@ class Mushroom(Food):
         ----------
         foodArray : array(Mushroom)
             where to add new mushroom
-        occupiedSpaces : array(int)
-            locations that already have mushrooms
+        occupiedSpaces : array(int) or Occupancy
+            locations that already have mushrooms, indexed [x, y]
         """
 
         # check if mushroom will reproduce
-        if ((np.random.rand() < self.probRepro)):
+        if ((Streams.uniform(self, Streams.SPAWN) < self.probRepro)):
             for i in range(0, self.litter):
-                mush = Mushroom(self.mapSize)
+                mush = Mushroom(self.mapSize, owner=self.owner)
 
                 # update location until mushroom finds unoccupied space
-                while occupiedSpaces[mush.location[0]][mush.location[1]] == 1:
-                    mush = Mushroom(self.mapSize)
-                occupiedSpaces[mush.location[0]][mush.location[1]] = 1
+                tries = 1
+                while occupiedSpaces[mush.location[0], mush.location[1]] == 1:
+                    if tries == self.mapSize*self.mapSize:
+                        return # no free space found, the grid is (nearly) full
+                    mush = Mushroom(self.mapSize, owner=self.owner)
+                    tries = tries + 1
+                occupiedSpaces[mush.location[0], mush.location[1]] = 1
 
-                foodArray.append(Mushroom(self.mapSize))
+                mush.parentId = self.agentId
+                foodArray.append(mush)
 
     def decomposerSpawn(self, foodArray):
         """
@@ -126,6 +187,6 @@ class Mushroom(Food):
             where to add new mushroom
         """
 
-        if ((np.random.rand() < self.probDecomp)):
+        if ((Streams.uniform(self, Streams.DECOMPOSE) < self.probDecomp)):
             for i in range(0, self.litter):
                 foodArray.append(self)
@@ -0,0 +1,236 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+
+import EventLog
+
+# kinds of feeding relation
+NONE = 0
+PREDATION = 1 # the food dies (beStill)
+GRAZING = 2 # the food is eaten (eaten), gain depends on its size
+
+MAX_SIZE = 3 # largest mushroom bundle
+
+class FoodWeb:
+    """
+    A class used to resolve all species interactions from declared relations
+
+    The species and who eats or mates with whom are held as data: an
+    interaction matrix of relation kinds, a matrix of energy gains per food
+    size and a list of species that mate. Each time step every agent is put
+    in a cell index once and each actor only looks at the agents in its
+    neighbourhood, so adding a species adds rows to the matrices instead of
+    another nested loop over every pair of agents.
+
+    Attributes
+    ----------
+    species : array(str)
+        names of the species, in the order actors are resolved
+    relations : array(int)
+        S x S kind of relation, row species eats column species
+    gains : array(float)
+        S x S x MAX_SIZE hunger removed by eating food of each size
+    onlyIfHungry : array(bool)
+        S x S the food is only eaten if nothing else was eaten this step
+    mates : array(bool)
+        does each species mate with its own kind
+
+    Methods
+    -------
+    addRelation(eater, food, gain, kind=PREDATION, onlyIfHungry=False)
+        Declares that one species feeds on another
+    addMating(name)
+        Declares that a species mates with its own kind
+    resolve(ecosystem)
+        Resolves every interaction for one time step
+    interactNeighbours(ecosystem, s, i, agent, array, cells, foods)
+        Resolves the mating and feeding of one actor with its neighbourhood
+    default(omni=False)
+        Builds the fox, rabbit and mushroom food web
+    """
+
+    def __init__(self, species):
+        """
+        Parameters
+        ----------
+        species : array(str)
+            names of the species, matching Ecosystem.speciesArrays
+        """
+
+        self.species = list(species)
+        count = len(self.species)
+        self.relations = np.zeros((count, count), dtype=np.int8)
+        self.gains = np.zeros((count, count, MAX_SIZE))
+        self.onlyIfHungry = np.zeros((count, count), dtype=bool)
+        self.mates = np.zeros(count, dtype=bool)
+
+    def addRelation(self, eater, food, gain, kind=PREDATION, onlyIfHungry=False):
+        """
+        Declares that one species feeds on another
+
+        Parameters
+        ----------
+        eater : str
+            species that eats
+        food : str
+            species that is eaten
+        gain : float or array(float)
+            hunger removed by eating, one value per food size for grazing
+        kind : int, optional
+            PREDATION or GRAZING, (Default PREDATION)
+        onlyIfHungry : boolean, optional
+            only eat if nothing else was eaten this step, (Default False)
+        """
+
+        i = self.species.index(eater)
+        j = self.species.index(food)
+        self.relations[i, j] = kind
+        self.gains[i, j] = gain
+        self.onlyIfHungry[i, j] = onlyIfHungry
+
+    def addMating(self, name):
+        """
+        Declares that a species mates with its own kind
+
+        Parameters
+        ----------
+        name : str
+            species that mates
+        """
+
+        self.mates[self.species.index(name)] = True
+
+    def resolve(self, ecosystem):
+        """
+        Resolves every interaction for one time step
+
+        Parameters
+        ----------
+        ecosystem : Ecosystem
+            ecosystem whose species interact
+        """
+
+        arrays = [ecosystem.speciesArrays()[name] for name in self.species]
+        counts = [len(array) for array in arrays]
+        eats = [np.flatnonzero(self.relations[s]) for s in range(len(self.species))]
+
+        # checkInteractions releases the cell of every mushroom a grazer looks at,
+        # so occupancy only holds for mushrooms spawned during the step
+        for s, array in enumerate(arrays):
+            if counts[s] > 0 and (self.relations[s] == GRAZING).any():
+                ecosystem.occupiedMush.clear()
+                break
+
+        # one pass to index every agent by cell
+        cells = {}
+        for s, array in enumerate(arrays):
+            for i in range(counts[s]):
+                agent = array[i]
+                key = (agent.location[0], agent.location[1])
+                if key not in cells:
+                    cells[key] = []
+                cells[key].append((s, i, agent))
+
+        # agents are resolved interleaved by index, like checkInteractions
+        for i in range(max(counts) if counts else 0):
+            for s, array in enumerate(arrays):
+                if i >= counts[s]:
+                    continue
+                agent = array[i]
+                if len(eats[s]) > 0 or self.mates[s]:
+                    self.interactNeighbours(ecosystem, s, i, agent, array, cells, eats[s])
+                if hasattr(agent, 'asexualReproduction') and ecosystem.habitat is None:
+                    # mushrooms perform asexual reproduction
+                    agent.asexualReproduction(array, ecosystem.occupiedMush)
+        if ecosystem.habitat is not None and 'Mushroom' in self.species:
+            # the habitat grows all mushrooms at once
+            ecosystem.regrowMushrooms(counts[self.species.index('Mushroom')])
+
+    def interactNeighbours(self, ecosystem, s, i, agent, array, cells, foods):
+        """
+        Resolves the mating and feeding of one actor with its neighbourhood
+
+        Parameters
+        ----------
+        ecosystem : Ecosystem
+            ecosystem whose species interact
+        s : int
+            species index of the actor
+        i : int
+            index of the actor in its array
+        agent : Animal
+            the actor
+        array : array(Animal)
+            array of the actor's species, babies are added to it
+        cells : dictionary
+            agents in each cell as (species index, array index, agent)
+        foods : array(int)
+            species indices the actor feeds on
+        """
+
+        x, y = agent.location[0], agent.location[1]
+        # neighbourhood of vicinityCheck, does not wrap
+        neighbours = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                neighbours.extend(cells.get((x+dx, y+dy), ()))
+        # keep the array order of checkInteractions
+        neighbours.sort(key=lambda entry: (entry[0], entry[1]))
+
+        if self.mates[s]:
+            for t, j, partner in neighbours:
+                if t == s and j != i:
+                    agent.interactOwnSpecies(partner, array, ecosystem.probLitter)
+
+        for f in foods:
+            kind = self.relations[s, f]
+            for t, j, food in neighbours:
+                if t != f:
+                    continue
+                if self.onlyIfHungry[s, f] and agent.ateFood:
+                    break
+                if kind == PREDATION and not food.beStill:
+                    food.beStill = True
+                    agent.hunger = agent.hunger - self.gains[s, f, 0]
+                    ecosystem.recordEvent(EventLog.PREDATION, food, agent)
+                elif kind == GRAZING and not food.eaten:
+                    food.eaten = True
+                    size = food.size if 1 <= food.size <= MAX_SIZE else 1
+                    agent.hunger = agent.hunger - self.gains[s, f, size-1]
+                    ecosystem.occupiedMush[food.location[0], food.location[1]] = 0
+                    ecosystem.recordEvent(EventLog.GRAZING, food, agent)
+                else:
+                    continue
+                agent.ateFood = True
+
+        # actor has interacted with everything, check if it ate food
+        if len(foods) > 0 and not agent.ateFood:
+            agent.hunger = agent.hunger + 1
+
+    @staticmethod
+    def default(omni=False):
+        """
+        Builds the fox, rabbit and mushroom food web
+
+        Parameters
+        ----------
+        omni : boolean, optional
+            are foxes omnivores, (Default False)
+
+        Returns
+        -------
+        FoodWeb
+            the food web used by checkInteractions
+        """
+
+        web = FoodWeb(['Fox', 'Rabbit', 'Mushroom'])
+        web.addRelation('Fox', 'Rabbit', 1)
+        web.addRelation('Rabbit', 'Mushroom', [1, 2, 3], kind=GRAZING)
+        if omni:
+            # mushrooms are not as good as rabbits
+            web.addRelation('Fox', 'Mushroom', [0.5, 0.75, 1], kind=GRAZING, onlyIfHungry=True)
+        web.addMating('Fox')
+        web.addMating('Rabbit')
+        return web
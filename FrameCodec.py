@@ -0,0 +1,258 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+
+"""
+Compact storage for grid history. Every keyframeInterval frames a keyframe
+is stored as a 2-bit packed raster (4 cells per byte), the frames in between
+only store the cells that changed: the gaps between changed cell indices
+(a run-length encoding of the unchanged cells) in the smallest unsigned
+dtype that fits, and the 2-bit packed XOR of the old and new values.
+"""
+
+KEYFRAME = 0
+DELTA = 1
+
+GAP_DTYPES = [np.uint8, np.uint16, np.uint32, np.uint64]
+
+def pack2bit(values):
+    """
+    Packs values in the range 0-3 four to a byte
+
+    Parameters
+    ----------
+    values : array(int)
+        values to pack
+
+    Returns
+    -------
+    array(uint8)
+        packed values
+    """
+
+    values = np.asarray(values, dtype=np.uint8).ravel()
+    if values.size > 0 and values.max() > 3:
+        raise ValueError("Only values 0-3 can be packed into 2 bits")
+    padded = np.zeros(-(-values.size//4)*4, dtype=np.uint8)
+    padded[:values.size] = values
+    quads = padded.reshape(-1, 4)
+    return quads[:, 0] | (quads[:, 1] << 2) | (quads[:, 2] << 4) | (quads[:, 3] << 6)
+
+def unpack2bit(packed, count):
+    """
+    Unpacks values packed by pack2bit
+
+    Parameters
+    ----------
+    packed : array(uint8)
+        packed values
+    count : int
+        number of values to unpack
+
+    Returns
+    -------
+    array(uint8)
+        unpacked values
+    """
+
+    shifts = np.array([0, 2, 4, 6], dtype=np.uint8)
+    return ((packed[:, None] >> shifts) & 3).ravel()[:count]
+
+class FrameHistory:
+    """
+    A class used to store grid history as keyframes and sparse deltas
+
+    Attributes
+    ----------
+    rows : int
+        the dimension of the grid
+    keyframeInterval : int
+        number of frames between keyframes
+    frames : array(tuple)
+        encoded frames, (KEYFRAME, packed) or (DELTA, gaps, packed xor)
+    previous : array(uint8)
+        last grid appended, deltas are taken against it
+
+    Methods
+    -------
+    append(grid)
+        Encodes and stores a grid
+    frame(t)
+        Decodes the grid at a time step
+    nbytes()
+        Number of bytes used by the encoded frames
+    save(fileName)
+        Writes the encoded frames to a file
+    load(fileName)
+        Reads encoded frames written by save
+    """
+
+    def __init__(self, rows=None, keyframeInterval=50):
+        """
+        Parameters
+        ----------
+        rows : int, optional
+            the dimension of the grid, (Default taken from the first grid)
+        keyframeInterval : int, optional
+            number of frames between keyframes, (Default 50)
+        """
+
+        self.rows = rows
+        self.keyframeInterval = keyframeInterval
+        self.frames = []
+        self.previous = None
+        # last decoded frame, speeds up sequential playback
+        self.cacheTick = -1
+        self.cacheGrid = None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            ticks = range(*index.indices(len(self)))
+            out = np.zeros((len(ticks), self.rows, self.rows), dtype=np.uint8)
+            for i, t in enumerate(ticks):
+                out[i] = self.frame(t)
+            return out
+        if index < 0:
+            index = index + len(self)
+        return self.frame(index)
+
+    def append(self, grid):
+        """
+        Encodes and stores a grid
+
+        Parameters
+        ----------
+        grid : array(int)
+            rows x rows grid with values 0-3
+        """
+
+        grid = np.asarray(grid, dtype=np.uint8)
+        if self.rows is None:
+            self.rows = grid.shape[0]
+
+        if len(self.frames) % self.keyframeInterval == 0:
+            self.frames.append((KEYFRAME, pack2bit(grid)))
+        else:
+            xor = (grid ^ self.previous).ravel()
+            changed = np.flatnonzero(xor)
+            gaps = np.diff(changed, prepend=-1)
+            dtype = GAP_DTYPES[-1]
+            for candidate in GAP_DTYPES:
+                if gaps.size == 0 or gaps.max() <= np.iinfo(candidate).max:
+                    dtype = candidate
+                    break
+            self.frames.append((DELTA, gaps.astype(dtype), pack2bit(xor[changed])))
+        self.previous = grid.copy()
+
+    def frame(self, t):
+        """
+        Decodes the grid at a time step
+
+        Parameters
+        ----------
+        t : int
+            index of the frame
+
+        Returns
+        -------
+        array(uint8)
+            rows x rows grid
+        """
+
+        if t < 0 or t >= len(self.frames):
+            raise IndexError("frame index out of range")
+
+        key = t - t % self.keyframeInterval
+        if self.cacheGrid is not None and key <= self.cacheTick <= t:
+            # continue from the last decoded frame
+            start = self.cacheTick + 1
+            flat = self.cacheGrid.ravel().copy()
+        else:
+            start = key + 1
+            flat = unpack2bit(self.frames[key][1], self.rows*self.rows)
+
+        for i in range(start, t + 1):
+            _, gaps, packed = self.frames[i]
+            changed = np.cumsum(gaps, dtype=np.int64) - 1
+            flat[changed] ^= unpack2bit(packed, changed.size)
+
+        grid = flat.reshape(self.rows, self.rows)
+        self.cacheTick, self.cacheGrid = t, grid
+        return grid.copy()
+
+    def nbytes(self):
+        """
+        Number of bytes used by the encoded frames
+
+        Returns
+        -------
+        int
+            size of the encoded frames
+        """
+
+        return sum(sum(part.nbytes for part in frame[1:]) for frame in self.frames)
+
+    def save(self, fileName):
+        """
+        Writes the encoded frames to a file
+
+        Parameters
+        ----------
+        fileName : str
+            npz file to write
+        """
+
+        parts = []
+        # kind, gap itemsize, gap count, xor bytes per frame
+        table = np.zeros((len(self.frames), 4), dtype=np.int64)
+        for i, frame in enumerate(self.frames):
+            if frame[0] == KEYFRAME:
+                table[i] = (KEYFRAME, 0, 0, frame[1].size)
+                parts.append(frame[1])
+            else:
+                table[i] = (DELTA, frame[1].itemsize, frame[1].size, frame[2].size)
+                parts.append(frame[1].view(np.uint8))
+                parts.append(frame[2])
+        data = np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint8)
+        np.savez(fileName, data=data, table=table,
+                 meta=np.array([self.rows or 0, self.keyframeInterval]))
+
+    @staticmethod
+    def load(fileName):
+        """
+        Reads encoded frames written by save
+
+        Parameters
+        ----------
+        fileName : str
+            npz file to read
+
+        Returns
+        -------
+        FrameHistory
+            the stored history
+        """
+
+        with np.load(fileName) as stored:
+            data, table, meta = stored['data'], stored['table'], stored['meta']
+        history = FrameHistory(int(meta[0]), int(meta[1]))
+        offset = 0
+        for kind, itemsize, count, size in table:
+            if kind == KEYFRAME:
+                history.frames.append((KEYFRAME, data[offset:offset+size]))
+                offset = offset + size
+            else:
+                gapBytes = itemsize*count
+                dtype = [d for d in GAP_DTYPES if np.dtype(d).itemsize == itemsize][0]
+                gaps = data[offset:offset+gapBytes].copy().view(dtype)
+                offset = offset + gapBytes
+                history.frames.append((DELTA, gaps, data[offset:offset+size]))
+                offset = offset + size
+        if len(history) > 0:
+            history.previous = history.frame(len(history) - 1)
+        return history
@@ -0,0 +1,272 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+
+from Lattice import MOVES
+
+"""
+Habitat raster that shapes where animals go and where mushrooms grow.
+Every cell has a habitat class, e.g. 0 meadow, 1 forest, 2 water, and
+every class has
+
+    a move weight   how readily animals step onto a cell of the class,
+                    0 for cells they cannot enter
+    a growth factor scales the chance of a mushroom spawning another one
+                    and weighs the free cells new mushrooms grow on
+
+A move goes to one of the 8 neighbours of Animal.step with odds
+proportional to their move weights. The odds only depend on the classes
+of the 8 neighbours, so one alias table is built per distinct
+neighbourhood and every cell points at its table. A move is then a
+single uniform draw and two lookups, for any number of animals at once.
+Animals with no neighbour they can enter stay where they are.
+"""
+
+STAY = 8 # direction of Animal.step that does not move
+
+def aliasTable(weights):
+    """
+    Builds an alias table for drawing from a discrete distribution
+
+    Parameters
+    ----------
+    weights : array(float)
+        non-negative weights, not all 0
+
+    Returns
+    -------
+    array(float)
+        chance of keeping each column
+    array(int)
+        outcome of each column when not kept
+    """
+
+    count = len(weights)
+    scaled = np.asarray(weights, dtype=float)*count/np.sum(weights)
+    keep = np.ones(count)
+    alias = np.arange(count)
+    small = [i for i in range(count) if scaled[i] < 1]
+    large = [i for i in range(count) if scaled[i] >= 1]
+    while small and large:
+        less = small.pop()
+        more = large.pop()
+        keep[less] = scaled[less]
+        alias[less] = more
+        # the larger outcome gives up what fills the smaller column
+        scaled[more] = scaled[more] + scaled[less] - 1
+        if scaled[more] < 1:
+            small.append(more)
+        else:
+            large.append(more)
+    return keep, alias
+
+class Habitat:
+    """
+    A class used to represent the habitat classes of the grid
+
+    Attributes
+    ----------
+    rows : int
+        the dimension of the grid
+    classes : array(int)
+        rows x rows habitat class of every cell, indexed [x, y]
+    moveWeights : array(float)
+        weight of moving onto a cell of every class
+    growth : array(float)
+        mushroom growth factor of every class
+    keep : array(float)
+        tables x 8 chance of keeping each column of the alias tables
+    alias : array(int)
+        tables x 8 outcome of each column when not kept
+    stuck : array(bool)
+        tables with no neighbour to move to
+    tables : array(int)
+        rows x rows alias table of every cell
+
+    Methods
+    -------
+    load(fileName, moveWeights=None, growth=None, rows=None, palette=None)
+        Reads the classes from a .npy file or an image
+    moveOdds()
+        Returns the chance of every direction from every cell
+    sampleMoves(locations, uniforms)
+        Draws a direction for every location
+    allows(location, direct)
+        Checks if a move in a given direction can be made
+    growthAt(locations)
+        Returns the growth factor at every location
+    growthRaster()
+        Returns the growth factor of every cell
+    placement()
+        Returns the move weight of every cell, where animals can be placed
+    """
+
+    def __init__(self, classes, moveWeights=None, growth=None):
+        """
+        Parameters
+        ----------
+        classes : array(int)
+            rows x rows habitat class of every cell, from 0
+        moveWeights : array(float), optional
+            weight of moving onto a cell of every class, (Default 1 for all)
+        growth : array(float), optional
+            mushroom growth factor of every class, (Default 1 for all)
+        """
+
+        classes = np.asarray(classes, dtype=np.int64)
+        if classes.ndim != 2 or classes.shape[0] != classes.shape[1]:
+            raise ValueError("habitat classes must be a square raster")
+        number = int(classes.max()) + 1
+        self.rows = classes.shape[0]
+        self.classes = classes
+        self.moveWeights = np.ones(number) if moveWeights is None else np.asarray(moveWeights, dtype=float)
+        self.growth = np.ones(number) if growth is None else np.asarray(growth, dtype=float)
+        if len(self.moveWeights) < number or len(self.growth) < number:
+            raise ValueError("habitat has " + str(number) + " classes")
+
+        # weight of the neighbour in every direction, wrapping like locationCheck
+        weights = np.stack([self.moveWeights[np.roll(classes, (-dx, -dy), axis=(0, 1))]
+                            for dx, dy in MOVES], axis=-1)
+        neighbourhoods, tables = np.unique(weights.reshape(-1, len(MOVES)), axis=0,
+                                           return_inverse=True)
+        self.tables = tables.reshape(self.rows, self.rows)
+        self.keep = np.ones(neighbourhoods.shape)
+        self.alias = np.zeros(neighbourhoods.shape, dtype=np.int64)
+        self.stuck = neighbourhoods.sum(axis=1) == 0
+        for t, neighbourhood in enumerate(neighbourhoods):
+            if not self.stuck[t]:
+                self.keep[t], self.alias[t] = aliasTable(neighbourhood)
+
+    @classmethod
+    def load(cls, fileName, moveWeights=None, growth=None, rows=None, palette=None):
+        """
+        Reads the classes from a .npy file or an image
+
+        An image is read with matplotlib. Every distinct colour is a class,
+        numbered in the order of the palette or else in sorted colour order. The
+        top row of the image is the top of the animation, the highest x.
+
+        Parameters
+        ----------
+        fileName : str
+            .npy file of classes or an image file
+        moveWeights : array(float), optional
+            weight of moving onto a cell of every class, (Default 1 for all)
+        growth : array(float), optional
+            mushroom growth factor of every class, (Default 1 for all)
+        rows : int, optional
+            resample to rows x rows cells, nearest neighbour, (Default as read)
+        palette : array(float), optional
+            colour of every class, pixels take the closest one, (Default None)
+
+        Returns
+        -------
+        Habitat
+            the habitat read
+        """
+
+        if fileName.endswith('.npy'):
+            classes = np.load(fileName)
+        else:
+            import matplotlib.pyplot as plt
+
+            image = plt.imread(fileName)
+            if image.dtype == np.uint8:
+                image = image/255
+            pixels = image[..., :3] if image.ndim == 3 else image[..., None]
+            flat = pixels.reshape(-1, pixels.shape[-1])
+            if palette is not None:
+                palette = np.asarray(palette, dtype=float).reshape(len(palette), -1)
+                distance = ((flat[:, None, :] - palette[None, :, :flat.shape[1]])**2).sum(axis=2)
+                classes = distance.argmin(axis=1)
+            else:
+                classes = np.unique(flat, axis=0, return_inverse=True)[1]
+            # images start at the top, the grid is drawn with x = 0 at the bottom
+            classes = classes.reshape(image.shape[:2])[::-1]
+        if rows is not None:
+            x = np.arange(rows)*classes.shape[0]//rows
+            y = np.arange(rows)*classes.shape[1]//rows
+            classes = classes[np.ix_(x, y)]
+        return cls(classes, moveWeights, growth)
+
+    def moveOdds(self):
+        """
+        Returns the chance of every direction from every cell
+
+        Returns
+        -------
+        array(float)
+            rows*rows x 9 chance of the 8 directions and of staying, cells flat
+        """
+
+        columns = self.keep.shape[1]
+        odds = np.zeros((len(self.keep), columns + 1))
+        for t in range(len(self.keep)):
+            if self.stuck[t]:
+                odds[t, columns] = 1
+                continue
+            for column in range(columns):
+                odds[t, column] += self.keep[t, column]/columns
+                odds[t, self.alias[t, column]] += (1 - self.keep[t, column])/columns
+        return odds[self.tables.ravel()]
+
+    def sampleMoves(self, locations, uniforms):
+        """
+        Draws a direction for every location
+
+        Parameters
+        ----------
+        locations : array(int)
+            N x 2 x,y locations
+        uniforms : array(float)
+            N uniform draws in [0, 1), one per move
+
+        Returns
+        -------
+        array(int)
+            N directions of Animal.step, STAY where no neighbour can be entered
+        """
+
+        locations = np.asarray(locations, dtype=np.int64).reshape(-1, 2)
+        tables = self.tables[locations[:, 0], locations[:, 1]]
+        scaled = np.asarray(uniforms)*self.keep.shape[1]
+        column = scaled.astype(np.int64)
+        kept = scaled - column < self.keep[tables, column]
+        moves = np.where(kept, column, self.alias[tables, column])
+        moves[self.stuck[tables]] = STAY
+        return moves
+
+    def allows(self, location, direct):
+        """
+        Checks if a move in a given direction can be made
+
+        Parameters
+        ----------
+        location : tuple(int)
+            x,y location of the animal
+        direct : int
+            direction of Animal.step
+
+        Returns
+        -------
+        boolean
+            is the cell moved onto one animals can enter
+        """
+
+        if direct == STAY:
+            return True
+        x = (location[0] + MOVES[direct][0]) % self.rows
+        y = (location[1] + MOVES[direct][1]) % self.rows
+        return self.moveWeights[self.classes[x, y]] > 0
+
+    def growthAt(self, locations):
+        locations = np.asarray(locations, dtype=np.int64).reshape(-1, 2)
+        return self.growth[self.classes[locations[:, 0], locations[:, 1]]]
+
+    def growthRaster(self):
+        return self.growth[self.classes]
+
+    def placement(self):
+        return self.moveWeights[self.classes]
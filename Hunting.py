@@ -0,0 +1,102 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+
+"""
+Nearest prey direction fields. Once per time step a multi-source breadth
+first search is run outwards from every prey cell on the wrapping grid, up
+to the largest sense radius of the hunters. Every cell then knows which of
+the 8 directions used by Animal.step leads towards the closest prey, so a
+hunter picks its move with a single lookup whatever its sense radius.
+"""
+
+# x,y change of each direction accepted by Animal.step
+DIRECTIONS = [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]
+
+NO_PREY = -1
+
+def occupancyGrid(locations, rows):
+    """
+    Marks the cells that contain at least one agent
+
+    Parameters
+    ----------
+    locations : array(int)
+        N x 2 array of x,y locations
+    rows : int
+        the dimension of the grid
+
+    Returns
+    -------
+    array(bool)
+        rows x rows occupancy
+    """
+
+    grid = np.zeros((rows, rows), dtype=bool)
+    if len(locations) > 0:
+        grid[locations[:, 0], locations[:, 1]] = True
+    return grid
+
+def directionField(prey, radius):
+    """
+    Direction towards the closest prey from every cell of a wrapping grid
+
+    Distances are counted in moves of Animal.step (8 neighbours), cells further
+    than the radius from any prey get NO_PREY.
+
+    Parameters
+    ----------
+    prey : array(bool)
+        rows x rows cells containing prey
+    radius : int
+        maximum sensing distance
+
+    Returns
+    -------
+    array(int8)
+        rows x rows direction to move in, NO_PREY when none is in range
+    array(int)
+        rows x rows distance to the closest prey, radius+1 when none is in range
+    """
+
+    directions = np.full(prey.shape, NO_PREY, dtype=np.int8)
+    distance = np.full(prey.shape, radius + 1, dtype=np.int32)
+    distance[prey] = 0
+    reached = prey.copy()
+    frontier = prey
+
+    for d in range(1, radius + 1):
+        if not frontier.any():
+            break
+        found = np.zeros(prey.shape, dtype=bool)
+        for k, (dx, dy) in enumerate(DIRECTIONS):
+            # cells whose neighbour in direction k is on the frontier
+            towards = np.roll(frontier, (-dx, -dy), axis=(0, 1)) & ~reached & ~found
+            directions[towards] = k
+            found |= towards
+        distance[found] = d
+        reached |= found
+        frontier = found
+    return directions, distance
+
+def directionAt(directions, location):
+    """
+    Looks up the direction to move in from a location
+
+    Parameters
+    ----------
+    directions : array(int8)
+        direction field from directionField
+    location : tuple(int)
+        x,y location of the hunter
+
+    Returns
+    -------
+    int
+        the direction to move towards prey, None if no prey is in range
+    """
+
+    direct = directions[location[0], location[1]]
+    return None if direct == NO_PREY else int(direct)
@@ -0,0 +1,300 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+
+import EventLog
+import Streams
+
+"""
+Scheduled interventions applied by Ecosystem.step after the dead are
+removed, e.g.
+
+    Cull('Rabbit', fraction=0.2, region=(0, 25, 0, 25), tick=500)
+    Introduce('Fox', 50, every=100)
+
+A region is either a box (x0, x1, y0, y1) of grid cells, upper bounds
+excluded, or a rows x rows array that is non-zero inside the region. Every
+application is added to the ecosystem's interventionHistory as
+(tick, intervention index, species code, change in population).
+"""
+
+class Intervention:
+    """
+    A class used to represent a scheduled change to a species
+
+    Attributes
+    ----------
+    species : str
+        'Fox', 'Rabbit' or 'Mushroom'
+    tick : int
+        single time step to apply at, None when repeating
+    every : int
+        number of time steps between applications, None when applied once
+    start : int
+        first time step of a repeating intervention
+    stop : int
+        last time step of a repeating intervention, None for no end
+    region : tuple(int) or array
+        cells the intervention is limited to, None for the whole grid
+
+    Methods
+    -------
+    due(tick)
+        Checks if the intervention applies at a time step
+    apply(ecosystem)
+        Changes the ecosystem and returns the change in population
+    randomState(ecosystem)
+        Returns the random state of an application
+    """
+
+    def __init__(self, species, tick=None, every=None, start=0, stop=None, region=None):
+        """
+        Parameters
+        ----------
+        species : str
+            'Fox', 'Rabbit' or 'Mushroom'
+        tick : int, optional
+            single time step to apply at, (Default None)
+        every : int, optional
+            number of time steps between applications, (Default None)
+        start : int, optional
+            first time step of a repeating intervention, (Default 0)
+        stop : int, optional
+            last time step of a repeating intervention, (Default None)
+        region : tuple(int) or array, optional
+            cells the intervention is limited to, (Default whole grid)
+        """
+
+        if (tick is None) == (every is None):
+            raise ValueError("give either tick or every")
+        self.species = species
+        self.tick = tick
+        self.every = every
+        self.start = start
+        self.stop = stop
+        self.region = region
+
+    def due(self, tick):
+        """
+        Checks if the intervention applies at a time step
+
+        Parameters
+        ----------
+        tick : int
+            current time step
+
+        Returns
+        -------
+        boolean
+            does the intervention apply
+        """
+
+        if self.tick is not None:
+            return tick == self.tick
+        if tick < self.start or (self.stop is not None and tick > self.stop):
+            return False
+        return (tick - self.start) % self.every == 0
+
+    def apply(self, ecosystem):
+        raise NotImplementedError
+
+    def randomState(self, ecosystem):
+        """
+        Returns the random state of an application
+
+        With common random numbers it is keyed by the time step and the place
+        of the intervention in the schedule, so runs stay paired.
+
+        Parameters
+        ----------
+        ecosystem : Ecosystem
+            ecosystem the intervention is applied to
+
+        Returns
+        -------
+        RandomState
+            draws of this application
+        """
+
+        return ecosystem.randomState(Streams.INTERVENTION, ecosystem.interventions.index(self))
+
+def inRegion(region, locations):
+    """
+    Checks which locations are inside a region
+
+    Parameters
+    ----------
+    region : tuple(int) or array
+        box (x0, x1, y0, y1) or rows x rows array, None for the whole grid
+    locations : array(int)
+        N x 2 x,y locations
+
+    Returns
+    -------
+    array(bool)
+        N flags, True inside the region
+    """
+
+    if region is None:
+        return np.ones(len(locations), dtype=bool)
+    x, y = locations[:, 0], locations[:, 1]
+    if isinstance(region, tuple):
+        x0, x1, y0, y1 = region
+        return (x >= x0) & (x < x1) & (y >= y0) & (y < y1)
+    return np.asarray(region)[x, y] > 0
+
+class Cull(Intervention):
+    """
+    A class used to remove part of a species, subclass of Intervention
+
+    Attributes
+    ----------
+    fraction : float
+        share of the agents in the region removed, None when count is used
+    count : int
+        number of agents in the region removed, None when fraction is used
+
+    Methods
+    -------
+    apply(ecosystem)
+        Removes the agents and returns the change in population
+    """
+
+    def __init__(self, species, fraction=None, count=None, **schedule):
+        """
+        Parameters
+        ----------
+        species : str
+            'Fox', 'Rabbit' or 'Mushroom'
+        fraction : float, optional
+            share of the agents in the region removed, (Default None)
+        count : int, optional
+            number of agents in the region removed, (Default None)
+        **schedule
+            tick, every, start, stop and region, see Intervention
+        """
+
+        if (fraction is None) == (count is None):
+            raise ValueError("give either fraction or count")
+        super().__init__(species, **schedule)
+        self.fraction = fraction
+        self.count = count
+
+    def apply(self, ecosystem):
+        """
+        Removes agents chosen at random inside the region
+
+        Parameters
+        ----------
+        ecosystem : Ecosystem
+            ecosystem to change
+
+        Returns
+        -------
+        int
+            change in population, zero or negative
+        """
+
+        agentArray = ecosystem.speciesArrays()[self.species]
+        if not agentArray:
+            return 0
+        locations = np.array([agent.location for agent in agentArray], dtype=np.int64)
+        candidates = np.flatnonzero(inRegion(self.region, locations))
+        if self.count is not None:
+            number = min(self.count, len(candidates))
+        else:
+            number = int(round(self.fraction*len(candidates)))
+        if number == 0:
+            return 0
+        chosen = self.randomState(ecosystem).choice(candidates, number, replace=False)
+        keep = np.ones(len(agentArray), dtype=bool)
+        keep[chosen] = False
+
+        culled = [agentArray[i] for i in chosen]
+        for agent in culled:
+            ecosystem.recordEvent(EventLog.CULL, agent)
+        species = type(culled[0])
+        if hasattr(species, 'release'):
+            for animal in culled:
+                animal.beStill = True
+                animal.removed = True
+            if ecosystem.pooling:
+                species.release(culled, ecosystem)
+        else:
+            for food in culled:
+                food.eaten = True
+            flat = locations[chosen, 0]*ecosystem.mapSize + locations[chosen, 1]
+            ecosystem.occupiedMush.put(flat, 0)
+        # in place, the ecosystem keeps referring to the same list
+        agentArray[:] = [agent for agent, kept in zip(agentArray, keep) if kept]
+        return -number
+
+class Introduce(Intervention):
+    """
+    A class used to add agents of a species, subclass of Intervention
+
+    Attributes
+    ----------
+    count : int
+        number of agents added
+    attributes : dictionary
+        passed on to Ecosystem.spawn, e.g. age or maxHunger
+
+    Methods
+    -------
+    apply(ecosystem)
+        Adds the agents and returns the change in population
+    """
+
+    def __init__(self, species, count, tick=None, every=None, start=0, stop=None,
+                 region=None, **attributes):
+        """
+        Parameters
+        ----------
+        species : str
+            'Fox', 'Rabbit' or 'Mushroom'
+        count : int
+            number of agents added
+        tick, every, start, stop, region
+            schedule, see Intervention
+        **attributes
+            passed on to Ecosystem.spawn, e.g. age or maxHunger
+        """
+
+        super().__init__(species, tick=tick, every=every, start=start, stop=stop,
+                         region=region)
+        self.count = count
+        self.attributes = attributes
+
+    def apply(self, ecosystem):
+        """
+        Adds agents at random cells inside the region
+
+        Mushrooms only go to free cells, so fewer may be added.
+
+        Parameters
+        ----------
+        ecosystem : Ecosystem
+            ecosystem to change
+
+        Returns
+        -------
+        int
+            change in population, zero or positive
+        """
+
+        random = self.randomState(ecosystem)
+        if isinstance(self.region, tuple):
+            x0, x1, y0, y1 = self.region
+            locations = np.stack([random.randint(x0, x1, self.count),
+                                  random.randint(y0, y1, self.count)], axis=1)
+            agents = ecosystem.spawn(self.species, locations=locations, randomState=random,
+                                     **self.attributes)
+        else:
+            agents = ecosystem.spawn(self.species, self.count, distribution=self.region,
+                                     randomState=random, **self.attributes)
+        for agent in agents:
+            ecosystem.recordEvent(EventLog.INTRODUCTION, agent)
+        return len(agents)
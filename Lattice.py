@@ -0,0 +1,857 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+
+from Animal import Fox
+from Animal import Rabbit
+from Food import Mushroom
+import Streams
+
+"""
+Cell-count approximation of the agent-based Ecosystem for very dense
+populations. Instead of one object per animal, the number of foxes and
+rabbits in every cell is kept per age class and hunger level, and every
+time step is a handful of binomial draws per occupied state:
+
+    movement    the animals of a state split over the 8 directions of
+                Animal.step, wrapping at the edges
+    mating      eligible animals with a partner in the 3 x 3 vicinity
+                mate at the rate set by probRepro and matingCooldown,
+                litters are cut short by hunger as in canReproduce
+    predation   rabbits with a fox in their vicinity are eaten, the foxes
+                nearby share them
+    grazing     mushrooms with a rabbit (or a hungry omnivorous fox) in
+                their vicinity are eaten and shared the same way
+    deaths      starvation over maxHunger and old age, decomposers may
+                grow on the cells of natural deaths
+    regrowth    each mushroom spawns one on a free cell with probRepro
+
+The cost of a step grows with the number of occupied states, at most
+age classes x hunger levels x cells, instead of with the head count.
+Hunger is kept in half units, gains of a quarter are rounded at random.
+Ages move up a class at random, 1 / class width per step, so the age at
+maturity and old age death is spread around the exact value. Mating
+cooldowns are folded into the mating rate and the order animals act in
+within a step is not kept, e.g. the first fox to see a rabbit gets it.
+
+With common random numbers, every draw comes from a random state keyed by
+the time step, the purpose and the species, so runs with the same seed
+stay paired on cell counts too. Single animals have no ids here, so the
+pairing is per cell count and not per animal.
+"""
+
+# x,y offsets of the directions used by Animal.step
+MOVES = np.array([[1, 0], [1, 1], [0, 1], [-1, 1], [-1, 0], [-1, -1], [0, -1], [1, -1]])
+
+def vicinity(grid):
+    """
+    Sums every cell's 3 x 3 vicinity, not wrapping at the edges like vicinityCheck
+
+    Parameters
+    ----------
+    grid : array
+        rows x rows values
+
+    Returns
+    -------
+    array
+        rows x rows sums
+    """
+
+    rows = grid.shape[0]
+    padded = np.pad(grid, 1, mode='constant')
+    total = np.zeros(grid.shape, dtype=padded.dtype)
+    for dx in range(3):
+        for dy in range(3):
+            total += padded[dx:dx + rows, dy:dy + rows]
+    return total
+
+def scatter(cells, counts, rows, odds=None, randomState=None):
+    """
+    Moves the animals of every entry one step in a random direction
+
+    Parameters
+    ----------
+    cells : array(int)
+        flat cell index x*rows + y of every entry
+    counts : array(int)
+        number of animals of every entry
+    rows : int
+        the dimension of the grid
+    odds : array(float), optional
+        rows*rows x 9 chance of the 8 directions and of staying from every cell,
+        see Habitat.moveOdds, (Default 8 equal directions)
+    randomState : RandomState, optional
+        draws the moves, (Default numpy's global state)
+
+    Returns
+    -------
+    array(int)
+        entry every part came from
+    array(int)
+        flat cell index every part moved to
+    array(int)
+        number of animals of every part
+    """
+
+    random = np.random if randomState is None else randomState
+    x, y = np.divmod(cells, rows)
+    remaining = counts
+    parts = []
+    if odds is not None:
+        chances = odds[cells]
+        left = np.ones(len(cells))
+    # multinomial split as a chain of binomials, what is left stays
+    for d in range(len(MOVES)):
+        if odds is None:
+            chance = 1/(len(MOVES) - d)
+        else:
+            chance = np.clip(chances[:, d]/np.maximum(left, 1e-12), 0, 1)
+            left = left - chances[:, d]
+        moved = random.binomial(remaining, chance)
+        parts.append(moved)
+        remaining = remaining - moved
+    parts.append(remaining)
+    offsets = np.concatenate([MOVES, [[0, 0]]])
+    newCells = [((x + dx) % rows)*rows + (y + dy) % rows for dx, dy in offsets]
+    source = np.tile(np.arange(len(cells)), len(offsets))
+    return source, np.concatenate(newCells), np.concatenate(parts)
+
+def roundRandom(values, randomState=None):
+    """
+    Rounds down or up at random, keeping the mean
+
+    Parameters
+    ----------
+    values : array(float)
+        values to round
+    randomState : RandomState, optional
+        draws the rounding, (Default numpy's global state)
+
+    Returns
+    -------
+    array(int)
+        rounded values
+    """
+
+    random = np.random if randomState is None else randomState
+    low = np.floor(values)
+    return (low + (random.random_sample(np.shape(values)) < values - low)).astype(np.int64)
+
+def ageBounds(minAge, lifeSpan, ageClasses):
+    """
+    Age at the start of every class, maturity and old age on a boundary
+
+    Parameters
+    ----------
+    minAge : int
+        age the animals need to be over to reproduce
+    lifeSpan : int
+        age the animals need to be over to die of old age
+    ageClasses : int
+        number of classes
+
+    Returns
+    -------
+    array(int)
+        ageClasses + 1 boundaries, from 0 to lifeSpan + 1
+    """
+
+    span = lifeSpan + 1
+    young = min(max(int(round(ageClasses*(minAge + 1)/span)), 1), ageClasses - 1)
+    bounds = np.concatenate([np.linspace(0, minAge + 1, young + 1)[:-1],
+                             np.linspace(minAge + 1, span, ageClasses - young + 1)])
+    return np.unique(np.round(bounds).astype(np.int64))
+
+def share(eaters, food, value):
+    """
+    Food eaten and shared out among the eaters in its vicinity
+
+    Parameters
+    ----------
+    eaters : array(int)
+        rows x rows number of eaters
+    food : array(float)
+        rows x rows food items
+    value : array(float)
+        rows x rows hunger the food of a cell is worth, in half units
+
+    Returns
+    -------
+    array(bool)
+        rows x rows cells whose food is eaten
+    array(float)
+        rows x rows food items per eater
+    array(float)
+        rows x rows hunger gained per eater, in half units
+    """
+
+    near = vicinity(eaters)
+    eaten = (near > 0) & (food > 0)
+    part = np.where(eaten, 1/np.maximum(near, 1), 0)
+    return eaten, vicinity(part*food), vicinity(part*value)
+
+class CellCounts:
+    """
+    A class used to count the animals of a species by cell, age class and hunger
+
+    Entries with a count are kept as columns, a state may appear more than
+    once during a step until merge adds them up.
+
+    Attributes
+    ----------
+    species : class
+        Fox or Rabbit, the parameters are read from it
+    rows : int
+        the dimension of the grid
+    maxHunger : int
+        maximum hunger before death
+    bounds : array(int)
+        age at the start of every age class and lifeSpan + 1 at the end
+    adult : int
+        first age class over minAge
+    age : array(int)
+        age class of every entry
+    hunger : array(int)
+        hunger of every entry, in half units
+    cell : array(int)
+        flat cell index x*rows + y of every entry
+    count : array(int)
+        number of animals of every entry
+    ate : array(bool)
+        have the animals of the entry eaten this step
+
+    Methods
+    -------
+    append(age, hunger, cell, count, ate=False)
+        Adds entries
+    keep(mask)
+        Drops the entries outside a mask
+    merge()
+        Adds up entries of the same state and drops empty ones
+    total()
+        Returns the number of animals
+    cellTotals(mask=None)
+        Returns the number of animals in every cell
+    move(odds=None)
+        Moves every animal one step
+    feed(items, value)
+        Animals that have not eaten yet eat the food shared out to them
+    agents()
+        Returns locations, ages and hunger for one animal per count
+    nbytes()
+        Returns the memory used
+    """
+
+    def __init__(self, species, rows, maxHunger=10, ageClasses=16):
+        """
+        Parameters
+        ----------
+        species : class
+            Fox or Rabbit
+        rows : int
+            the dimension of the grid
+        maxHunger : int, optional
+            maximum hunger before death, (Default 10)
+        ageClasses : int, optional
+            number of age classes, (Default 16)
+        """
+
+        self.species = species
+        self.rows = rows
+        self.area = rows*rows
+        self.maxHunger = maxHunger
+        # half units from -maxHunger to maxHunger
+        self.hungerMin = -2*maxHunger
+        self.hungers = 4*maxHunger + 1
+        self.bounds = ageBounds(species.minAge, species.lifeSpan, ageClasses)
+        self.adult = int(np.searchsorted(self.bounds, species.minAge + 1))
+        self.age = np.zeros(0, dtype=np.int64)
+        self.hunger = np.zeros(0, dtype=np.int64)
+        self.cell = np.zeros(0, dtype=np.int64)
+        self.count = np.zeros(0, dtype=np.int64)
+        self.ate = np.zeros(0, dtype=bool)
+
+    def append(self, age, hunger, cell, count, ate=False):
+        """
+        Adds entries
+
+        Parameters
+        ----------
+        age : array(int)
+            age classes
+        hunger : array(int)
+            hunger in half units, raised to -maxHunger
+        cell : array(int)
+            flat cell indices
+        count : array(int)
+            number of animals
+        ate : boolean, optional
+            have the animals eaten this step, (Default False)
+        """
+
+        self.age = np.concatenate([self.age, age])
+        self.hunger = np.concatenate([self.hunger, np.maximum(hunger, self.hungerMin)])
+        self.cell = np.concatenate([self.cell, cell])
+        self.count = np.concatenate([self.count, count])
+        self.ate = np.concatenate([self.ate, np.full(len(count), ate, dtype=bool)])
+
+    def keep(self, mask):
+        self.age = self.age[mask]
+        self.hunger = self.hunger[mask]
+        self.cell = self.cell[mask]
+        self.count = self.count[mask]
+        self.ate = self.ate[mask]
+
+    def merge(self):
+        """
+        Adds up entries of the same state and drops empty ones
+
+        Whether the animals ate is forgotten, ready for the next step.
+        """
+
+        self.keep(self.count > 0)
+        keys = (self.age*self.hungers + self.hunger - self.hungerMin)*self.area + self.cell
+        keys, inverse = np.unique(keys, return_inverse=True)
+        self.count = np.bincount(inverse, weights=self.count).astype(np.int64)
+        layer, self.cell = np.divmod(keys, self.area)
+        self.age, hunger = np.divmod(layer, self.hungers)
+        self.hunger = hunger + self.hungerMin
+        self.ate = np.zeros(len(keys), dtype=bool)
+
+    def total(self):
+        return int(self.count.sum())
+
+    def cellTotals(self, mask=None):
+        """
+        Returns the number of animals in every cell
+
+        Parameters
+        ----------
+        mask : array(bool), optional
+            entries counted, (Default all)
+
+        Returns
+        -------
+        array(int)
+            rows x rows counts
+        """
+
+        count = self.count if mask is None else np.where(mask, self.count, 0)
+        totals = np.bincount(self.cell, weights=count, minlength=self.area)
+        return totals.astype(np.int64).reshape(self.rows, self.rows)
+
+    def move(self, odds=None, randomState=None):
+        """
+        Moves every animal one step in a random direction
+
+        Parameters
+        ----------
+        odds : array(float), optional
+            chance of every direction from every cell, see scatter, (Default equal)
+        randomState : RandomState, optional
+            draws the moves, (Default numpy's global state)
+        """
+
+        source, cell, count = scatter(self.cell, self.count, self.rows, odds, randomState)
+        self.age = self.age[source]
+        self.hunger = self.hunger[source]
+        self.cell = cell
+        self.count = count
+        self.ate = self.ate[source]
+        self.merge()
+
+    def feed(self, items, value, randomState=None):
+        """
+        Animals that have not eaten yet eat the food shared out to them
+
+        An animal eats with a chance of the food items per eater, up to 1, and
+        then gains the hunger per eater divided by that chance.
+
+        Parameters
+        ----------
+        items : array(float)
+            rows x rows food items per eater
+        value : array(float)
+            rows x rows hunger gained per eater, in half units
+        randomState : RandomState, optional
+            draws who eats and the rounding, (Default numpy's global state)
+        """
+
+        random = np.random if randomState is None else randomState
+        chance = np.minimum(items.ravel()[self.cell], 1)
+        chance[self.ate] = 0
+        fed = random.binomial(self.count, chance)
+        eating = fed > 0
+        gain = roundRandom(value.ravel()[self.cell[eating]]/chance[eating], random)
+        self.count = self.count - fed
+        self.append(self.age[eating], self.hunger[eating] - gain, self.cell[eating],
+                    fed[eating], ate=True)
+
+    def agents(self, randomState=None):
+        """
+        Returns locations, ages and hunger for one animal per count
+
+        Ages are drawn uniformly within the age class.
+
+        Parameters
+        ----------
+        randomState : RandomState, optional
+            draws the ages, (Default numpy's global state)
+
+        Returns
+        -------
+        array(int)
+            N x 2 x,y locations
+        array(int)
+            N ages
+        array(float)
+            N hunger levels
+        """
+
+        random = np.random if randomState is None else randomState
+        age = np.repeat(self.age, self.count)
+        cell = np.repeat(self.cell, self.count)
+        low = self.bounds[age]
+        ages = low + (random.random_sample(len(age))*(self.bounds[age + 1] - low)).astype(np.int64)
+        locations = np.stack(np.divmod(cell, self.rows), axis=1)
+        return locations, ages, np.repeat(self.hunger, self.count)/2
+
+    def nbytes(self):
+        return sum(column.nbytes for column in [self.age, self.hunger, self.cell,
+                                                self.count, self.ate])
+
+class CellLattice:
+    """
+    A class used to run an ecosystem as counts per cell instead of agents
+
+    Attributes
+    ----------
+    rows : int
+        the dimension of the grid
+    omni : boolean
+        are foxes omnivores
+    decomp : boolean
+        are mushrooms decomposers
+    probLitter : boolean
+        do animals have probability litter sizes
+    probRepro : float
+        probability of a mushroom spawning another one every step
+    probDecomp : float
+        probability of a mushroom growing on a natural death
+    foxes : CellCounts
+        foxes by cell, age class and hunger
+    rabbits : CellCounts
+        rabbits by cell, age class and hunger
+    mushrooms : array(uint8)
+        rows x rows size of the mushroom bundle in every cell, 0 for none
+    habitat : Habitat
+        weighs moves and mushroom growth, None for a uniform grid
+    odds : array(float)
+        chance of every direction from every cell, None for equal odds
+    rng : CounterRNG
+        counter-based random streams of the ecosystem, None uses numpy
+
+    Methods
+    -------
+    fromAgents(ecosystem, ageClasses=16)
+        Counts the agents of an ecosystem
+    toAgents(ecosystem)
+        Adds agents for the counts to an ecosystem
+    randomState(purpose, code=0, key=0)
+        Random state for the draws of a purpose at this time step
+    step()
+        Moves the counts forward one time step
+    mate(animals)
+        Animals with a partner nearby mate and have litters
+    starve(animals, deaths)
+        Hungry animals get hungrier, removes the starved
+    age(animals, deaths)
+        Animals grow older, removes those dying of old age
+    regrow(mushrooms)
+        Mushrooms spawn new ones on free cells
+    population()
+        Returns the number of foxes, rabbits and mushrooms
+    animals()
+        Returns the number of foxes and rabbits
+    cellCounts(species)
+        Returns the number of a species in every cell
+    toGrid(grid)
+        Maps each species to the grid like Ecosystem.mapToGrid
+    nbytes()
+        Returns the memory used
+    """
+
+    def __init__(self, rows, omni=False, decomp=False, probLitter=False, foxHunger=10,
+                 rabbitHunger=10, ageClasses=16, probRepro=0.1, probDecomp=0.1, habitat=None,
+                 rng=None):
+        """
+        Parameters
+        ----------
+        rows : int
+            the dimension of the grid
+        omni : boolean, optional
+            are foxes omnivores, (Default False)
+        decomp : boolean, optional
+            are mushrooms decomposers, (Default False)
+        probLitter : boolean, optional
+            do animals have probability litter sizes, (Default False)
+        foxHunger : int, optional
+            maximum hunger of the foxes, (Default 10)
+        rabbitHunger : int, optional
+            maximum hunger of the rabbits, (Default 10)
+        ageClasses : int, optional
+            number of age classes of each species, (Default 16)
+        probRepro : float, optional
+            probability of a mushroom spawning another one, (Default 0.1)
+        probDecomp : float, optional
+            probability of a mushroom growing on a natural death, (Default 0.1)
+        habitat : Habitat, optional
+            weighs moves and mushroom growth, (Default None)
+        rng : CounterRNG, optional
+            counter-based random streams, its tick is set by the ecosystem, (Default None)
+        """
+
+        self.rows = rows
+        self.omni = omni
+        self.decomp = decomp
+        self.probLitter = probLitter
+        self.probRepro = probRepro
+        self.probDecomp = probDecomp
+        self.foxes = CellCounts(Fox, rows, foxHunger, ageClasses)
+        self.rabbits = CellCounts(Rabbit, rows, rabbitHunger, ageClasses)
+        self.mushrooms = np.zeros((rows, rows), dtype=np.uint8)
+        self.habitat = habitat
+        self.odds = None if habitat is None else habitat.moveOdds()
+        self.rng = rng
+
+    @classmethod
+    def fromAgents(cls, ecosystem, ageClasses=16):
+        """
+        Counts the agents of an ecosystem
+
+        Hunger is rounded to half units. Every species takes the maxHunger most
+        of its animals have.
+
+        Parameters
+        ----------
+        ecosystem : Ecosystem
+            ecosystem to count, its agents are left untouched
+        ageClasses : int, optional
+            number of age classes of each species, (Default 16)
+
+        Returns
+        -------
+        CellLattice
+            counts of the ecosystem
+        """
+
+        hungers = []
+        for animals in [ecosystem.foxes_array, ecosystem.rabbits_array]:
+            levels = [int(animal.maxHunger) for animal in animals]
+            hungers.append(int(np.bincount(levels).argmax()) if levels else 10)
+        lattice = cls(ecosystem.mapSize, omni=ecosystem.omni, decomp=ecosystem.decomp,
+                      probLitter=ecosystem.probLitter, foxHunger=hungers[0],
+                      rabbitHunger=hungers[1], ageClasses=ageClasses,
+                      habitat=ecosystem.habitat, rng=ecosystem.rng)
+
+        for counts, animals in [(lattice.foxes, ecosystem.foxes_array),
+                                (lattice.rabbits, ecosystem.rabbits_array)]:
+            animals = [animal for animal in animals if not animal.beStill]
+            steps = np.array([animal.steps for animal in animals], dtype=np.int64)
+            hunger = np.array([animal.hunger for animal in animals], dtype=float)
+            locations = np.array([animal.location for animal in animals],
+                                 dtype=np.int64).reshape(-1, 2)
+            age = np.minimum(np.searchsorted(counts.bounds, steps, side='right') - 1,
+                             len(counts.bounds) - 2)
+            counts.append(age, np.minimum(np.round(2*hunger).astype(np.int64),
+                                          2*counts.maxHunger),
+                          locations[:, 0]*ecosystem.mapSize + locations[:, 1],
+                          np.ones(len(animals), dtype=np.int64))
+            counts.merge()
+
+        for mushroom in ecosystem.mush_array:
+            if not mushroom.eaten:
+                lattice.mushrooms[mushroom.location[0], mushroom.location[1]] = mushroom.size
+        return lattice
+
+    def toAgents(self, ecosystem):
+        """
+        Adds agents for the counts to an ecosystem
+
+        Parameters
+        ----------
+        ecosystem : Ecosystem
+            ecosystem to add the agents to, through Ecosystem.spawn
+        """
+
+        for counts in [self.foxes, self.rabbits]:
+            # key 1 keeps these apart from the ageing of a step
+            locations, ages, hunger = counts.agents(self.randomState(Streams.AGE,
+                                                                     counts.species.code, 1))
+            ecosystem.spawn(counts.species, locations=locations, age=ages, hunger=hunger,
+                            maxHunger=counts.maxHunger)
+        cells = np.flatnonzero(self.mushrooms)
+        locations = np.stack(np.divmod(cells, self.rows), axis=1)
+        ecosystem.spawn(Mushroom, locations=locations, size=self.mushrooms.ravel()[cells])
+
+    def randomState(self, purpose, code=0, key=0):
+        """
+        Random state for the draws of a purpose at this time step
+
+        Parameters
+        ----------
+        purpose : int
+            what the draws are used for, see Streams
+        code : int, optional
+            species code the draws are for, (Default 0)
+        key : int, optional
+            tells apart several draws with the same purpose, (Default 0)
+
+        Returns
+        -------
+        RandomState
+            seeded from the counter-based streams, numpy's global state without them
+        """
+
+        if self.rng is None:
+            return np.random
+        return self.rng.state(purpose, code, key)
+
+    def step(self):
+        """
+        Moves the counts forward one time step
+        """
+
+        mushrooms = np.count_nonzero(self.mushrooms)
+        self.foxes.move(self.odds, self.randomState(Streams.MOVE, Fox.code))
+        self.rabbits.move(self.odds, self.randomState(Streams.MOVE, Rabbit.code))
+        foxBabies = self.mate(self.foxes)
+        rabbitBabies = self.mate(self.rabbits)
+
+        # foxes eat every rabbit in their vicinity
+        rabbitGrid = self.rabbits.cellTotals()
+        eaten, items, value = share(self.foxes.cellTotals(), rabbitGrid, 2*rabbitGrid)
+        self.foxes.feed(items, value, self.randomState(Streams.FEED, Fox.code))
+        self.rabbits.keep(~eaten.ravel()[self.rabbits.cell])
+
+        sizes = self.mushrooms.astype(float)
+        if self.omni:
+            # foxes that did not catch a rabbit graze, a bundle is worth less to them
+            hungry = self.foxes.cellTotals(~self.foxes.ate)
+            eaten, items, value = share(hungry, sizes > 0, np.where(sizes > 0, 0.5 + 0.5*sizes, 0))
+            self.foxes.feed(items, value, self.randomState(Streams.FEED, Fox.code, 1))
+            self.mushrooms[eaten] = 0
+            sizes[eaten] = 0
+        eaten, items, value = share(self.rabbits.cellTotals(), sizes > 0, 2*sizes)
+        self.rabbits.feed(items, value, self.randomState(Streams.FEED, Rabbit.code))
+        self.mushrooms[eaten] = 0
+        self.regrow(mushrooms)
+
+        deaths = np.zeros(self.rows*self.rows, dtype=np.int64)
+        for animals, babies in [(self.foxes, foxBabies), (self.rabbits, rabbitBabies)]:
+            self.starve(animals, deaths)
+            self.age(animals, deaths)
+            # babies are born at age 0 and hunger 0 and move one step away
+            cells = np.flatnonzero(babies)
+            source, cell, count = scatter(cells, babies[cells], self.rows, self.odds,
+                                          self.randomState(Streams.MOVE, animals.species.code, 1))
+            animals.append(np.zeros(len(cell), dtype=np.int64), np.zeros(len(cell), dtype=np.int64),
+                           cell, count)
+            animals.merge()
+
+        if self.decomp:
+            # at most one mushroom per cell, any of the deaths may decompose
+            flat = self.mushrooms.ravel()
+            chance = 1 - (1 - self.probDecomp)**deaths
+            random = self.randomState(Streams.DECOMPOSE, Mushroom.code)
+            grow = (flat == 0) & (random.random_sample(len(flat)) < chance)
+            flat[grow] = random.randint(1, 3, np.count_nonzero(grow))
+
+    def mate(self, animals):
+        """
+        Animals with a partner nearby mate and have litters
+
+        An animal with k eligible partners in its vicinity succeeds with chance
+        q = 1 - (1 - probRepro)^k per try and waits matingCooldown steps after a
+        litter, so it mates at a rate of 1 / (matingCooldown + 1/q). Each baby
+        costs both parents half a unit of hunger and needs them under half of
+        maxHunger. The cost is counted per parent, so a litter is the mean of
+        what both parents could afford.
+
+        Parameters
+        ----------
+        animals : CellCounts
+            foxes or rabbits
+
+        Returns
+        -------
+        array(int)
+            number of babies in every cell
+        """
+
+        species = animals.species
+        random = self.randomState(Streams.MATE, species.code)
+        eligible = (animals.age >= animals.adult) & (animals.hunger < animals.maxHunger)
+        partners = vicinity(animals.cellTotals(eligible)).ravel()[animals.cell] - 1
+        success = 1 - (1 - species.probRepro)**np.maximum(partners, 0)
+        rate = np.where(eligible, success/(1 + species.matingCooldown*success), 0)
+        mating = random.binomial(animals.count, rate)
+
+        if self.probLitter:
+            # every further baby is 0.05 less likely, the first one is the mating itself
+            odds = [max(species.probRepro - 0.05*i, 0) for i in range(1, species.maxLitter)]
+        else:
+            odds = [1]*(species.avgLitter - 1)
+        parts = []
+        going = mating
+        for litter, chance in enumerate(odds, 1):
+            # another baby needs the parent under half of its maximum hunger
+            chance = np.where(animals.hunger + litter < animals.maxHunger, chance, 0)
+            more = random.binomial(going, chance)
+            parts.append((litter, going - more))
+            going = more
+        parts.append((len(odds) + 1, going))
+
+        babies = np.zeros(animals.area, dtype=np.int64)
+        mated = mating > 0
+        age, hunger, cell = animals.age[mated], animals.hunger[mated], animals.cell[mated]
+        animals.count = animals.count - mating
+        for litter, count in parts:
+            babies += np.bincount(cell, weights=litter*count[mated],
+                                  minlength=animals.area).astype(np.int64)
+            animals.append(age, hunger + litter, cell, count[mated])
+        # both parents counted the litter, half of the odd baby is born at random
+        return babies//2 + random.binomial(babies % 2, 0.5)
+
+    def starve(self, animals, deaths):
+        """
+        Hungry animals get hungrier, removes the starved
+
+        Parameters
+        ----------
+        animals : CellCounts
+            foxes or rabbits
+        deaths : array(int)
+            natural deaths in every cell, added to
+        """
+
+        animals.hunger = np.where(animals.ate, animals.hunger, animals.hunger + 2)
+        starved = animals.hunger > 2*animals.maxHunger
+        deaths += np.bincount(animals.cell[starved], weights=animals.count[starved],
+                              minlength=len(deaths)).astype(np.int64)
+        animals.keep(~starved)
+
+    def age(self, animals, deaths):
+        """
+        Animals grow older, removes those dying of old age
+
+        Parameters
+        ----------
+        animals : CellCounts
+            foxes or rabbits
+        deaths : array(int)
+            natural deaths in every cell, added to
+        """
+
+        width = np.diff(animals.bounds)
+        random = self.randomState(Streams.AGE, animals.species.code)
+        older = random.binomial(animals.count, 1/width[animals.age])
+        animals.count = animals.count - older
+        old = animals.age + 1 == len(width)
+        deaths += np.bincount(animals.cell[old], weights=older[old],
+                              minlength=len(deaths)).astype(np.int64)
+        grown = (older > 0) & ~old
+        animals.append(animals.age[grown] + 1, animals.hunger[grown], animals.cell[grown],
+                       older[grown])
+
+    def regrow(self, mushrooms):
+        """
+        Mushrooms spawn new ones on free cells
+
+        With a habitat the chance of every mushroom is scaled by the growth
+        factor of its cell and the free cells are drawn by growth factor.
+
+        Parameters
+        ----------
+        mushrooms : int
+            number of mushrooms at the start of the step, eaten ones still spawn
+        """
+
+        flat = self.mushrooms.ravel()
+        random = self.randomState(Streams.SPAWN, Mushroom.code)
+        if self.habitat is None:
+            free = np.flatnonzero(flat == 0)
+            number = min(random.binomial(mushrooms, self.probRepro), len(free))
+            cells = free[random.choice(len(free), number, replace=False)]
+        else:
+            growth = self.habitat.growthRaster().ravel()
+            # the growing mushrooms, eaten ones included, are spread like the remaining ones
+            grown = np.flatnonzero(flat)
+            factor = growth[grown].mean() if len(grown) else growth.mean()
+            weights = np.where(flat == 0, growth, 0)
+            number = min(random.binomial(mushrooms, min(self.probRepro*factor, 1)),
+                         np.count_nonzero(weights))
+            cells = random.choice(len(flat), number, replace=False, p=weights/weights.sum()) \
+                if number > 0 else np.zeros(0, dtype=np.int64)
+        flat[cells] = random.randint(1, 3, number)
+
+    def population(self):
+        """
+        Returns the number of foxes, rabbits and mushrooms
+
+        Returns
+        -------
+        tuple(int)
+            foxes, rabbits and mushrooms
+        """
+
+        return self.foxes.total(), self.rabbits.total(), int(np.count_nonzero(self.mushrooms))
+
+    def animals(self):
+        return self.foxes.total() + self.rabbits.total()
+
+    def cellCounts(self, species):
+        """
+        Returns the number of a species in every cell
+
+        Parameters
+        ----------
+        species : str
+            'Fox', 'Rabbit' or 'Mushroom'
+
+        Returns
+        -------
+        array(int)
+            rows x rows counts
+        """
+
+        if species == Mushroom.species:
+            return (self.mushrooms > 0).astype(np.int64)
+        return {Fox.species: self.foxes, Rabbit.species: self.rabbits}[species].cellTotals()
+
+    def toGrid(self, grid):
+        """
+        Maps each species to the grid like Ecosystem.mapToGrid
+
+        Parameters
+        ----------
+        grid : array(uint8)
+            rows x rows grid to overwrite
+
+        Returns
+        -------
+        array(uint8)
+            the grid, foxes drawn over rabbits over mushrooms
+        """
+
+        grid.fill(0)
+        grid[self.mushrooms > 0] = Mushroom.code
+        grid[self.rabbits.cellTotals() > 0] = Rabbit.code
+        grid[self.foxes.cellTotals() > 0] = Fox.code
+        return grid
+
+    def nbytes(self):
+        return self.foxes.nbytes() + self.rabbits.nbytes() + self.mushrooms.nbytes
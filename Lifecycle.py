@@ -0,0 +1,355 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+import os
+
+import EventLog
+
+"""
+One row per agent that ever lived in an ecosystem, so lifespans, causes
+of death, reproductive success and how far the animals roamed are a
+query over columns after the run. Every agent gets a compact id, lifeId,
+the index of its row, when it is added to the ecosystem. Parents and
+partners are stored as lifeIds.
+
+The cause of death is an EventLog kind, ALIVE while the agent lives and
+MERGED when it was replaced by cell counts, see Lattice. Food eaten
+counts the rabbits and mushrooms an animal ate.
+"""
+
+ALIVE = 255 # cause of agents still alive
+MERGED = 254 # cause of agents replaced by cell counts
+
+DEATHS = [EventLog.PREDATION, EventLog.GRAZING, EventLog.STARVATION, EventLog.OLD_AGE,
+          EventLog.CULL]
+
+COLUMNS = [('species', np.uint8), ('agentId', np.int64), ('birthTick', np.int32),
+           ('deathTick', np.int32), ('cause', np.uint8), ('parent', np.int64),
+           ('partner', np.int64), ('litters', np.int32), ('offspring', np.int32),
+           ('foodEaten', np.int32), ('birthX', np.int32), ('birthY', np.int32),
+           ('deathX', np.int32), ('deathY', np.int32)]
+
+class LifecycleTable:
+    """
+    A class used to keep the life of every agent in growable typed columns
+
+    Attributes
+    ----------
+    size : int
+        number of agents recorded
+    capacity : int
+        number of rows allocated in every column
+    columns : dictionary
+        array of capacity values for every name in COLUMNS
+    lifeIds : dictionary
+        lifeId of every agentId, one array per species code
+
+    Methods
+    -------
+    born(agents, tick)
+        Adds rows for new agents and counts the litters of their parents
+    event(tick, kind, agent, other=None)
+        Updates the rows of the agents involved in an event
+    died(agent, tick, cause)
+        Records the death of an agent
+    ended(agents, tick, cause=MERGED)
+        Records the end of many agents at once
+    lifeIdOf(code, agentIds)
+        Returns the lifeIds of agents of a species
+    table()
+        Returns the filled part of every column
+    save(exp, dirName)
+        Stores the columns next to the population history
+    dataFrame()
+        Returns the columns as a pandas DataFrame
+    nbytes()
+        Returns the memory used
+    """
+
+    def __init__(self, capacity=1024):
+        """
+        Parameters
+        ----------
+        capacity : int, optional
+            rows allocated at the start, doubled when full, (Default 1024)
+        """
+
+        self.size = 0
+        self.capacity = capacity
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in COLUMNS}
+        self.lifeIds = {}
+
+    def grow(self, rows):
+        """
+        Makes room for more rows, doubling the capacity as often as needed
+
+        Parameters
+        ----------
+        rows : int
+            number of rows about to be added
+        """
+
+        if self.size + rows <= self.capacity:
+            return
+        while self.capacity < self.size + rows:
+            self.capacity = 2*self.capacity
+        for name, column in self.columns.items():
+            grown = np.zeros(self.capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+
+    def lifeIdOf(self, code, agentIds):
+        """
+        Returns the lifeIds of agents of a species
+
+        Parameters
+        ----------
+        code : int
+            species code
+        agentIds : array(int)
+            ids of the agents, -1 for none
+
+        Returns
+        -------
+        array(int)
+            lifeIds, -1 for agents without a row
+        """
+
+        agentIds = np.asarray(agentIds, dtype=np.int64)
+        known = self.lifeIds.get(code, np.zeros(0, dtype=np.int64))
+        found = (agentIds >= 0) & (agentIds < len(known))
+        lifeIds = np.full(len(agentIds), -1, dtype=np.int64)
+        lifeIds[found] = known[agentIds[found]]
+        return lifeIds
+
+    def born(self, agents, tick):
+        """
+        Adds rows for new agents and counts the litters of their parents
+
+        The babies of one parent and partner added together are one litter.
+
+        Parameters
+        ----------
+        agents : array(Animal) or array(Food)
+            new agents, their lifeId is set
+        tick : int
+            time step they were added
+        """
+
+        number = len(agents)
+        if number == 0:
+            return
+        self.grow(number)
+        start = self.size
+        rows = np.arange(start, start + number)
+        for agent, lifeId in zip(agents, rows.tolist()):
+            agent.lifeId = lifeId
+        codes = np.array([agent.code for agent in agents], dtype=np.int64)
+        agentIds = np.array([agent.agentId for agent in agents], dtype=np.int64)
+        locations = np.array([agent.location for agent in agents], dtype=np.int64)
+        parentIds = np.array([agent.parentId for agent in agents], dtype=np.int64)
+        partnerIds = np.array([getattr(agent, 'partnerId', -1) for agent in agents],
+                              dtype=np.int64)
+
+        parents = np.full(number, -1, dtype=np.int64)
+        partners = np.full(number, -1, dtype=np.int64)
+        for code in np.unique(codes).tolist():
+            same = codes == code
+            parents[same] = self.lifeIdOf(code, parentIds[same])
+            partners[same] = self.lifeIdOf(code, partnerIds[same])
+            # agent ids are handed out in order, so a growable lookup is enough
+            known = self.lifeIds.get(code, np.zeros(0, dtype=np.int64))
+            needed = int(agentIds[same].max()) + 1
+            if needed > len(known):
+                grown = np.full(max(needed, 2*len(known)), -1, dtype=np.int64)
+                grown[:len(known)] = known
+                known = grown
+            known[agentIds[same]] = rows[same]
+            self.lifeIds[code] = known
+
+        columns = self.columns
+        end = start + number
+        columns['species'][start:end] = codes
+        columns['agentId'][start:end] = agentIds
+        columns['birthTick'][start:end] = tick
+        columns['deathTick'][start:end] = -1
+        columns['cause'][start:end] = ALIVE
+        columns['parent'][start:end] = parents
+        columns['partner'][start:end] = partners
+        columns['birthX'][start:end] = locations[:, 0]
+        columns['birthY'][start:end] = locations[:, 1]
+        columns['deathX'][start:end] = -1
+        columns['deathY'][start:end] = -1
+        self.size = end
+
+        for parent in [parents, partners]:
+            known = parent >= 0
+            np.add.at(columns['offspring'], parent[known], 1)
+        pairs = np.unique(np.stack([parents, partners], axis=1)[parents >= 0], axis=0)
+        for parent in [pairs[:, 0], pairs[:, 1]]:
+            np.add.at(columns['litters'], parent[parent >= 0], 1)
+
+    def event(self, tick, kind, agent, other=None):
+        """
+        Updates the rows of the agents involved in an event
+
+        Parameters
+        ----------
+        tick : int
+            time step of the event
+        kind : int
+            type of event, see EventLog
+        agent : Animal or Food
+            agent the event happened to
+        other : Animal or Food, optional
+            predator or grazer, (Default None)
+        """
+
+        if kind in DEATHS:
+            self.died(agent, tick, kind)
+        if other is not None and other.lifeId >= 0:
+            if kind == EventLog.PREDATION or kind == EventLog.GRAZING:
+                self.columns['foodEaten'][other.lifeId] += 1
+
+    def died(self, agent, tick, cause):
+        """
+        Records the death of an agent
+
+        Parameters
+        ----------
+        agent : Animal or Food
+            the agent that died
+        tick : int
+            time step of the death
+        cause : int
+            EventLog kind of the death or MERGED
+        """
+
+        row = agent.lifeId
+        if row < 0 or self.columns['deathTick'][row] >= 0:
+            return
+        self.columns['deathTick'][row] = tick
+        self.columns['cause'][row] = cause
+        self.columns['deathX'][row] = agent.location[0]
+        self.columns['deathY'][row] = agent.location[1]
+
+    def ended(self, agents, tick, cause=MERGED):
+        """
+        Records the end of many agents at once
+
+        Parameters
+        ----------
+        agents : array(Animal) or array(Food)
+            agents leaving the ecosystem
+        tick : int
+            time step they left
+        cause : int, optional
+            EventLog kind or MERGED, (Default MERGED)
+        """
+
+        for agent in agents:
+            self.died(agent, tick, cause)
+
+    def table(self):
+        """
+        Returns the filled part of every column
+
+        Returns
+        -------
+        dictionary
+            array of size values for every name in COLUMNS, views of the table
+        """
+
+        return {name: column[:self.size] for name, column in self.columns.items()}
+
+    def save(self, exp, dirName):
+        """
+        Stores the columns next to the population history
+
+        Parameters
+        ----------
+        exp : str
+            Name of the experiment
+        dirName : str
+            Directory of the experiment
+
+        Returns
+        -------
+        str
+            the lifecycle file
+        """
+
+        fileName = os.path.join(dirName, exp + "-lifecycle.npz")
+        np.savez(fileName, **self.table())
+        return fileName
+
+    def dataFrame(self):
+        """
+        Returns the columns as a pandas DataFrame
+
+        Returns
+        -------
+        DataFrame
+            one row per agent, indexed by lifeId
+        """
+
+        import pandas as pd
+
+        return pd.DataFrame(self.table())
+
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns.values())
+
+def lifespans(table, species=None, cause=None):
+    """
+    Time steps lived by the agents that died
+
+    Parameters
+    ----------
+    table : dictionary
+        columns from LifecycleTable.table or a saved lifecycle file
+    species : int, optional
+        only agents of this species code, (Default all)
+    cause : int, optional
+        only agents that died of this cause, (Default any)
+
+    Returns
+    -------
+    array(int)
+        lifespan of every selected agent
+    """
+
+    mask = table['deathTick'] >= 0
+    if species is not None:
+        mask &= table['species'] == species
+    if cause is not None:
+        mask &= table['cause'] == cause
+    return (table['deathTick'][mask] - table['birthTick'][mask]).astype(np.int64)
+
+def displacement(table, mapSize):
+    """
+    Distance from the birth to the death cell on the wrapping grid
+
+    Parameters
+    ----------
+    table : dictionary
+        columns from LifecycleTable.table or a saved lifecycle file
+    mapSize : int
+        the dimension of the ecosystem grid
+
+    Returns
+    -------
+    array(float)
+        distance of every agent, NaN while it lives
+    """
+
+    dead = table['deathTick'] >= 0
+    squared = np.zeros(np.count_nonzero(dead))
+    for birth, death in [('birthX', 'deathX'), ('birthY', 'deathY')]:
+        delta = np.abs(table[death][dead] - table[birth][dead]) % mapSize
+        squared += np.minimum(delta, mapSize - delta).astype(float)**2
+    distance = np.full(len(dead), np.nan)
+    distance[dead] = np.sqrt(squared)
+    return distance
@@ -0,0 +1,339 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+import asyncio
+import base64, hashlib
+import struct
+
+"""
+Local live view of a running Ecosystem. The simulation runs in the
+background and every viewer connected over a WebSocket is sent the cells
+that changed since the last grid it received together with the population
+counts. A viewer that is slow to read simply skips the frames produced in
+the meantime, the simulation never waits for it.
+
+    server = LiveServer(ecosystem)
+    server.serve()    # then open http://localhost:8765
+"""
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# delta frame header: tick, rows, changed cells, foxes, rabbits, mushrooms
+HEADER = struct.Struct('<6i')
+
+# close frame with status 1000, normal closure
+CLOSE_FRAME = struct.pack('!BBH', 0x88, 2, 1000)
+
+CLIENT_PAGE = """<!DOCTYPE html>
+<html>
+<head><title>Ecosystem live view</title></head>
+<body style="font-family: sans-serif">
+<canvas id="grid" width="600" height="600" style="border: 1px solid #ccc; image-rendering: pixelated"></canvas>
+<p id="counts">connecting...</p>
+<script>
+var colours = [[255, 255, 255], [0, 0, 255], [0, 128, 0], [255, 0, 0]];
+var canvas = document.getElementById("grid");
+var ctx = canvas.getContext("2d");
+var image = null;
+var socket = new WebSocket("ws://" + location.host + "/ws");
+socket.binaryType = "arraybuffer";
+socket.onmessage = function (event) {
+    var view = new DataView(event.data);
+    var tick = view.getInt32(0, true), rows = view.getInt32(4, true);
+    var changed = view.getInt32(8, true);
+    if (image === null || image.width !== rows) {
+        canvas.width = rows; canvas.height = rows;
+        image = ctx.createImageData(rows, rows);
+        for (var k = 0; k < rows * rows; k++) { image.data.fill(255, 4 * k, 4 * k + 4); }
+        canvas.style.width = "600px"; canvas.style.height = "600px";
+    }
+    var cells = new Uint32Array(event.data.slice(24, 24 + 4 * changed));
+    var values = new Uint8Array(event.data, 24 + 4 * changed, changed);
+    for (var k = 0; k < changed; k++) {
+        // grid row x is drawn flipped, like plotGrid
+        var x = Math.floor(cells[k] / rows), y = cells[k] % rows;
+        var p = 4 * ((rows - 1 - x) * rows + y), c = colours[values[k]];
+        image.data[p] = c[0]; image.data[p + 1] = c[1]; image.data[p + 2] = c[2];
+    }
+    ctx.putImageData(image, 0, 0);
+    document.getElementById("counts").textContent = "step " + tick +
+        "  foxes " + view.getInt32(12, true) + "  rabbits " + view.getInt32(16, true) +
+        "  mushrooms " + view.getInt32(20, true);
+};
+socket.onclose = function () { document.getElementById("counts").textContent += "  (closed)"; };
+</script>
+</body>
+</html>
+"""
+
+class LiveServer:
+    """
+    A class used to stream a running Ecosystem to browser viewers
+
+    Attributes
+    ----------
+    ecosystem : Ecosystem
+        the ecosystem being simulated
+    host : str
+        address the server listens on
+    port : int
+        port the server listens on
+    interval : float
+        minimum time between time steps in seconds
+    maxFrames : int
+        maximum number of time steps to run, None runs until a species is extinct
+    grid : array(uint8)
+        grid after the latest time step
+    tick : int
+        latest time step
+    counts : tuple(int)
+        number of foxes, rabbits and mushrooms after the latest time step
+    running : boolean
+        is the simulation still running
+    loop : AbstractEventLoop
+        event loop the simulation and the server run on, None before start
+
+    Methods
+    -------
+    serve()
+        Runs the simulation and the server until interrupted
+    start()
+        Starts the simulation and the server on the running event loop
+    advance()
+        Moves the ecosystem one time step and captures the grid
+    runSimulation()
+        Steps the ecosystem in the background and notifies the viewers
+    handleClient(reader, writer)
+        Serves the viewer page or a WebSocket stream
+    streamDeltas(writer)
+        Sends grid deltas to one viewer until it disconnects
+    """
+
+    def __init__(self, ecosystem, host='127.0.0.1', port=8765, interval=0.05, maxFrames=None):
+        """
+        Parameters
+        ----------
+        ecosystem : Ecosystem
+            the ecosystem to simulate
+        host : str, optional
+            address to listen on, only localhost is supported, (Default '127.0.0.1')
+        port : int, optional
+            port to listen on, (Default 8765)
+        interval : float, optional
+            minimum time between time steps in seconds, (Default 0.05)
+        maxFrames : int, optional
+            maximum number of time steps to run, (Default None)
+        """
+
+        self.ecosystem = ecosystem
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.maxFrames = maxFrames
+        self.grid = np.array(ecosystem.mapToGrid(), dtype=np.uint8)
+        self.tick = 0
+        self.counts = (len(ecosystem.foxes_array), len(ecosystem.rabbits_array),
+                       len(ecosystem.mush_array))
+        self.running = False
+        self.loop = None
+        self.newFrame = None
+
+    def serve(self):
+        """
+        Runs the simulation and the server until interrupted
+        """
+
+        loop = asyncio.get_event_loop()
+        self.loop = loop
+        server = loop.run_until_complete(self.start())
+        print("Live view on http://" + self.host + ":" + str(self.port))
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+
+    async def start(self):
+        """
+        Starts the simulation and the server on the running event loop
+
+        Returns
+        -------
+        Server
+            the asyncio server
+        """
+
+        if self.loop is None:
+            self.loop = runningLoop()
+        self.newFrame = asyncio.Condition()
+        # viewers connecting before the first time step wait for it
+        self.running = True
+        server = await asyncio.start_server(self.handleClient, self.host, self.port)
+        asyncio.ensure_future(self.runSimulation())
+        return server
+
+    def advance(self):
+        """
+        Moves the ecosystem one time step and captures the grid
+
+        Returns
+        -------
+        tuple
+            the grid and the population counts after the time step
+        """
+
+        eco = self.ecosystem
+        eco.step()
+        grid = np.array(eco.mapToGrid(), dtype=np.uint8)
+        return grid, (eco.numFoxes[-1], eco.numRabbits[-1], eco.numMushrooms[-1])
+
+    async def runSimulation(self):
+        """
+        Steps the ecosystem in the background and notifies the viewers
+        """
+
+        loop = self.loop
+        eco = self.ecosystem
+        while not eco.foxesDead and not eco.rabbitsDead:
+            if self.maxFrames is not None and self.tick >= self.maxFrames:
+                break
+            started = loop.time()
+            # step off the event loop so viewers keep being served
+            grid, counts = await loop.run_in_executor(None, self.advance)
+            self.grid, self.counts = grid, counts
+            self.tick = self.tick + 1
+            async with self.newFrame:
+                self.newFrame.notify_all()
+            await asyncio.sleep(max(0, self.interval - (loop.time() - started)))
+        self.running = False
+        # wake the viewers so they send the last frame and close
+        async with self.newFrame:
+            self.newFrame.notify_all()
+
+    async def handleClient(self, reader, writer):
+        """
+        Serves the viewer page or a WebSocket stream
+
+        Parameters
+        ----------
+        reader : StreamReader
+            incoming connection data
+        writer : StreamWriter
+            outgoing connection data
+        """
+
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+        lines = request.decode('latin-1').split('\r\n')
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+
+        if headers.get('upgrade', '').lower() != 'websocket':
+            body = CLIENT_PAGE.encode('utf-8')
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n'
+                         b'Content-Length: ' + str(len(body)).encode() +
+                         b'\r\nConnection: close\r\n\r\n' + body)
+            await writer.drain()
+            writer.close()
+            return
+
+        accept = base64.b64encode(hashlib.sha1(
+            (headers['sec-websocket-key'] + WEBSOCKET_GUID).encode()).digest())
+        writer.write(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+                     b'Connection: Upgrade\r\nSec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+
+        # the viewer only sends a close frame, anything it sends ends the stream
+        closed = asyncio.ensure_future(reader.read(2))
+        stream = asyncio.ensure_future(self.streamDeltas(writer))
+        await asyncio.wait([closed, stream], return_when=asyncio.FIRST_COMPLETED)
+        if stream.done() and not closed.done():
+            # the run ended, give the viewer a moment to answer the close frame
+            await asyncio.wait([closed], timeout=1)
+        stream.cancel()
+        closed.cancel()
+        writer.close()
+
+    async def streamDeltas(self, writer):
+        """
+        Sends grid deltas to one viewer until it disconnects or the run ends
+
+        Frames produced while a send is in progress are skipped, the next delta
+        is taken against the last grid this viewer received. Once the simulation
+        stopped and its last time step was sent, a close frame ends the stream.
+
+        Parameters
+        ----------
+        writer : StreamWriter
+            outgoing connection data
+        """
+
+        sent = np.zeros_like(self.grid)
+        sentTick = -1
+        try:
+            while True:
+                async with self.newFrame:
+                    while self.tick == sentTick and self.running:
+                        await self.newFrame.wait()
+                if self.tick == sentTick:
+                    writer.write(CLOSE_FRAME)
+                    await writer.drain()
+                    return
+                grid, tick, counts = self.grid, self.tick, self.counts
+                cells = np.flatnonzero(grid != sent).astype('<u4')
+                payload = (HEADER.pack(tick, grid.shape[0], len(cells), *counts) +
+                           cells.tobytes() + grid.ravel()[cells].tobytes())
+                writer.write(websocketFrame(payload))
+                # wait for the viewer, the simulation keeps running meanwhile
+                await writer.drain()
+                sent, sentTick = grid, tick
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+def runningLoop():
+    """
+    Returns the event loop of the running coroutine
+
+    Returns
+    -------
+    AbstractEventLoop
+        the running loop
+    """
+
+    # get_running_loop is new in Python 3.7, get_event_loop gives the same loop before
+    if hasattr(asyncio, 'get_running_loop'):
+        return asyncio.get_running_loop()
+    return asyncio.get_event_loop()
+
+def websocketFrame(payload):
+    """
+    Wraps a payload in an unmasked binary WebSocket frame
+
+    Parameters
+    ----------
+    payload : bytes
+        data to send
+
+    Returns
+    -------
+    bytes
+        the frame
+    """
+
+    size = len(payload)
+    if size < 126:
+        header = struct.pack('!BB', 0x82, size)
+    elif size < 2**16:
+        header = struct.pack('!BBH', 0x82, 126, size)
+    else:
+        header = struct.pack('!BBQ', 0x82, 127, size)
+    return header + payload
@@ -0,0 +1,292 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+import inspect
+
+from Animal import Fox, Rabbit
+from Food import Mushroom
+
+"""
+Mean-field surrogate of the agent-based Ecosystem, in the spirit of the
+aggregate model the project started from (Archive/popluationGrowthModel.m).
+Only the number of foxes, rabbits and mushrooms is tracked. Encounter
+probabilities follow from a random spread of agents over the grid and the
+3 x 3 vicinity used by vicinityCheck, the rates come from the same species
+parameters as the agents. Every array in a parameter set may hold many
+values, so thousands of parameter sets are integrated at once.
+"""
+
+VICINITY = 9 # cells in the 3 x 3 neighbourhood
+MEAN_SIZE = 1.5 # mean mushroom bundle size
+
+# multipliers fitted by calibrate, 1 means the derived rate is used as is
+SCALES = ['birthScale', 'grazeScale', 'predationScale', 'starveScale']
+
+def expectedLitter(probRepro, maxLitter):
+    """
+    Expected litter size with probability litters
+
+    Parameters
+    ----------
+    probRepro : float
+        probability of the first baby, lowered by 0.05 after every baby
+    maxLitter : int
+        maximum litter size
+
+    Returns
+    -------
+    float
+        expected number of babies
+    """
+
+    expected = 0.0
+    survive = 1.0
+    for i in range(maxLitter):
+        survive = survive*max(probRepro - 0.05*i, 0)
+        expected = expected + survive
+    return expected
+
+def speciesParams(probLitter=False, omni=False, decomp=False, maxHunger=10):
+    """
+    Parameter set derived from the species classes
+
+    Parameters
+    ----------
+    probLitter : boolean, optional
+        do animals have probability litter sizes, (Default False)
+    omni : boolean, optional
+        are foxes omnivores, (Default False)
+    decomp : boolean, optional
+        are mushrooms decomposers, (Default False)
+    maxHunger : int, optional
+        maximum hunger before death, (Default 10)
+
+    Returns
+    -------
+    dictionary
+        one value per parameter
+    """
+
+    params = {}
+    for prefix, species in [('rabbit', Rabbit), ('fox', Fox)]:
+        if probLitter:
+            litter = expectedLitter(species.probRepro, species.maxLitter)
+        else:
+            litter = species.probRepro*species.avgLitter
+        params[prefix + 'Litter'] = litter
+        params[prefix + 'MaxHunger'] = maxHunger
+        params[prefix + 'LifeSpan'] = species.lifeSpan
+        params[prefix + 'Cooldown'] = species.matingCooldown
+    # mushroom probabilities are constructor defaults
+    defaults = inspect.signature(Mushroom.__init__).parameters
+    params['mushProbRepro'] = defaults['probRepro'].default
+    params['mushProbDecomp'] = defaults['probDecomp'].default
+    params['omni'] = float(omni)
+    params['decomp'] = float(decomp)
+    for scale in SCALES:
+        params[scale] = 1.0
+    return params
+
+def sampleParams(bounds, count, base=None, seed=None):
+    """
+    Draws parameter sets uniformly within bounds
+
+    Parameters
+    ----------
+    bounds : dictionary
+        (low, high) of each parameter to vary
+    count : int
+        number of parameter sets
+    base : dictionary, optional
+        values of the other parameters, (Default speciesParams())
+    seed : int, optional
+        random seed, (Default None)
+
+    Returns
+    -------
+    dictionary
+        arrays of count values per parameter
+    """
+
+    rng = np.random.RandomState(seed)
+    params = dict(speciesParams() if base is None else base)
+    for key in params:
+        params[key] = np.full(count, params[key], dtype=float)
+    for key, (low, high) in bounds.items():
+        params[key] = rng.uniform(low, high, count)
+    return params
+
+def rates(state, params, area):
+    """
+    Change per time step of the fox, rabbit and mushroom populations
+
+    Parameters
+    ----------
+    state : array(float)
+        P x 3 number of foxes, rabbits and mushrooms
+    params : dictionary
+        parameter values, scalars or arrays of P values
+    area : int
+        number of cells in the grid
+
+    Returns
+    -------
+    array(float)
+        P x 3 change per time step
+    """
+
+    F, R, M = state[:, 0], state[:, 1], state[:, 2]
+    p = params
+
+    # chance of at least one member of a species in a random vicinity
+    nearF = 1 - np.exp(-VICINITY*F/area)
+    nearR = 1 - np.exp(-VICINITY*R/area)
+    nearM = 1 - np.exp(-VICINITY*M/area)
+
+    # feeding: every rabbit near a fox is eaten, every mushroom near a rabbit is eaten
+    predation = p['predationScale']*R*nearF
+    grazed = p['grazeScale']*M*nearR
+    foxGrazing = p['omni']*p['grazeScale']*M*nearF*(1 - nearR)
+
+    # hunger drifts up when unfed and down by the food eaten, starvation
+    # follows once the drift has used up maxHunger
+    def starvation(fed, gain, maxHunger):
+        drift = (1 - fed) - fed*gain
+        return p['starveScale']*np.maximum(drift, 0)/maxHunger
+
+    rabbitGain = MEAN_SIZE*VICINITY*M/area/np.maximum(nearM, 1e-12)
+    foxGain = VICINITY*R/area/np.maximum(nearR, 1e-12)
+    foxFed = np.clip(nearR + p['omni']*(1 - nearR)*nearM, 0, 1)
+    starveR = starvation(nearM, rabbitGain, p['rabbitMaxHunger'])
+    starveF = starvation(foxFed, foxGain, p['foxMaxHunger'])
+
+    # mating: a partner in the vicinity and enough energy, once per cooldown
+    mateR = 1 - np.exp(-(VICINITY - 1)*R/area)
+    mateF = 1 - np.exp(-(VICINITY - 1)*F/area)
+    birthR = p['birthScale']*R*mateR*nearM*p['rabbitLitter']/(p['rabbitCooldown'] + 1)
+    birthF = p['birthScale']*F*mateF*foxFed*p['foxLitter']/(p['foxCooldown'] + 1)
+
+    deathR = R*(1/p['rabbitLifeSpan'] + starveR)
+    deathF = F*(1/p['foxLifeSpan'] + starveF)
+
+    growth = p['mushProbRepro']*M*np.maximum(1 - M/area, 0)
+    decomposed = p['decomp']*p['mushProbDecomp']*(deathR + deathF)*(1 - M/area)
+
+    dF = birthF - deathF
+    dR = birthR - deathR - predation
+    dM = growth + decomposed - grazed - foxGrazing
+    return np.stack([dF, dR, dM], axis=1)
+
+def integrate(params, init, rows, ticks, dt=1.0):
+    """
+    Integrates the mean-field model for every parameter set at once
+
+    Parameters
+    ----------
+    params : dictionary
+        parameter values, scalars or arrays of P values
+    init : tuple(float)
+        starting number of foxes, rabbits and mushrooms
+    rows : int
+        the dimension of the ecosystem grid
+    ticks : int
+        number of time steps
+    dt : float, optional
+        integration step in time steps, (Default 1.0)
+
+    Returns
+    -------
+    array(float)
+        P x (ticks+1) x 3 number of foxes, rabbits and mushrooms
+    """
+
+    area = rows*rows
+    count = max([np.size(value) for value in params.values()])
+    params = {key: np.broadcast_to(np.asarray(value, dtype=float), (count,))
+              for key, value in params.items()}
+    state = np.tile(np.asarray(init, dtype=float), (count, 1))
+    out = np.zeros((count, ticks + 1, 3))
+    out[:, 0] = state
+    substeps = max(int(round(1/dt)), 1)
+    for t in range(1, ticks + 1):
+        for _ in range(substeps):
+            state = state + rates(state, params, area)/substeps
+            # less than one animal or mushroom is extinct
+            state[state < 1] = 0
+        out[:, t] = state
+    return out
+
+def screen(params, init, rows, ticks):
+    """
+    Finds the parameter sets where all three species survive
+
+    Parameters
+    ----------
+    params : dictionary
+        parameter values, arrays of P values
+    init : tuple(float)
+        starting number of foxes, rabbits and mushrooms
+    rows : int
+        the dimension of the ecosystem grid
+    ticks : int
+        number of time steps
+
+    Returns
+    -------
+    array(bool)
+        P flags, True when no species went extinct
+    array(float)
+        P x (ticks+1) x 3 trajectories
+    """
+
+    trajectories = integrate(params, init, rows, ticks)
+    return (trajectories[:, -1] > 0).all(axis=1), trajectories
+
+def calibrate(runs, rows, params=None, candidates=2000, spread=4.0, seed=None):
+    """
+    Fits the rate multipliers to short agent-based runs
+
+    Parameters
+    ----------
+    runs : array(dictionary)
+        population histories keyed numFoxes, numRabbits and numMushrooms,
+        all started from the same populations
+    rows : int
+        the dimension of the ecosystem grid
+    params : dictionary, optional
+        parameter set to calibrate, (Default speciesParams())
+    candidates : int, optional
+        number of multiplier sets tried, (Default 2000)
+    spread : float, optional
+        multipliers are tried between 1/spread and spread, (Default 4.0)
+    seed : int, optional
+        random seed, (Default None)
+
+    Returns
+    -------
+    dictionary
+        the parameter set with the best fitting multipliers
+    """
+
+    if params is None:
+        params = speciesParams()
+    ticks = min(len(run['numFoxes']) for run in runs) - 1
+    keys = ['numFoxes', 'numRabbits', 'numMushrooms']
+    target = np.mean([[run[key][:ticks+1] for key in keys] for run in runs], axis=0).T
+    init = target[0]
+
+    rng = np.random.RandomState(seed)
+    trial = dict(params)
+    for scale in SCALES:
+        trial[scale] = params[scale]*np.exp(rng.uniform(-np.log(spread), np.log(spread), candidates))
+    trajectories = integrate(trial, init, rows, ticks)
+
+    # log error so every species counts the same
+    error = ((np.log1p(trajectories) - np.log1p(target))**2).mean(axis=(1, 2))
+    best = int(np.argmin(error))
+    fitted = dict(params)
+    for scale in SCALES:
+        fitted[scale] = float(trial[scale][best])
+    return fitted
@@ -0,0 +1,179 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+import json
+
+class MemmapHistory:
+    """
+    A class used to record grid history in an on-disk memory map
+
+    The grids are stored as a raw uint8 array of shape (T, rows, rows). The file
+    is preallocated in chunks of time steps and grown as needed, the recorded
+    length is kept in a small json file next to it so the history can be
+    reopened instantly and sliced without loading it into memory.
+
+    Attributes
+    ----------
+    fileName : str
+        raw file the grids are stored in
+    rows : int
+        the dimension of the grid
+    chunkTicks : int
+        number of time steps the file grows by
+    length : int
+        number of grids recorded
+    capacity : int
+        number of grids the file currently has room for
+    data : memmap(uint8)
+        capacity x rows x rows view of the file
+    readOnly : boolean
+        was the history opened for reading only
+
+    Methods
+    -------
+    append(grid)
+        Writes a grid to the next time step
+    frames()
+        Returns a zero-copy view of the recorded grids
+    flush()
+        Writes the data and recorded length to disk
+    close()
+        Trims the file to the recorded length and flushes
+    open(fileName)
+        Opens a recorded history for reading
+    """
+
+    def __init__(self, fileName, rows, chunkTicks=1024):
+        """
+        Parameters
+        ----------
+        fileName : str
+            raw file to store the grids in, it is overwritten
+        rows : int
+            the dimension of the grid
+        chunkTicks : int, optional
+            number of time steps to preallocate at a time, (Default 1024)
+        """
+
+        self.fileName = fileName
+        self.rows = rows
+        self.chunkTicks = chunkTicks
+        self.length = 0
+        self.capacity = 0
+        self.data = None
+        self.readOnly = False
+        open(fileName, 'wb').close()
+        self.grow()
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        return self.frames()[index]
+
+    def grow(self):
+        """
+        Extends the file by another chunk of time steps
+        """
+
+        if self.data is not None:
+            self.data.flush()
+            self.data = None
+        self.capacity = self.capacity + self.chunkTicks
+        with open(self.fileName, 'r+b') as f:
+            f.truncate(self.capacity*self.rows*self.rows)
+        self.data = np.memmap(self.fileName, dtype=np.uint8, mode='r+',
+                              shape=(self.capacity, self.rows, self.rows))
+
+    def append(self, grid):
+        """
+        Writes a grid to the next time step
+
+        Parameters
+        ----------
+        grid : array(int)
+            rows x rows grid with values 0-255
+        """
+
+        if self.readOnly:
+            raise ValueError("History was opened for reading only")
+        if self.length == self.capacity:
+            self.grow()
+        self.data[self.length] = grid
+        self.length = self.length + 1
+
+    def frames(self):
+        """
+        Returns a zero-copy view of the recorded grids
+
+        Returns
+        -------
+        memmap(uint8)
+            length x rows x rows grids
+        """
+
+        return self.data[:self.length]
+
+    def flush(self):
+        """
+        Writes the data and recorded length to disk
+        """
+
+        if not self.readOnly:
+            self.data.flush()
+            with open(self.fileName + ".json", 'w') as f:
+                json.dump({"rows": self.rows, "length": self.length}, f)
+
+    def close(self):
+        """
+        Trims the file to the recorded length and flushes
+        """
+
+        if self.readOnly:
+            return
+        self.flush()
+        self.data = None
+        with open(self.fileName, 'r+b') as f:
+            f.truncate(self.length*self.rows*self.rows)
+        self.capacity = self.length
+        # reopen the trimmed file so the history stays readable
+        if self.length > 0:
+            self.data = np.memmap(self.fileName, dtype=np.uint8, mode='r',
+                                  shape=(self.length, self.rows, self.rows))
+        else:
+            self.data = np.zeros((0, self.rows, self.rows), dtype=np.uint8)
+        self.readOnly = True
+
+    @staticmethod
+    def open(fileName):
+        """
+        Opens a recorded history for reading
+
+        Parameters
+        ----------
+        fileName : str
+            raw file written by a MemmapHistory
+
+        Returns
+        -------
+        MemmapHistory
+            the recorded history, frames are read from disk on access
+        """
+
+        with open(fileName + ".json") as f:
+            header = json.load(f)
+        history = MemmapHistory.__new__(MemmapHistory)
+        history.fileName = fileName
+        history.rows = header["rows"]
+        history.chunkTicks = 0
+        history.length = header["length"]
+        history.capacity = history.length
+        history.readOnly = True
+        if history.length > 0:
+            history.data = np.memmap(fileName, dtype=np.uint8, mode='r',
+                                     shape=(history.length, history.rows, history.rows))
+        else:
+            history.data = np.zeros((0, history.rows, history.rows), dtype=np.uint8)
+        return history
@@ -0,0 +1,283 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+import os
+import tracemalloc
+
+"""
+Opt-in memory instrumentation of an Ecosystem. Every few time steps the
+probe measures the process memory, either the bytes traced by tracemalloc
+or the resident set size, and estimates how much of it is held by the
+agents of each species, the grid arrays, the population lists, the grid
+history and the animation frames. The samples are stored with the
+population counts of the same time step so memory growth can be lined up
+with population booms.
+"""
+
+# parts of the ecosystem memory is attributed to
+PARTS = ['Fox', 'Rabbit', 'Mushroom', 'grids', 'populations', 'history', 'render']
+
+def objectBytes(obj):
+    """
+    Size of an object and its attribute dictionary
+
+    Parameters
+    ----------
+    obj : object
+        the object to measure
+
+    Returns
+    -------
+    int
+        size in bytes of the object, its attributes and their values
+    """
+
+    size = sys.getsizeof(obj)
+    attributes = getattr(obj, '__dict__', None)
+    if attributes is not None:
+        size = size + sys.getsizeof(attributes)
+        for value in attributes.values():
+            size = size + sys.getsizeof(value)
+    return size
+
+def agentBytes(agents):
+    """
+    Size of a list of agents
+
+    Parameters
+    ----------
+    agents : array(Animal) or array(Food)
+        the agents to measure
+
+    Returns
+    -------
+    int
+        size in bytes of the list and every agent in it
+    """
+
+    return sys.getsizeof(agents) + sum(objectBytes(agent) for agent in agents)
+
+def historyBytes(history):
+    """
+    Size of the recorded grid history held in memory
+
+    Parameters
+    ----------
+    history : array
+        list of grids, FrameHistory or MemmapHistory
+
+    Returns
+    -------
+    int
+        size in bytes, 0 for histories kept on disk
+    """
+
+    if history is None or hasattr(history, 'fileName'):
+        # memory mapped frames live in the page cache, not the process
+        return 0
+    if hasattr(history, 'nbytes'):
+        return history.nbytes()
+    return sys.getsizeof(history) + sum(getattr(grid, 'nbytes', sys.getsizeof(grid))
+                                        for grid in history)
+
+def renderBytes(frames):
+    """
+    Size of the image buffers of animation frames
+
+    Parameters
+    ----------
+    frames : array(array(AxesImage))
+        the artists of every animation frame
+
+    Returns
+    -------
+    int
+        size in bytes of the image arrays
+    """
+
+    size = sys.getsizeof(frames)
+    for frame in frames:
+        for artist in frame:
+            size = size + objectBytes(artist) + np.asarray(artist.get_array()).nbytes
+    return size
+
+def residentBytes():
+    """
+    Resident set size of the process
+
+    Returns
+    -------
+    int
+        resident memory in bytes
+    """
+
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        # peak instead of current resident memory, in kilobytes on Linux
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024
+
+class MemoryProbe:
+    """
+    A class used to sample the memory of an ecosystem over time
+
+    Attributes
+    ----------
+    every : int
+        number of time steps between samples
+    mode : str
+        'tracemalloc' for the bytes allocated by Python, 'rss' for the
+        resident memory of the process
+    samples : dictionary
+        list of values per sampled quantity: tick, total, the parts in PARTS,
+        numFoxes, numRabbits and numMushrooms, and in tracemalloc mode peak
+    files : array(dictionary)
+        traced bytes per source file of the project at every sample,
+        empty in rss mode
+
+    Methods
+    -------
+    start()
+        Starts tracing allocations
+    stop()
+        Stops tracing allocations
+    sample(ecosystem)
+        Records the memory of the ecosystem at the current time step
+    fileBytes()
+        Returns the traced bytes per source file of the project
+    series()
+        Returns the samples as arrays
+    save(exp, dirName)
+        Stores the samples next to the population history
+    """
+
+    def __init__(self, every=100, mode='tracemalloc'):
+        """
+        Parameters
+        ----------
+        every : int, optional
+            number of time steps between samples, (Default 100)
+        mode : str, optional
+            'tracemalloc' or 'rss', (Default 'tracemalloc')
+        """
+
+        if mode not in ('tracemalloc', 'rss'):
+            raise ValueError("mode must be 'tracemalloc' or 'rss'")
+        self.every = every
+        self.mode = mode
+        keys = ['tick', 'total'] + PARTS + ['numFoxes', 'numRabbits', 'numMushrooms']
+        if mode == 'tracemalloc':
+            keys.append('peak')
+        self.samples = {key: [] for key in keys}
+        self.files = []
+        self.startedTracing = False
+        self.root = os.path.dirname(os.path.abspath(__file__))
+        self.start()
+
+    def start(self):
+        """
+        Starts tracing allocations, in tracemalloc mode
+        """
+
+        if self.mode == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.startedTracing = True
+
+    def stop(self):
+        """
+        Stops tracing allocations if the probe started tracing
+        """
+
+        if self.startedTracing:
+            tracemalloc.stop()
+            self.startedTracing = False
+
+    def sample(self, ecosystem):
+        """
+        Records the memory of the ecosystem at the current time step
+
+        Parameters
+        ----------
+        ecosystem : Ecosystem
+            the ecosystem to measure
+        """
+
+        samples = self.samples
+        samples['tick'].append(ecosystem.ticks)
+        if self.mode == 'tracemalloc':
+            current, peak = tracemalloc.get_traced_memory()
+            samples['total'].append(current)
+            samples['peak'].append(peak)
+            self.files.append(self.fileBytes())
+        else:
+            samples['total'].append(residentBytes())
+
+        samples['Fox'].append(agentBytes(ecosystem.foxes_array))
+        samples['Rabbit'].append(agentBytes(ecosystem.rabbits_array))
+        samples['Mushroom'].append(agentBytes(ecosystem.mush_array))
+        grid = 0 if ecosystem.grid is None else ecosystem.grid.nbytes
+        if ecosystem.cellLattice is not None:
+            grid = grid + ecosystem.cellLattice.nbytes()
+        samples['grids'].append(grid + ecosystem.occupiedMush.nbytes())
+        populations = ecosystem.populations()
+        samples['populations'].append(sum(agentBytes(series) for series in populations.values()))
+        samples['history'].append(historyBytes(ecosystem.history))
+        samples['render'].append(renderBytes(ecosystem.renderFrames))
+        for key in ['numFoxes', 'numRabbits', 'numMushrooms']:
+            series = populations[key]
+            samples[key].append(series[-1] if len(series) else 0)
+
+    def fileBytes(self):
+        """
+        Traced bytes per source file of the project
+
+        Returns
+        -------
+        dictionary
+            bytes allocated by the code of each project file still alive
+        """
+
+        snapshot = tracemalloc.take_snapshot()
+        files = {}
+        for stat in snapshot.statistics('filename'):
+            fileName = stat.traceback[0].filename
+            if os.path.isabs(fileName) and os.path.dirname(fileName) == self.root:
+                files[os.path.basename(fileName)] = stat.size
+        return files
+
+    def series(self):
+        """
+        Returns the samples as arrays
+
+        Returns
+        -------
+        dictionary
+            one array per sampled quantity, see samples
+        """
+
+        return {key: np.asarray(values) for key, values in self.samples.items()}
+
+    def save(self, exp, dirName):
+        """
+        Stores the samples next to the population history
+
+        Parameters
+        ----------
+        exp : str
+            Name of the experiment
+        dirName : str
+            Directory of the experiment
+
+        Returns
+        -------
+        str
+            the memory file
+        """
+
+        fileName = os.path.join(dirName, exp + "-memory.npz")
+        np.savez(fileName, **self.series())
+        return fileName
@@ -0,0 +1,381 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+
+"""
+Occupancy of the grid cells, e.g. which cells hold a mushroom. All
+backends are indexed like a 2d array, occupied[x, y], and hold 0 or 1:
+
+    dense   one byte per cell
+    bits    one bit per cell
+    sparse  set of the occupied cells, memory grows with the agents only
+    auto    sparse while few cells are occupied, a raster once the set
+            would take more memory than the raster
+"""
+
+SPARSE_CELL_BYTES = 64 # approximate bytes per occupied cell in a Python set
+DENSE_LIMIT = 1 << 24 # largest raster stored with one byte per cell
+
+class DenseOccupancy:
+    """
+    A class used to store occupancy with one byte per cell
+
+    Attributes
+    ----------
+    rows : int
+        the dimension of the grid
+    cells : array(uint8)
+        rows x rows occupancy
+
+    Methods
+    -------
+    clear()
+        Marks every cell as free
+    count()
+        Returns the number of occupied cells
+    occupied()
+        Returns the flat indices of the occupied cells
+    take(indices)
+        Returns the occupancy of many cells given by flat index
+    put(indices, value=1)
+        Sets the occupancy of many cells given by flat index
+    nbytes()
+        Returns the memory used
+    """
+
+    def __init__(self, rows):
+        """
+        Parameters
+        ----------
+        rows : int
+            the dimension of the grid
+        """
+
+        self.rows = rows
+        self.cells = np.zeros((rows, rows), dtype=np.uint8)
+
+    def __getitem__(self, key):
+        return self.cells[key]
+
+    def __setitem__(self, key, value):
+        self.cells[key] = value
+
+    def clear(self):
+        self.cells.fill(0)
+
+    def count(self):
+        return int(np.count_nonzero(self.cells))
+
+    def occupied(self):
+        return np.flatnonzero(self.cells)
+
+    def take(self, indices):
+        return self.cells.ravel()[indices]
+
+    def put(self, indices, value=1):
+        self.cells.ravel()[indices] = value
+
+    def nbytes(self):
+        return self.cells.nbytes
+
+class BitOccupancy:
+    """
+    A class used to store occupancy with one bit per cell
+
+    Cell (x, y) is bit x*rows + y, the lowest bit of each byte first.
+
+    Attributes
+    ----------
+    rows : int
+        the dimension of the grid
+    bits : array(uint8)
+        packed occupancy
+    total : int
+        number of occupied cells, kept up to date by every change
+
+    Methods
+    -------
+    clear()
+        Marks every cell as free
+    count()
+        Returns the number of occupied cells
+    occupied()
+        Returns the flat indices of the occupied cells
+    take(indices)
+        Returns the occupancy of many cells given by flat index
+    put(indices, value=1)
+        Sets the occupancy of many cells given by flat index
+    nbytes()
+        Returns the memory used
+    """
+
+    def __init__(self, rows):
+        """
+        Parameters
+        ----------
+        rows : int
+            the dimension of the grid
+        """
+
+        self.rows = rows
+        self.bits = np.zeros((rows*rows + 7)//8, dtype=np.uint8)
+        self.total = 0
+
+    def __getitem__(self, key):
+        i = int(key[0])*self.rows + int(key[1])
+        return (int(self.bits[i >> 3]) >> (i & 7)) & 1
+
+    def __setitem__(self, key, value):
+        i = int(key[0])*self.rows + int(key[1])
+        byte = int(self.bits[i >> 3])
+        was = (byte >> (i & 7)) & 1
+        if value:
+            self.bits[i >> 3] = byte | (1 << (i & 7))
+            self.total = self.total + 1 - was
+        else:
+            self.bits[i >> 3] = byte & ~(1 << (i & 7))
+            self.total = self.total - was
+
+    def clear(self):
+        self.bits.fill(0)
+        self.total = 0
+
+    def count(self):
+        return self.total
+
+    def occupied(self):
+        # only the bytes holding a cell are unpacked, the raster never is
+        nonzero = np.flatnonzero(self.bits)
+        bits = np.unpackbits(self.bits[nonzero, None], axis=1, bitorder='little')
+        byte, bit = np.nonzero(bits)
+        return nonzero[byte]*8 + bit
+
+    def take(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        return (self.bits[indices >> 3] >> (indices & 7).astype(np.uint8)) & 1
+
+    def put(self, indices, value=1):
+        indices = np.unique(np.asarray(indices, dtype=np.int64))
+        changed = np.count_nonzero(self.take(indices) != (1 if value else 0))
+        masks = np.left_shift(1, indices & 7).astype(np.uint8)
+        if value:
+            np.bitwise_or.at(self.bits, indices >> 3, masks)
+            self.total = self.total + changed
+        else:
+            np.bitwise_and.at(self.bits, indices >> 3, ~masks)
+            self.total = self.total - changed
+
+    def nbytes(self):
+        return self.bits.nbytes
+
+class SparseOccupancy:
+    """
+    A class used to store occupancy as a set of occupied cells
+
+    Attributes
+    ----------
+    rows : int
+        the dimension of the grid
+    cells : set(int)
+        flat index x*rows + y of every occupied cell
+
+    Methods
+    -------
+    clear()
+        Marks every cell as free
+    count()
+        Returns the number of occupied cells
+    occupied()
+        Returns the flat indices of the occupied cells
+    take(indices)
+        Returns the occupancy of many cells given by flat index
+    put(indices, value=1)
+        Sets the occupancy of many cells given by flat index
+    nbytes()
+        Returns the memory used
+    """
+
+    def __init__(self, rows):
+        """
+        Parameters
+        ----------
+        rows : int
+            the dimension of the grid
+        """
+
+        self.rows = rows
+        self.cells = set()
+
+    def __getitem__(self, key):
+        return 1 if int(key[0])*self.rows + int(key[1]) in self.cells else 0
+
+    def __setitem__(self, key, value):
+        i = int(key[0])*self.rows + int(key[1])
+        if value:
+            self.cells.add(i)
+        else:
+            self.cells.discard(i)
+
+    def clear(self):
+        self.cells.clear()
+
+    def count(self):
+        return len(self.cells)
+
+    def occupied(self):
+        return np.array(sorted(self.cells), dtype=np.int64)
+
+    def take(self, indices):
+        cells = self.cells
+        indices = np.asarray(indices).tolist()
+        return np.fromiter((i in cells for i in indices), dtype=np.uint8, count=len(indices))
+
+    def put(self, indices, value=1):
+        if value:
+            self.cells.update(np.asarray(indices).tolist())
+        else:
+            self.cells.difference_update(np.asarray(indices).tolist())
+
+    def nbytes(self):
+        return sys.getsizeof(self.cells) + sum(sys.getsizeof(i) for i in self.cells)
+
+class AdaptiveOccupancy:
+    """
+    A class used to store occupancy sparse or as a raster, whichever is smaller
+
+    Starts as a set and turns into a raster once the set would take more
+    memory than the raster. It goes back to a set when cleared.
+
+    Attributes
+    ----------
+    rows : int
+        the dimension of the grid
+    store : SparseOccupancy, DenseOccupancy or BitOccupancy
+        the backend in use
+    limit : int
+        number of occupied cells at which the set becomes a raster
+
+    Methods
+    -------
+    clear()
+        Marks every cell as free
+    count()
+        Returns the number of occupied cells
+    occupied()
+        Returns the flat indices of the occupied cells
+    take(indices)
+        Returns the occupancy of many cells given by flat index
+    put(indices, value=1)
+        Sets the occupancy of many cells given by flat index
+    nbytes()
+        Returns the memory used
+    fit()
+        Switches to a raster if the set has grown too large
+    """
+
+    def __init__(self, rows):
+        """
+        Parameters
+        ----------
+        rows : int
+            the dimension of the grid
+        """
+
+        self.rows = rows
+        self.store = SparseOccupancy(rows)
+        self.limit = max(rasterBytes(rows)//SPARSE_CELL_BYTES, 1)
+
+    def __getitem__(self, key):
+        return self.store[key]
+
+    def __setitem__(self, key, value):
+        self.store[key] = value
+        if value:
+            self.fit()
+
+    def fit(self):
+        if isinstance(self.store, SparseOccupancy) and len(self.store.cells) > self.limit:
+            # too many cells for a set, switch to a raster
+            store = raster(self.rows)
+            store.put(self.store.occupied())
+            self.store = store
+
+    def clear(self):
+        self.store = SparseOccupancy(self.rows)
+
+    def count(self):
+        return self.store.count()
+
+    def occupied(self):
+        return self.store.occupied()
+
+    def take(self, indices):
+        return self.store.take(indices)
+
+    def put(self, indices, value=1):
+        self.store.put(indices, value)
+        if value:
+            self.fit()
+
+    def nbytes(self):
+        return self.store.nbytes()
+
+def rasterBytes(rows):
+    """
+    Memory of the raster backend used for a grid size
+
+    Parameters
+    ----------
+    rows : int
+        the dimension of the grid
+
+    Returns
+    -------
+    int
+        bytes of a dense raster, or a bit-packed one on large grids
+    """
+
+    return rows*rows if rows*rows <= DENSE_LIMIT else (rows*rows + 7)//8
+
+def raster(rows):
+    """
+    Raster backend for a grid size, one byte per cell unless the grid is large
+
+    Parameters
+    ----------
+    rows : int
+        the dimension of the grid
+
+    Returns
+    -------
+    DenseOccupancy or BitOccupancy
+        empty occupancy
+    """
+
+    return DenseOccupancy(rows) if rows*rows <= DENSE_LIMIT else BitOccupancy(rows)
+
+BACKENDS = {'dense': DenseOccupancy, 'bits': BitOccupancy, 'sparse': SparseOccupancy,
+            'auto': AdaptiveOccupancy}
+
+def create(rows, backend='auto'):
+    """
+    Creates an empty occupancy
+
+    Parameters
+    ----------
+    rows : int
+        the dimension of the grid
+    backend : str, optional
+        'dense', 'bits', 'sparse' or 'auto', (Default 'auto')
+
+    Returns
+    -------
+    object
+        occupancy indexed as occupied[x, y]
+    """
+
+    if backend not in BACKENDS:
+        raise ValueError("unknown occupancy backend " + str(backend))
+    return BACKENDS[backend](rows)
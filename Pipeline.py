@@ -0,0 +1,380 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+import multiprocessing
+
+"""
+Pipelined simulation and rendering. The simulation keeps stepping in its
+own process while a render process draws and encodes the frames, so an
+animated run takes about as long as the slower of the two rather than
+their sum.
+
+Frames travel through a ring buffer of shared memory slots. Each slot
+holds one mapToGrid frame plus the time step and the population counts.
+Two semaphores count the free and the filled slots. When every slot is
+filled the simulation either waits for the renderer ('block'), so the
+video has every frame, or drops the frame ('drop') to keep stepping.
+
+    pipeline = RenderPipeline(eco.mapSize, "run.mp4")
+    pipeline.start()
+    pipeline.put(eco.ticks, eco.mapToGrid(), counts)
+    ...
+    pipeline.close()
+
+Ecosystem.record does all of this for a whole run.
+"""
+
+POLICIES = ['drop', 'block']
+
+# slot header: time step, mushrooms, foxes, rabbits
+HEADER = 4
+END = -1 # time step of the slot that ends the stream
+
+class FrameRing:
+    """
+    A class used to pass grid frames between two processes in shared memory
+
+    There is one producer and one consumer. Each of them keeps its own
+    position in the ring, so only the semaphores are shared.
+
+    Attributes
+    ----------
+    slots : int
+        number of frames the ring holds
+    rows : int
+        the dimension of the grid
+    grids : RawArray
+        slots x rows x rows frames
+    headers : RawArray
+        slots x HEADER time step and population counts of every frame
+    free : Semaphore
+        counts the slots the producer can fill
+    filled : Semaphore
+        counts the slots the consumer can read
+    head : int
+        next slot the producer fills
+    tail : int
+        next slot the consumer reads
+
+    Methods
+    -------
+    put(tick, grid, counts, block=True, timeout=None)
+        Copies a frame into the next free slot
+    get()
+        Returns the frame in the next filled slot
+    release()
+        Hands the slot last read back to the producer
+    """
+
+    def __init__(self, rows, slots=8):
+        """
+        Parameters
+        ----------
+        rows : int
+            the dimension of the grid
+        slots : int, optional
+            number of frames the ring holds, (Default 8)
+        """
+
+        self.slots = slots
+        self.rows = rows
+        self.grids = multiprocessing.RawArray('B', slots*rows*rows)
+        self.headers = multiprocessing.RawArray('q', slots*HEADER)
+        self.free = multiprocessing.Semaphore(slots)
+        self.filled = multiprocessing.Semaphore(0)
+        self.head = 0
+        self.tail = 0
+
+    def views(self):
+        """
+        Numpy views of the shared frames and headers, made in the process using them
+        """
+
+        grids = np.frombuffer(self.grids, dtype=np.uint8).reshape(self.slots, self.rows, self.rows)
+        headers = np.frombuffer(self.headers, dtype=np.int64).reshape(self.slots, HEADER)
+        return grids, headers
+
+    def put(self, tick, grid, counts, block=True, timeout=None):
+        """
+        Copies a frame into the next free slot
+
+        Parameters
+        ----------
+        tick : int
+            time step of the frame, END to end the stream
+        grid : array(uint8)
+            rows x rows frame, copied so the caller can reuse it
+        counts : tuple(int)
+            number of mushrooms, foxes and rabbits
+        block : boolean, optional
+            wait for a free slot, (Default True)
+        timeout : float, optional
+            seconds to wait for a free slot, (Default None, no limit)
+
+        Returns
+        -------
+        boolean
+            was the frame put in the ring
+        """
+
+        if not self.free.acquire(block, timeout):
+            return False
+        grids, headers = self.views()
+        if grid is not None:
+            grids[self.head] = grid
+        headers[self.head] = (tick,) + tuple(counts)
+        self.head = (self.head + 1) % self.slots
+        self.filled.release()
+        return True
+
+    def get(self):
+        """
+        Returns the frame in the next filled slot
+
+        The frame is a view of the slot, it stays valid until release.
+
+        Returns
+        -------
+        int
+            time step of the frame, END when the stream ended
+        array(uint8)
+            rows x rows frame
+        array(int)
+            number of mushrooms, foxes and rabbits
+        """
+
+        self.filled.acquire()
+        grids, headers = self.views()
+        slot = self.tail
+        return int(headers[slot, 0]), grids[slot], headers[slot, 1:]
+
+    def release(self):
+        """
+        Hands the slot last read back to the producer
+        """
+
+        self.tail = (self.tail + 1) % self.slots
+        self.free.release()
+
+def renderFrames(ring, fileName, interval=200, dpi=100, populations=True):
+    """
+    Draws and encodes frames from a ring until the stream ends
+
+    Runs in the render process. With populations the population growth is
+    plotted next to the grid, like the progress plot of animate.
+
+    Parameters
+    ----------
+    ring : FrameRing
+        ring the frames arrive in
+    fileName : str
+        video file to write
+    interval : int, optional
+        delay between frames in milliseconds, (Default 200)
+    dpi : int, optional
+        resolution of the video, (Default 100)
+    populations : boolean, optional
+        plot the population counts beside the grid, (Default True)
+
+    Returns
+    -------
+    int
+        number of frames encoded
+    """
+
+    from matplotlib import animation
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    from Render import cmap, n
+
+    # object oriented figure, the render process has no pyplot state
+    fig = Figure(figsize=(10, 4.8) if populations else None)
+    FigureCanvasAgg(fig)
+    if populations:
+        ax = fig.add_subplot(1, 2, 1)
+        plot = fig.add_subplot(1, 2, 2)
+        plot.set_title("Population Growth")
+        plot.set_xlabel("time step")
+        lines = [plot.plot([], [], label=name)[0]
+                 for name in ["Mushrooms", "Foxes", "Rabbits"]]
+        plot.legend(loc='upper left')
+        ticks = []
+        history = [[], [], []]
+    else:
+        ax = fig.add_subplot(1, 1, 1)
+    img = ax.imshow(np.zeros((ring.rows, ring.rows), dtype=np.uint8), cmap=cmap, norm=n)
+
+    frames = 0
+    writer = animation.FFMpegWriter(fps=1000/interval)
+    with writer.saving(fig, fileName, dpi):
+        while True:
+            tick, grid, counts = ring.get()
+            if tick == END:
+                ring.release()
+                break
+            img.set_data(grid[::-1])
+            if populations:
+                ticks.append(tick)
+                for line, values, count in zip(lines, history, counts.tolist()):
+                    values.append(count)
+                    line.set_data(ticks, values)
+                plot.relim()
+                plot.autoscale_view()
+            writer.grab_frame()
+            # the slot is only handed back once the frame is encoded
+            ring.release()
+            frames = frames + 1
+    return frames
+
+def _renderFrames(ring, fileName, interval, dpi, populations, done):
+    """
+    Runs renderFrames in the render process and reports the frames encoded
+    """
+
+    done.value = renderFrames(ring, fileName, interval, dpi, populations)
+
+class RenderPipeline:
+    """
+    A class used to render frames in a separate process while the simulation runs
+
+    Attributes
+    ----------
+    ring : FrameRing
+        shared memory slots between the simulation and the renderer
+    fileName : str
+        video file to write
+    policy : str
+        'block' waits while every slot is filled, 'drop' skips frames
+    interval : int
+        delay between frames in milliseconds
+    dpi : int
+        resolution of the video
+    populations : boolean
+        plot the population counts beside the grid
+    process : Process
+        the render process, None before start
+    sent : int
+        frames put in the ring
+    dropped : int
+        frames skipped by the drop policy
+    encoded : int
+        frames encoded, known after close
+
+    Methods
+    -------
+    start()
+        Starts the render process
+    put(tick, grid, counts)
+        Hands a frame to the renderer
+    close()
+        Ends the stream and waits for the video to be written
+    """
+
+    def __init__(self, rows, fileName, slots=8, policy='block', interval=200, dpi=100,
+                 populations=True):
+        """
+        Parameters
+        ----------
+        rows : int
+            the dimension of the grid
+        fileName : str
+            video file to write
+        slots : int, optional
+            number of frames that can wait for the renderer, (Default 8)
+        policy : str, optional
+            'block' or 'drop' when every slot is filled, (Default 'block')
+        interval : int, optional
+            delay between frames in milliseconds, (Default 200)
+        dpi : int, optional
+            resolution of the video, (Default 100)
+        populations : boolean, optional
+            plot the population counts beside the grid, (Default True)
+        """
+
+        if policy not in POLICIES:
+            raise ValueError("policy must be one of " + ", ".join(POLICIES))
+        self.ring = FrameRing(rows, slots)
+        self.fileName = fileName
+        self.policy = policy
+        self.interval = interval
+        self.dpi = dpi
+        self.populations = populations
+        self.process = None
+        self.done = multiprocessing.Value('q', 0)
+        self.sent = 0
+        self.dropped = 0
+        self.encoded = 0
+
+    def start(self):
+        """
+        Starts the render process
+        """
+
+        self.process = multiprocessing.Process(target=_renderFrames,
+                                               args=(self.ring, self.fileName, self.interval,
+                                                     self.dpi, self.populations, self.done))
+        self.process.daemon = True
+        self.process.start()
+
+    def wait(self, tick, grid, counts):
+        """
+        Puts a frame in the ring, waiting as long as the render process lives
+        """
+
+        while not self.ring.put(tick, grid, counts, timeout=0.5):
+            if not self.process.is_alive():
+                raise RuntimeError("render process exited with code " +
+                                   str(self.process.exitcode))
+
+    def put(self, tick, grid, counts):
+        """
+        Hands a frame to the renderer
+
+        Parameters
+        ----------
+        tick : int
+            time step of the frame
+        grid : array(uint8)
+            rows x rows frame, e.g. from mapToGrid
+        counts : tuple(int)
+            number of mushrooms, foxes and rabbits
+
+        Returns
+        -------
+        boolean
+            was the frame handed over, False when it was dropped
+        """
+
+        if self.policy == 'drop':
+            if not self.ring.put(tick, grid, counts, block=False):
+                self.dropped = self.dropped + 1
+                return False
+        else:
+            self.wait(tick, grid, counts)
+        self.sent = self.sent + 1
+        return True
+
+    def close(self):
+        """
+        Ends the stream and waits for the video to be written
+
+        Returns
+        -------
+        int
+            number of frames encoded
+        """
+
+        if self.process is None:
+            return 0
+        # the end of the stream is never dropped
+        self.wait(END, None, (0, 0, 0))
+        self.process.join()
+        if self.process.exitcode != 0:
+            raise RuntimeError("render process exited with code " +
+                               str(self.process.exitcode))
+        self.encoded = self.done.value
+        self.process = None
+        return self.encoded
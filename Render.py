@@ -0,0 +1,288 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+import os, shutil
+import subprocess, tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+from matplotlib import colors
+from matplotlib import animation
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from MemmapHistory import MemmapHistory
+
+cmap = colors.ListedColormap(['White','Blue','Green','Red'])
+
+# normalizes colour range values
+n = colors.Normalize(vmin=0,vmax=3)
+
+"""
+Offline rendering of a recorded grid history. The frames are split into
+chunks, every chunk is encoded to its own segment on a process pool and
+the segments are joined with the ffmpeg concat demuxer, so rendering
+scales with the number of cores and never has to re-run the simulation.
+"""
+
+def encodeSegment(frames, fileName, interval=200, dpi=100):
+    """
+    Encodes a run of grid frames to a video file
+
+    Parameters
+    ----------
+    frames : array(int)
+        frames x rows x rows grids to encode
+    fileName : str
+        video file to write
+    interval : int, optional
+        delay between frames in milliseconds, (Default 200)
+    dpi : int, optional
+        resolution of the video, (Default 100)
+
+    Returns
+    -------
+    str
+        the video file written
+    """
+
+    # object oriented figure so no global pyplot state is shared
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    img = ax.imshow(frames[0][::-1], cmap=cmap, norm=n)
+
+    writer = animation.FFMpegWriter(fps=1000/interval)
+    with writer.saving(fig, fileName, dpi):
+        for frame in frames:
+            img.set_data(frame[::-1])
+            writer.grab_frame()
+    return fileName
+
+def _encodeSegment(args):
+    """
+    Unpacks the arguments for encodeSegment on a worker process
+    """
+
+    frames = args[0]
+    if isinstance(frames, tuple):
+        # (fileName, start, stop) of a memory mapped history, read in place
+        fileName, start, stop = frames
+        frames = MemmapHistory.open(fileName).frames()[start:stop]
+    return encodeSegment(frames, *args[1:])
+
+def concatSegments(segments, fileName):
+    """
+    Joins encoded video segments without re-encoding
+
+    Parameters
+    ----------
+    segments : array(str)
+        segment files in playback order
+    fileName : str
+        video file to write
+    """
+
+    listName = fileName + ".segments.txt"
+    with open(listName, 'w') as f:
+        for segment in segments:
+            f.write("file '" + os.path.abspath(segment) + "'\n")
+    try:
+        subprocess.check_call([matplotlib.rcParams['animation.ffmpeg_path'], '-y',
+                               '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                               '-i', listName, '-c', 'copy', fileName])
+    finally:
+        os.remove(listName)
+
+def renderAnimation(frames, fileName, workers=None, chunkFrames=None, interval=200, dpi=100):
+    """
+    Renders a recorded grid history to a video using a process pool
+
+    Parameters
+    ----------
+    frames : array(int)
+        recorded grids, anything supporting len() and slicing
+    fileName : str
+        video file to write
+    workers : int, optional
+        number of encoding processes, (Default number of cores)
+    chunkFrames : int, optional
+        frames per segment, (Default frames split evenly over the workers)
+    interval : int, optional
+        delay between frames in milliseconds, (Default 200)
+    dpi : int, optional
+        resolution of the video, (Default 100)
+
+    Returns
+    -------
+    str
+        the video file written
+    """
+
+    total = len(frames)
+    if total == 0:
+        raise ValueError("No frames to render")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunkFrames is None:
+        chunkFrames = int(np.ceil(total/workers))
+    chunkFrames = max(chunkFrames, 1)
+
+    # a single chunk is encoded straight to the output
+    if workers == 1 or total <= chunkFrames:
+        return encodeSegment(frames[:], fileName, interval, dpi)
+
+    tempDir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(fileName)))
+    try:
+        jobs = []
+        if isinstance(frames, MemmapHistory):
+            frames.flush()
+        for i, start in enumerate(range(0, total, chunkFrames)):
+            if isinstance(frames, MemmapHistory):
+                # workers map the file themselves instead of receiving copies
+                chunk = (frames.fileName, start, min(start+chunkFrames, total))
+            else:
+                chunk = np.asarray(frames[start:start+chunkFrames], dtype=np.uint8)
+            segment = os.path.join(tempDir, "segment-%05d.mp4" % i)
+            jobs.append((chunk, segment, interval, dpi))
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            segments = list(pool.map(_encodeSegment, jobs))
+        concatSegments(segments, fileName)
+    finally:
+        shutil.rmtree(tempDir)
+    return fileName
+
+def levelOfDetail(rows, maxPixels=1000):
+    """
+    Block size needed to show a grid within a number of pixels
+
+    Parameters
+    ----------
+    rows : int
+        the dimension of the grid
+    maxPixels : int, optional
+        maximum number of pixels along each side, (Default 1000)
+
+    Returns
+    -------
+    int
+        side of the square block of cells drawn as one pixel
+    """
+
+    return max(1, -(-rows//maxPixels))
+
+def blockReduce(counts, factor):
+    """
+    Sums a grid over square blocks of cells
+
+    Parameters
+    ----------
+    counts : array(int)
+        ... x rows x rows grids to reduce
+    factor : int
+        side of the square block of cells
+
+    Returns
+    -------
+    array(int)
+        ... x blocks x blocks sums, partial blocks at the edge are kept
+    """
+
+    rows = counts.shape[-1]
+    blocks = -(-rows//factor)
+    pad = blocks*factor - rows
+    if pad > 0:
+        width = [(0, 0)]*(counts.ndim - 2) + [(0, pad), (0, pad)]
+        counts = np.pad(counts, width, mode='constant')
+    shape = counts.shape[:-2] + (blocks, factor, blocks, factor)
+    return counts.reshape(shape).sum(axis=(-3, -1))
+
+def densityImage(densities, scale=None):
+    """
+    Combines species densities into one colour image
+
+    Parameters
+    ----------
+    densities : array(int)
+        3 x rows x rows counts of mushrooms, rabbits and foxes
+    scale : array(float), optional
+        count shown at full colour for each species, (Default the maximum count)
+
+    Returns
+    -------
+    array(float)
+        rows x rows x 3 RGB image, flipped like plotGrid
+    """
+
+    densities = np.asarray(densities, dtype=float)
+    if scale is None:
+        scale = densities.reshape(3, -1).max(axis=1)
+    scale = np.maximum(np.asarray(scale, dtype=float), 1)
+    level = np.clip(densities/scale[:, None, None], 0, 1)
+
+    # start from white and take away the colours a species does not have
+    mush, rabbit, fox = level
+    image = np.ones(densities.shape[1:] + (3,))
+    image[..., 0] -= mush + rabbit
+    image[..., 1] -= mush + fox + 0.5*rabbit
+    image[..., 2] -= rabbit + fox
+    return np.clip(image, 0, 1)[::-1]
+
+def renderDensity(densities, fileName, maxPixels=1000, dpi=100):
+    """
+    Saves the species densities as an image at screen resolution
+
+    Parameters
+    ----------
+    densities : array(int)
+        3 x rows x rows counts of mushrooms, rabbits and foxes
+    fileName : str
+        image file to write
+    maxPixels : int, optional
+        maximum number of pixels along each side, (Default 1000)
+    dpi : int, optional
+        resolution of the image, (Default 100)
+
+    Returns
+    -------
+    str
+        the image file written
+    """
+
+    factor = levelOfDetail(densities.shape[-1], maxPixels)
+    if factor > 1:
+        densities = blockReduce(densities, factor)
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    ax.imshow(densityImage(densities), interpolation='nearest')
+    fig.savefig(fileName, dpi=dpi)
+    return fileName
+
+def renderExperiment(frames, exp, dirName, **kwargs):
+    """
+    Renders the animation of an experiment into its directory
+
+    Parameters
+    ----------
+    frames : array(int)
+        recorded grids of the experiment
+    exp : str
+        Name of the experiment
+    dirName : str
+        Directory to save the file in
+    **kwargs
+        passed on to renderAnimation
+
+    Returns
+    -------
+    str
+        the video file written
+    """
+
+    fileName = os.path.join(dirName, exp + "-animation.mp4")
+    return renderAnimation(frames, fileName, **kwargs)
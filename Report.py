@@ -0,0 +1,216 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+"""
+Report stage for experiment batches. Every figure is built with the object
+oriented matplotlib API from stored population series, so reports do not
+share global pyplot state and can be rendered concurrently.
+"""
+
+# colour used for each species in every report
+SPECIES = [('Foxes', 'numFoxes', 'r'),
+           ('Rabbits', 'numRabbits', 'g'),
+           ('Mushrooms', 'numMushrooms', 'b')]
+
+def populationFile(exp, dirName):
+    """
+    Path of the stored population series of an experiment
+
+    Parameters
+    ----------
+    exp : str
+        Name of the experiment
+    dirName : str
+        Directory of the experiment
+
+    Returns
+    -------
+    str
+        the population file
+    """
+
+    return os.path.join(dirName, exp + "-population.npz")
+
+def savePopulations(populations, exp, dirName):
+    """
+    Stores the population series of an experiment
+
+    Parameters
+    ----------
+    populations : dictionary
+        population series keyed numFoxes, numRabbits and numMushrooms
+    exp : str
+        Name of the experiment
+    dirName : str
+        Directory of the experiment
+
+    Returns
+    -------
+    str
+        the population file
+    """
+
+    fileName = populationFile(exp, dirName)
+    np.savez(fileName, **{key: np.asarray(value) for key, value in populations.items()})
+    return fileName
+
+def loadPopulations(exp, dirName):
+    """
+    Loads the population series of an experiment
+
+    Parameters
+    ----------
+    exp : str
+        Name of the experiment
+    dirName : str
+        Directory of the experiment
+
+    Returns
+    -------
+    dictionary
+        population series keyed numFoxes, numRabbits and numMushrooms
+    """
+
+    with np.load(populationFile(exp, dirName)) as data:
+        return {key: data[key] for key in data.files}
+
+def plotPopulation(ax, populations, exp):
+    """
+    Plots the population history of the three species on an axis
+
+    Parameters
+    ----------
+    ax : Axes
+        axis to draw on
+    populations : dictionary
+        population series keyed numFoxes, numRabbits and numMushrooms
+    exp : str
+        Name of the experiment
+    """
+
+    for label, key, colour in SPECIES:
+        series = populations[key]
+        ax.plot(range(len(series)), series, label=label, color=colour)
+    # mark the time steps interventions were applied
+    interventions = populations.get("interventions", ())
+    for tick in sorted(set(int(row[0]) for row in interventions)):
+        ax.axvline(tick, color='#999999', linestyle=':', linewidth=1)
+    ax.set_xlabel("Sample frames")
+    ax.set_ylabel("Population")
+    ax.set_title("Population Growth - " + exp)
+    ax.legend()
+    ax.grid(True, which='major', color='#ececec', linestyle='-')
+
+def renderReport(exp, dirName, populations=None):
+    """
+    Saves the population history figure of an experiment into its directory
+
+    Parameters
+    ----------
+    exp : str
+        Name of the experiment
+    dirName : str
+        Directory to save the file in
+    populations : dictionary, optional
+        population series, (Default loaded from the experiment directory)
+
+    Returns
+    -------
+    str
+        the figure file written
+    """
+
+    if populations is None:
+        populations = loadPopulations(exp, dirName)
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    plotPopulation(fig.add_subplot(1, 1, 1), populations, exp)
+    fileName = os.path.join(dirName, exp + "-histogram.png")
+    fig.savefig(fileName)
+    return fileName
+
+def _renderReport(args):
+    """
+    Unpacks the arguments for renderReport on a worker process
+    """
+
+    return renderReport(*args)
+
+def plotComparison(experiments, fileName):
+    """
+    Saves a figure comparing the population history of every experiment
+
+    Parameters
+    ----------
+    experiments : array(tuple)
+        (exp, dirName) pair of every experiment
+    fileName : str
+        figure file to write
+
+    Returns
+    -------
+    str
+        the figure file written
+    """
+
+    fig = Figure(figsize=(6, 4*len(SPECIES)))
+    FigureCanvasAgg(fig)
+    axes = [fig.add_subplot(len(SPECIES), 1, i+1) for i in range(len(SPECIES))]
+
+    for exp, dirName in experiments:
+        populations = loadPopulations(exp, dirName)
+        for ax, (label, key, colour) in zip(axes, SPECIES):
+            series = populations[key]
+            ax.plot(range(len(series)), series, label=exp)
+
+    for ax, (label, key, colour) in zip(axes, SPECIES):
+        ax.set_xlabel("Sample frames")
+        ax.set_ylabel("Population")
+        ax.set_title(label)
+        ax.grid(True, which='major', color='#ececec', linestyle='-')
+    axes[0].legend(fontsize='small', ncol=4)
+    fig.tight_layout()
+    fig.savefig(fileName)
+    return fileName
+
+def renderReports(experiments, workers=None, comparison=None):
+    """
+    Renders the report of every experiment on a process pool
+
+    Parameters
+    ----------
+    experiments : array(tuple)
+        (exp, dirName) pair of every experiment, populations stored with savePopulations
+    workers : int, optional
+        number of rendering processes, (Default number of cores)
+    comparison : str, optional
+        file for the combined comparison figure, (Default comparison.png next to
+        the experiment directories)
+
+    Returns
+    -------
+    array(str)
+        the figure files written, comparison figure last
+    """
+
+    experiments = list(experiments)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        files = list(pool.map(_renderReport, experiments))
+
+    if comparison is None:
+        dirs = set(os.path.abspath(dirName) for _, dirName in experiments)
+        parent = os.path.commonpath(list(dirs))
+        if len(dirs) == 1:
+            parent = os.path.dirname(parent)
+        comparison = os.path.join(parent, "comparison.png")
+    files.append(plotComparison(experiments, comparison))
+    return files
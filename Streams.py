@@ -0,0 +1,187 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+
+"""
+Counter-based random number streams. Each draw is a hash of the seed, the
+purpose of the draw, the agent's species and id, the time step and a draw
+counter, so it does not depend on how many draws were made before it. Two
+runs with the same seed but different features switched on then give every
+agent the same moves, matings and spawns for as long as it exists in both,
+which makes the runs maximally correlated (common random numbers).
+"""
+
+# purposes of a draw, each is an independent stream
+MOVE = 1
+MATE = 2
+LOCATION = 3
+SIZE = 4
+SPAWN = 5
+DECOMPOSE = 6
+INTERVENTION = 7
+FEED = 8
+AGE = 9
+
+MASK = (1 << 64) - 1
+
+def splitmix64(x):
+    """
+    Scrambles a 64 bit integer
+
+    Parameters
+    ----------
+    x : int
+        value to scramble
+
+    Returns
+    -------
+    int
+        scrambled 64 bit value
+    """
+
+    x = (x + 0x9E3779B97F4A7C15) & MASK
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK
+    return x ^ (x >> 31)
+
+class CounterRNG:
+    """
+    A class used to draw random numbers keyed by agent and time step
+
+    Attributes
+    ----------
+    seed : int
+        seed shared by every stream
+    tick : int
+        current time step, set by the ecosystem
+
+    Methods
+    -------
+    bits(purpose, species, agentId, draw=0)
+        Returns 64 random bits for a key
+    uniform(purpose, species, agentId, draw=0)
+        Returns a float in [0, 1) for a key
+    integer(purpose, species, agentId, low, high, draw=0)
+        Returns an integer in [low, high) for a key
+    state(purpose, species, agentId, draw=0)
+        Returns a numpy RandomState seeded from a key
+    """
+
+    def __init__(self, seed):
+        """
+        Parameters
+        ----------
+        seed : int
+            seed shared by every stream
+        """
+
+        self.seed = seed
+        self.tick = 0
+
+    def bits(self, purpose, species, agentId, draw=0):
+        """
+        Returns 64 random bits for a key
+
+        Parameters
+        ----------
+        purpose : int
+            what the draw is used for (MOVE, MATE, LOCATION, SIZE, SPAWN, DECOMPOSE,
+            INTERVENTION, FEED, AGE)
+        species : int
+            species code of the agent
+        agentId : int
+            id of the agent
+        draw : int, optional
+            counter for several draws with the same key, (Default 0)
+
+        Returns
+        -------
+        int
+            random 64 bit value
+        """
+
+        x = splitmix64(self.seed & MASK)
+        for part in (purpose, species, agentId, self.tick, draw):
+            x = splitmix64(x ^ (part & MASK))
+        return x
+
+    def uniform(self, purpose, species, agentId, draw=0):
+        """
+        Returns a float in [0, 1) for a key, see bits
+        """
+
+        return (self.bits(purpose, species, agentId, draw) >> 11) * (1.0 / (1 << 53))
+
+    def integer(self, purpose, species, agentId, low, high, draw=0):
+        """
+        Returns an integer in [low, high) for a key, see bits
+        """
+
+        return low + self.bits(purpose, species, agentId, draw) % (high - low)
+
+    def state(self, purpose, species, agentId, draw=0):
+        """
+        Returns a numpy RandomState seeded from a key, see bits
+
+        For many draws at once that are not tied to single agents, e.g. the
+        cells of an intervention.
+        """
+
+        x = self.bits(purpose, species, agentId, draw)
+        return np.random.RandomState([x & 0xFFFFFFFF, x >> 32])
+
+def uniform(agent, purpose, draw=0):
+    """
+    Draws a float in [0, 1) for an agent
+
+    Uses the agent's counter-based stream when one is set, numpy otherwise.
+
+    Parameters
+    ----------
+    agent : Animal or Food
+        agent the draw is for
+    purpose : int
+        what the draw is used for
+    draw : int, optional
+        counter for several draws in one time step, (Default 0)
+
+    Returns
+    -------
+    float
+        the random value
+    """
+
+    if agent.rng is None:
+        return np.random.rand()
+    return agent.rng.uniform(purpose, agent.code, agent.agentId, draw)
+
+def randint(agent, purpose, low, high, draw=0):
+    """
+    Draws an integer in [low, high) for an agent
+
+    Uses the agent's counter-based stream when one is set, numpy otherwise.
+
+    Parameters
+    ----------
+    agent : Animal or Food
+        agent the draw is for
+    purpose : int
+        what the draw is used for
+    low : int
+        lowest value
+    high : int
+        one above the highest value
+    draw : int, optional
+        counter for several draws in one time step, (Default 0)
+
+    Returns
+    -------
+    int
+        the random value
+    """
+
+    if agent.rng is None:
+        return np.random.randint(low, high)
+    return agent.rng.integer(purpose, agent.code, agent.agentId, low, high, draw)
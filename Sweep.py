@@ -0,0 +1,275 @@
+from __future__ import print_function, division
+
+import sys
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+"""
+Headless experiment runs over feature configurations. A configuration is
+named by the flags it switches on, as in ExperimentalResults:
+H hunting, O omnivores, D decomposers, P probability litter, none for
+no flags.
+"""
+
+FLAGS = {'H': 'hunting', 'O': 'omni', 'D': 'decomp', 'P': 'probLitter'}
+
+SPECIES_KEYS = ['numFoxes', 'numRabbits', 'numMushrooms']
+
+def flagsFromName(exp):
+    """
+    Ecosystem flags switched on by a configuration name
+
+    Parameters
+    ----------
+    exp : str
+        configuration name, e.g. 'HODP' or 'none'
+
+    Returns
+    -------
+    dictionary
+        keyword arguments for Ecosystem
+    """
+
+    if exp == 'none':
+        return {}
+    return {FLAGS[flag]: True for flag in exp}
+
+def allConfigurations():
+    """
+    Names of the 16 feature configurations
+
+    Returns
+    -------
+    array(str)
+        configuration names, 'none' first
+    """
+
+    names = ['none']
+    for mask in range(1, 16):
+        names.append(''.join(flag for i, flag in enumerate('HODP') if mask & (1 << i)))
+    return names
+
+def runExperiment(exp, seed, rows=50, numFoxes=20, numRabbits=100, numMushrooms=300,
+                  maxFrames=200, crn=False, **kwargs):
+    """
+    Runs one configuration headless and returns its population history
+
+    Parameters
+    ----------
+    exp : str
+        configuration name
+    seed : int
+        random seed of the run
+    rows : int, optional
+        the dimension of the ecosystem grid, (Default 50)
+    numFoxes : int, optional
+        number of foxes to start with, (Default 20)
+    numRabbits : int, optional
+        number of rabbits to start with, (Default 100)
+    numMushrooms : int, optional
+        number of mushrooms to start with, (Default 300)
+    maxFrames : int, optional
+        maximum number of time steps, (Default 200)
+    crn : boolean, optional
+        use common random numbers keyed by agent and time step, (Default False)
+    **kwargs
+        passed on to Ecosystem
+
+    Returns
+    -------
+    dictionary
+        population series keyed numFoxes, numRabbits and numMushrooms
+    """
+
+    eco = createEcosystem(exp, seed, rows, numFoxes, numRabbits, numMushrooms, crn, **kwargs)
+    eco.simulate(maxFrames)
+    return {key: np.array(value) for key, value in eco.populations().items()}
+
+def createEcosystem(exp, seed, rows=50, numFoxes=20, numRabbits=100, numMushrooms=300,
+                    crn=False, numpySeed=None, **kwargs):
+    """
+    Creates the starting ecosystem of a run, see runExperiment
+
+    Parameters
+    ----------
+    numpySeed : int, optional
+        seed of numpy's global state, (Default seed)
+
+    Returns
+    -------
+    Ecosystem
+        the ecosystem before its first time step
+    """
+
+    from Ecosystem import Ecosystem
+
+    np.random.seed(seed if numpySeed is None else numpySeed)
+    options = flagsFromName(exp)
+    options.update(kwargs)
+    if crn:
+        options['crnSeed'] = seed
+    eco = Ecosystem(rows, **options)
+    eco.createFoxes(numFoxes)
+    eco.createRabbits(numRabbits)
+    eco.createMushrooms(numMushrooms)
+    return eco
+
+def pairedStart(exp, seed, **kwargs):
+    """
+    Checks that common random numbers runs with the same seed start alike
+
+    The starting ecosystem is built twice with different numpy seeds, every
+    agent has to get the same id, location and size both times.
+
+    Parameters
+    ----------
+    exp : str
+        configuration name
+    seed : int
+        seed of the common random numbers
+    **kwargs
+        passed on to createEcosystem
+
+    Returns
+    -------
+    boolean
+        do both starts match
+    """
+
+    kwargs.pop('maxFrames', None)
+    kwargs['crn'] = True
+    starts = []
+    for numpySeed in [seed, seed + 1]:
+        eco = createEcosystem(exp, seed, numpySeed=numpySeed, **kwargs)
+        starts.append([(agent.agentId, tuple(agent.location), getattr(agent, 'size', None))
+                       for agentArray in eco.speciesArrays().values() for agent in agentArray])
+    return starts[0] == starts[1]
+
+def _runExperiment(args):
+    """
+    Unpacks the arguments for runExperiment on a worker process
+    """
+
+    exp, seed, kwargs = args
+    return runExperiment(exp, seed, **kwargs)
+
+def meanPopulation(populations):
+    """
+    Mean population of each species over a run
+
+    Parameters
+    ----------
+    populations : dictionary
+        population series keyed numFoxes, numRabbits and numMushrooms
+
+    Returns
+    -------
+    array(float)
+        mean number of foxes, rabbits and mushrooms
+    """
+
+    return np.array([np.mean(populations[key]) for key in SPECIES_KEYS])
+
+def runSweep(exps, seeds, workers=None, **kwargs):
+    """
+    Runs every configuration with every seed on a process pool
+
+    Parameters
+    ----------
+    exps : array(str)
+        configuration names
+    seeds : array(int)
+        random seeds, shared by every configuration
+    workers : int, optional
+        number of processes, (Default number of cores)
+    **kwargs
+        passed on to runExperiment
+
+    Returns
+    -------
+    dictionary
+        list of population histories per configuration, in seed order
+    """
+
+    jobs = [(exp, seed, kwargs) for exp in exps for seed in seeds]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_runExperiment, jobs))
+    runs = {}
+    for (exp, seed, _), populations in zip(jobs, results):
+        runs.setdefault(exp, []).append(populations)
+    return runs
+
+def pairedSweep(exps, seeds, baseline=None, metric=meanPopulation, workers=None, **kwargs):
+    """
+    Compares configurations with common random numbers and paired differences
+
+    Every configuration is run with the same seeds in common random numbers
+    mode, so run i of one configuration is paired with run i of the baseline.
+
+    Parameters
+    ----------
+    exps : array(str)
+        configuration names
+    seeds : array(int)
+        random seeds, shared by every configuration
+    baseline : str, optional
+        configuration the others are compared with, (Default the first one)
+    metric : function, optional
+        summary of a run returning one value per species, (Default meanPopulation)
+    workers : int, optional
+        number of processes, (Default number of cores)
+    **kwargs
+        passed on to runExperiment
+
+    Returns
+    -------
+    array(dictionary)
+        per configuration: mean difference, paired and unpaired standard errors
+        and the variance reduction (replicates saved by pairing) for each species
+    """
+
+    exps = list(exps)
+    if baseline is None:
+        baseline = exps[0]
+    if baseline not in exps:
+        exps.insert(0, baseline)
+    kwargs['crn'] = True
+    if not pairedStart(baseline, seeds[0], **kwargs):
+        raise RuntimeError("runs with the same seed do not start alike, pairing is lost")
+    runs = runSweep(exps, seeds, workers=workers, **kwargs)
+
+    base = np.array([metric(populations) for populations in runs[baseline]])
+    report = []
+    for exp in exps:
+        if exp == baseline:
+            continue
+        other = np.array([metric(populations) for populations in runs[exp]])
+        diff = other - base
+        count = len(seeds)
+        paired = diff.std(axis=0, ddof=1)/np.sqrt(count)
+        unpaired = np.sqrt((other.var(axis=0, ddof=1) + base.var(axis=0, ddof=1))/count)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            reduction = (unpaired/paired)**2
+        report.append({"exp": exp, "baseline": baseline, "meanDiff": diff.mean(axis=0),
+                       "pairedSE": paired, "unpairedSE": unpaired,
+                       "varianceReduction": reduction})
+    return report
+
+def printReport(report):
+    """
+    Prints the paired differences of a pairedSweep
+
+    Parameters
+    ----------
+    report : array(dictionary)
+        output of pairedSweep
+    """
+
+    names = ['Foxes', 'Rabbits', 'Mushrooms']
+    for row in report:
+        print(row["exp"] + " - " + row["baseline"])
+        for i, name in enumerate(names):
+            print("  %-9s %9.2f +/- %7.2f (unpaired +/- %7.2f, %5.1fx fewer replicates)"
+                  % (name, row["meanDiff"][i], row["pairedSE"][i],
+                     row["unpairedSE"][i], row["varianceReduction"][i]))
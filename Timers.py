@@ -0,0 +1,102 @@
+from __future__ import print_function, division
+
+import sys
+
+# kinds of timer
+COOLDOWN = 0 # mating cooldown ends, fired at the start of a time step
+LIFESPAN = 1 # animal dies of old age, fired when the dead are removed
+
+class TimerWheel:
+    """
+    A class used to schedule agent deadlines by time step
+
+    Timers are kept in a ring of buckets indexed by deadline, so each time
+    step only the bucket of that step is visited instead of every agent.
+    Deadlines further away than the ring stay in their bucket until the ring
+    comes round to them again. Timers whose deadline has passed fire the next
+    time their bucket is visited, so a skipped step does not lose them.
+
+    Attributes
+    ----------
+    slots : int
+        number of buckets in the ring
+    buckets : array(array(tuple))
+        (deadline, kind, agent, agentId) of each pending timer
+    pending : int
+        number of pending timers
+    tick : int
+        current time step, set by the ecosystem
+
+    Methods
+    -------
+    schedule(deadline, kind, agent)
+        Adds a timer for an agent
+    expire(tick, kind)
+        Removes and returns the agents whose timers of a kind are due
+    """
+
+    def __init__(self, slots=256):
+        """
+        Parameters
+        ----------
+        slots : int, optional
+            number of buckets in the ring, (Default 256)
+        """
+
+        self.slots = slots
+        self.buckets = [[] for i in range(slots)]
+        self.pending = 0
+        self.tick = 0
+
+    def schedule(self, deadline, kind, agent):
+        """
+        Adds a timer for an agent
+
+        Parameters
+        ----------
+        deadline : int
+            time step the timer fires at
+        kind : int
+            type of timer (COOLDOWN or LIFESPAN)
+        agent : Animal
+            agent the timer is for
+        """
+
+        self.buckets[deadline % self.slots].append((deadline, kind, agent, agent.agentId))
+        self.pending = self.pending + 1
+
+    def expire(self, tick, kind):
+        """
+        Removes and returns the agents whose timers of a kind are due
+
+        Timers of agents that were recycled into a new agent since they were
+        scheduled are dropped.
+
+        Parameters
+        ----------
+        tick : int
+            current time step
+        kind : int
+            type of timer to fire
+
+        Returns
+        -------
+        array(Animal)
+            agents whose timers fired
+        """
+
+        bucket = self.buckets[tick % self.slots]
+        if not bucket:
+            return []
+        due = []
+        keep = []
+        for entry in bucket:
+            deadline, entryKind, agent, agentId = entry
+            if entryKind == kind and deadline <= tick:
+                if agent.agentId == agentId:
+                    due.append(agent)
+            else:
+                keep.append(entry)
+        self.pending = self.pending - (len(bucket) - len(keep))
+        self.buckets[tick % self.slots] = keep
+        return due